@@ -0,0 +1,116 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    benchmarks/archive_throughput.py
+
+
+Description:
+    Measures how fast memos are imported from and exported to NDJSON archives, plain and gzipped, and (with
+    --memory) the peak Python memory each direction allocates, which should stay flat as --memos grows.
+
+    The corpus is the generated mix from `benchmarks.compression`. Throughput is given in memos per second and in MB
+    per second of uncompressed archive.
+
+    Usage:
+        python -m benchmarks.archive_throughput [--memos N] [--batch-size B] [--memory]
+
+"""
+import argparse
+import gzip
+import json
+import shutil
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from cryptography.fernet import Fernet
+from sqlalchemy import create_engine
+from benchmarks.compression import corpus
+from inspyred_memo_server.database.archive import export_memos, import_memos
+from inspyred_memo_server.database.compression import BodyCodec
+from inspyred_memo_server.database.crypt import EncryptionManager
+from inspyred_memo_server.database.migrations import migrate
+from inspyred_memo_server.database.tuning import install_profile
+
+
+def write_source(path, count, seed=0) -> int:
+    """
+    Writes an archive of generated memos.
+
+    Returns:
+        int:
+            The archive's size in bytes.
+    """
+    size = 0
+    with open(path, 'wb') as archive:
+        for memo_id, body in enumerate(corpus(count, seed), 1):
+            line = json.dumps({'id': memo_id, 'author': f'user{memo_id % 50}', 'created_at': 1.7e9 + memo_id,
+                               'body': body}, ensure_ascii=False).encode('utf-8') + b'\n'
+            archive.write(line)
+            size += len(line)
+
+    return size
+
+
+def database(path):
+    engine = create_engine(f'sqlite:///{path}')
+    install_profile(engine)
+    migrate(engine)
+    return engine
+
+
+def measure(label, work, memos, size, memory):
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    work()
+    elapsed = time.perf_counter() - start
+    peak = ''
+    if memory:
+        peak = f'{tracemalloc.get_traced_memory()[1] / 2 ** 20:>10.1f}'
+        tracemalloc.stop()
+
+    print(f'{label:<18}{elapsed:>10.2f}{memos / elapsed:>12,.0f}{size / elapsed / 1e6:>10.1f}{peak}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--memos', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--memory', action='store_true', help='also report peak traced memory (slows the runs)')
+    args = parser.parse_args()
+
+    codec = BodyCodec(EncryptionManager(Fernet.generate_key()))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        source = tmp / 'source.ndjson'
+        size = write_source(source, args.memos)
+        print(f'{args.memos} memos, {size / 2 ** 20:.1f} MiB of NDJSON')
+
+        print(f'{"":<18}{"seconds":>10}{"memos/sec":>12}{"MB/s":>10}{"peak MiB" if args.memory else "":>10}')
+        for suffix in ('.ndjson', '.ndjson.gz'):
+            engine = database(tmp / f'import{suffix}.db')
+            archive = tmp / f'export{suffix}'
+
+            imported = tmp / f'source{suffix}'
+            if suffix.endswith('.gz'):
+                with open(source, 'rb') as plain, gzip.open(imported, 'wb', compresslevel=6) as compressed:
+                    shutil.copyfileobj(plain, compressed)
+
+            measure(f'import {suffix}', lambda: import_memos(imported, engine, args.batch_size, codec=codec),
+                    args.memos, size, args.memory)
+            measure(f'export {suffix}', lambda: export_memos(archive, engine, args.batch_size, codec=codec),
+                    args.memos, size, args.memory)
+            engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
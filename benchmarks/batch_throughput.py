@@ -0,0 +1,88 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    benchmarks/batch_throughput.py
+
+
+Description:
+    Compares memo ingest throughput when every memo pays its own connect/send/ack/close against submitting memos in
+    batches over one connection.
+
+    Usage:
+        python -m benchmarks.batch_throughput [--memos N] [--batch-size B ...] [--memo-size BYTES]
+
+"""
+import argparse
+import contextlib
+import io
+import socket
+import threading
+import time
+from inspyred_memo_server import MemoServer
+from inspyred_memo_server.protocol import FrameReader, MSG_ACK, MSG_BATCH, MSG_MEMO, encode_frame, encode_json_frame
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _request(address, frame):
+    with socket.create_connection(address) as s:
+        s.sendall(frame)
+        reply = FrameReader(s, buffer_size=4096).read_frame()
+        assert reply is not None and reply.msg_type == MSG_ACK, reply
+        return len(reply.json()['ids'])
+
+
+def one_per_connection(address, memos):
+    for request_id, memo in enumerate(memos):
+        _request(address, encode_frame(MSG_MEMO, request_id, memo.encode('utf-8')))
+
+
+def batched(address, memos, batch_size):
+    with socket.create_connection(address) as s:
+        reader = FrameReader(s, buffer_size=4096)
+        for request_id, start in enumerate(range(0, len(memos), batch_size)):
+            s.sendall(encode_json_frame(MSG_BATCH, request_id, memos[start:start + batch_size]))
+            reply = reader.read_frame()
+            assert reply is not None and reply.msg_type == MSG_ACK, reply
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--memos', type=int, default=5000)
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--memo-size', type=int, default=200)
+    args = parser.parse_args()
+
+    address = ('127.0.0.1', _free_port())
+    server = MemoServer(*address)
+    threading.Thread(target=server.start, daemon=True).start()
+    time.sleep(0.2)
+
+    memos = [f'{i:08d} '.ljust(args.memo_size, 'x') for i in range(args.memos)]
+
+    runs = [('one memo per connection', lambda: one_per_connection(address, memos))]
+    for size in args.batch_size:
+        runs.append((f'batch of {size}', lambda size=size: batched(address, memos, size)))
+
+    print(f'{"mode":<28}{"seconds":>10}{"memos/sec":>14}')
+    for name, run in runs:
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+        print(f'{name:<28}{elapsed:>10.3f}{args.memos / elapsed:>14,.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    benchmarks/compression.py
+
+
+Description:
+    Measures how much compressing memo bodies before encryption saves at rest, and what it costs in CPU, for each
+    available codec and level.
+
+    The corpus is generated (from a fixed seed) to resemble what the server receives: mostly short notes, some
+    paragraphs of prose, pasted log excerpts and JSON documents. Each configuration encodes every memo with
+    `BodyCodec` and decodes it again; the report gives the stored size against both the plaintext and plain Fernet
+    (the "none" row), and the encode and decode throughput in plaintext MB/s.
+
+    Usage:
+        python -m benchmarks.compression [--memos N] [--threshold BYTES] [--seed S]
+
+"""
+import argparse
+import json
+import random
+import time
+from cryptography.fernet import Fernet
+from inspyred_memo_server.database.compression import BodyCodec, available_codecs
+from inspyred_memo_server.database.crypt import EncryptionManager
+
+
+WORDS = (
+    'the of and to in is that for it as was with be by on not he this are or his from at which but have an they you '
+    'were her she there been one all we their has would when if so no will more about up out them some could what '
+    'meeting deploy server memo review budget client release schedule ticket invoice report draft update backup '
+    'password network printer quarterly agenda follow reminder deadline migration database performance latency'
+).split()
+
+LEVELS = ('INFO', 'INFO', 'INFO', 'DEBUG', 'WARNING', 'ERROR')
+
+
+def _prose(rng, words):
+    # Zipf-like: common words are drawn far more often than rare ones.
+    text = ' '.join(WORDS[min(int(rng.paretovariate(1.2)) - 1, len(WORDS) - 1)] for _ in range(words))
+    return text.capitalize() + '.'
+
+
+def _log(rng, lines):
+    start = 1_700_000_000
+    return '\n'.join(
+        f'{time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(start + i * rng.randint(1, 30)))} '
+        f'{rng.choice(LEVELS):<7} memo_server.worker[{rng.randint(1000, 1010)}]: '
+        f'handled request id={rng.randint(1, 10 ** 6)} in {rng.uniform(0.1, 250):.2f} ms'
+        for i in range(lines)
+    )
+
+
+def _json(rng, items):
+    return json.dumps([
+        {
+            'id': rng.randint(1, 10 ** 6),
+            'name': _prose(rng, 3),
+            'tags': rng.sample(WORDS, 3),
+            'price': round(rng.uniform(1, 500), 2),
+            'active': rng.random() < 0.8,
+        }
+        for _ in range(items)
+    ], indent=2)
+
+
+def corpus(count, seed=0) -> list:
+    """
+    Generates a reproducible mix of memos.
+
+    Returns:
+        list[str]:
+            The memos.
+    """
+    rng = random.Random(seed)
+    memos = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.6:
+            memos.append(_prose(rng, rng.randint(3, 40)))
+        elif kind < 0.85:
+            memos.append('\n\n'.join(_prose(rng, rng.randint(40, 150)) for _ in range(rng.randint(1, 6))))
+        elif kind < 0.95:
+            memos.append(_log(rng, rng.randint(10, 200)))
+        else:
+            memos.append(_json(rng, rng.randint(5, 60)))
+
+    return memos
+
+
+def run(codec, memos):
+    bodies = [None] * len(memos)
+    start = time.perf_counter()
+    for i, memo in enumerate(memos):
+        bodies[i] = codec.encode(memo)
+    encode_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for (body, tag), memo in zip(bodies, memos):
+        if codec.decode(body, tag) != memo:
+            raise AssertionError(f'{codec!r} did not round-trip a memo')
+    decode_seconds = time.perf_counter() - start
+
+    stored = sum(len(body) for body, _ in bodies)
+    compressed = sum(tag is not None for _, tag in bodies)
+    return stored, compressed, encode_seconds, decode_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--memos', type=int, default=20000)
+    parser.add_argument('--threshold', type=int, default=1024)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    memos = corpus(args.memos, args.seed)
+    plaintext = sum(len(memo.encode('utf-8')) for memo in memos)
+    encryption = EncryptionManager(Fernet.generate_key())
+    print(f'{len(memos)} memos, {plaintext / 2 ** 20:.1f} MiB of plaintext, '
+          f'{sum(len(memo.encode("utf-8")) >= args.threshold for memo in memos)} at or over {args.threshold} bytes')
+
+    configurations = [('none', BodyCodec(encryption, threshold=None, codec='zlib'))]
+    for name in reversed(available_codecs()):
+        for level in {'zlib': (1, 6, 9), 'zstd': (1, 3, 9)}[name]:
+            configurations.append((f'{name}-{level}', BodyCodec(encryption, args.threshold, name, level)))
+
+    baseline = None
+    print(f'{"codec":<10}{"stored MiB":>12}{"vs plain":>10}{"vs none":>10}{"compressed":>12}'
+          f'{"enc MB/s":>10}{"dec MB/s":>10}')
+    for label, codec in configurations:
+        stored, compressed, encode_seconds, decode_seconds = run(codec, memos)
+        baseline = baseline or stored
+        print(
+            f'{label:<10}{stored / 2 ** 20:>12.2f}{stored / plaintext:>10.2f}{stored / baseline:>10.2f}'
+            f'{compressed:>12}{plaintext / encode_seconds / 1e6:>10.1f}{plaintext / decode_seconds / 1e6:>10.1f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
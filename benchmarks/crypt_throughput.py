@@ -0,0 +1,75 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    benchmarks/crypt_throughput.py
+
+
+Description:
+    Measures bulk Fernet throughput, in MB/s of plaintext, for `EncryptionManager.encrypt_many` and `decrypt_many` on
+    thread and process pools of different sizes, against the plain one-at-a-time loop.
+
+    Usage:
+        python -m benchmarks.crypt_throughput [--items N] [--size BYTES] [--chunk-size C] [--workers W ...]
+
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from cryptography.fernet import Fernet
+from inspyred_memo_server.database.crypt import EncryptionManager
+
+
+def timed(work):
+    start = time.perf_counter()
+    results = work()
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=50000)
+    parser.add_argument('--size', type=int, default=2048, help='bytes of plaintext per item')
+    parser.add_argument('--chunk-size', type=int, default=256)
+    parser.add_argument('--workers', type=int, nargs='+', default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    args = parser.parse_args()
+
+    manager = EncryptionManager(Fernet.generate_key())
+    data = [os.urandom(args.size // 2).hex() for _ in range(args.items)]
+    megabytes = args.items * args.size / 1e6
+    print(f'{args.items} items of {args.size} bytes ({megabytes:.0f} MB), chunks of {args.chunk_size}, '
+          f'{os.cpu_count()} CPUs')
+
+    encrypt_seconds, tokens = timed(lambda: [manager.encrypt(item) for item in data])
+    decrypt_seconds, _ = timed(lambda: [manager.decrypt(token) for token in tokens])
+    print(f'{"pool":<10}{"workers":>8}{"encrypt MB/s":>14}{"decrypt MB/s":>14}')
+    print(f'{"serial":<10}{1:>8}{megabytes / encrypt_seconds:>14.1f}{megabytes / decrypt_seconds:>14.1f}')
+
+    for pool, executor_class in (('threads', ThreadPoolExecutor), ('processes', ProcessPoolExecutor)):
+        for workers in args.workers:
+            with executor_class(workers) as executor:
+                # One warm-up chunk, so process start-up is not counted.
+                list(manager.encrypt_many(data[:args.chunk_size], args.chunk_size, executor))
+
+                encrypt_seconds, tokens = timed(
+                    lambda: list(manager.encrypt_many(data, args.chunk_size, executor, 2 * workers))
+                )
+                decrypt_seconds, plaintexts = timed(
+                    lambda: list(manager.decrypt_many(tokens, args.chunk_size, executor, 2 * workers))
+                )
+
+            if plaintexts != data:
+                raise AssertionError(f'{pool} with {workers} workers did not round-trip the data in order')
+
+            print(f'{pool:<10}{workers:>8}{megabytes / encrypt_seconds:>14.1f}{megabytes / decrypt_seconds:>14.1f}')
+
+
+if __name__ == '__main__':
+    main()
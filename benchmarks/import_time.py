@@ -0,0 +1,117 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    benchmarks/import_time.py
+
+
+Description:
+    Measures how long the server's packages take to import, using `python -X importtime` in a fresh interpreter per
+    run, and checks that importing them has no side effects: no files written under the user's home directory and no
+    keyring lookup (the keyring module is not even loaded).
+
+    Each import runs with HOME (and the XDG directories) pointed at an empty temporary directory. The run exits
+    non-zero if an import leaves anything behind, loads keyring, or (with --budget-ms) takes longer than the budget,
+    so it can guard against regressions in CI.
+
+    Usage:
+        python -m benchmarks.import_time [--repeat N] [--budget-ms MS] [module ...]
+
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+
+MODULES = [
+    'inspyred_memo_server',
+    'inspyred_memo_server.config',
+    'inspyred_memo_server.database',
+    'inspyred_memo_server.store.database',
+    'inspyred_memo_server.supervisor',
+]
+
+PROBE = '''
+import sys
+import {module}
+sys.stdout.write('keyring' if 'keyring' in sys.modules else 'clean')
+'''
+
+
+def import_once(module):
+    """
+    Imports a module in a fresh interpreter.
+
+    Returns:
+        tuple:
+            The cumulative import time in microseconds, whether keyring was loaded, and the files the import created.
+    """
+    with tempfile.TemporaryDirectory() as home:
+        env = dict(
+            os.environ,
+            HOME=home,
+            USERPROFILE=home,
+            XDG_DATA_HOME=os.path.join(home, 'data'),
+            XDG_CONFIG_HOME=os.path.join(home, 'config'),
+            XDG_STATE_HOME=os.path.join(home, 'state'),
+            XDG_CACHE_HOME=os.path.join(home, 'cache'),
+            PYTHON_KEYRING_BACKEND='keyring.backends.fail.Keyring',
+        )
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PROBE.format(module=module)],
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f'Importing {module} failed:\n{result.stderr}')
+
+        created = [os.path.relpath(os.path.join(root, name), home) for root, _, files in os.walk(home) for name in files]
+
+    cumulative = None
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, _, cumulative_us, name = (part.strip() for part in line.replace('import time:', '|').split('|'))
+        if name == module:
+            cumulative = int(cumulative_us)
+
+    return cumulative, result.stdout == 'keyring', created
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    parser.add_argument('--repeat', type=int, default=5, help='runs per module; the fastest is reported')
+    parser.add_argument('--budget-ms', type=float, default=None, help='fail if any import is slower than this')
+    args = parser.parse_args()
+
+    failed = False
+    print(f'{"module":<40}{"ms":>10}  side effects')
+    for module in args.modules:
+        runs = [import_once(module) for _ in range(args.repeat)]
+        best = min(cumulative for cumulative, _, _ in runs) / 1000
+        effects = []
+        if any(loaded_keyring for _, loaded_keyring, _ in runs):
+            effects.append('loads keyring')
+        created = sorted({path for _, _, files in runs for path in files})
+        if created:
+            effects.append('creates ' + ', '.join(created))
+
+        over_budget = args.budget_ms is not None and best > args.budget_ms
+        failed = failed or bool(effects) or over_budget
+        print(f'{module:<40}{best:>10.1f}{" (over budget)" if over_budget else ""}  {"; ".join(effects) or "none"}')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
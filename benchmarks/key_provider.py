@@ -0,0 +1,98 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    benchmarks/key_provider.py
+
+
+Description:
+    Measures what getting the encryption key costs with and without the `KeyProvider` cache, against a keyring
+    backend that answers after a fixed delay (25 ms by default, typical of a Secret Service lookup over D-Bus).
+
+    Reported:
+        - the first key fetch from the keyring, the key file and the environment (the start-up cost);
+        - a cipher per call as `generate_cipher()` used to build one (a keyring lookup and a new `Fernet` each time);
+        - a cipher per call from the provider's cache.
+
+    Usage:
+        python -m benchmarks.key_provider [--latency-ms MS] [--calls N]
+
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+import keyring
+from cryptography.fernet import Fernet
+from keyring.backend import KeyringBackend
+from inspyred_memo_server.database.crypt import EncryptionKey, EnvironmentKey, FileKey, KeyProvider
+
+
+class SlowKeyring(KeyringBackend):
+    """
+    An in-memory keyring that takes `latency` seconds to answer, like a secret service reached over D-Bus.
+    """
+    priority = 1
+
+    def __init__(self, latency):
+        super().__init__()
+        self.latency = latency
+        self.passwords = {}
+
+    def get_password(self, service, username):
+        time.sleep(self.latency)
+        return self.passwords.get((service, username))
+
+    def set_password(self, service, username, password):
+        time.sleep(self.latency)
+        self.passwords[(service, username)] = password
+
+    def delete_password(self, service, username):
+        self.passwords.pop((service, username), None)
+
+
+def per_call(work, calls) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        work()
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency-ms', type=float, default=25.0)
+    parser.add_argument('--calls', type=int, default=200)
+    args = parser.parse_args()
+
+    keyring.set_keyring(SlowKeyring(args.latency_ms / 1000))
+    keyring_key = EncryptionKey('InspyredMemosBenchmark')
+    keyring_key.store_key(Fernet.generate_key())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        key_file = FileKey(Path(tmp) / 'memos.key')
+        key_file.get_key()
+        os.environ['INSPYRED_MEMOS_BENCHMARK_KEY'] = Fernet.generate_key().decode()
+
+        print(f'{"":<40}{"ms":>10}')
+        for label, source in (('first fetch: keyring', keyring_key), ('first fetch: key file', key_file),
+                              ('first fetch: environment', EnvironmentKey('INSPYRED_MEMOS_BENCHMARK_KEY'))):
+            print(f'{label:<40}{per_call(lambda: KeyProvider([source]).key, 5) * 1000:>10.3f}')
+
+    provider = KeyProvider([keyring_key])
+    provider.fernet
+    uncached = per_call(lambda: Fernet(keyring_key.get_key()), max(1, args.calls // 20))
+    cached = per_call(lambda: provider.fernet, args.calls * 1000)
+    print(f'{"cipher per call: keyring + new Fernet":<40}{uncached * 1000:>10.3f}')
+    print(f'{"cipher per call: KeyProvider":<40}{cached * 1000:>10.6f}')
+    print(f'keyring lookups made by the provider: {provider.fetches}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    benchmarks/login_burst.py
+
+
+Description:
+    Fires a burst of concurrent password checks at an event loop and measures what they do to it: checking inline on
+    the loop (as `User.check_password` does), on the shared crypto executor (as the async repository used to), and
+    through `PasswordHasher` pools of different sizes.
+
+    Reported, per case: the time to drain the burst, checks per second, median and 99th-percentile latency of the
+    checks that were accepted, how many were refused as busy, and the longest the event loop went without running a
+    5 ms ticker (how long every other connection would have stalled).
+
+    Usage:
+        python -m benchmarks.login_burst [--logins N] [--cost C] [--workers W ...] [--max-queue Q] [--target-ms MS]
+
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from inspyred_memo_server.database.crypt import get_crypto_executor
+from inspyred_memo_server.database.user import check_password, hash_password
+from inspyred_memo_server.database.user.auth import PasswordHasher, calibrate_cost
+from inspyred_memo_server.errors.auth import AuthBusyError
+
+
+async def ticker(stop, interval=0.005):
+    longest = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        longest = max(longest, time.perf_counter() - start - interval)
+
+    return longest
+
+
+async def burst(check, logins):
+    latencies = []
+    rejected = 0
+
+    async def login():
+        nonlocal rejected
+        start = time.perf_counter()
+        try:
+            await check()
+        except AuthBusyError:
+            rejected += 1
+        else:
+            latencies.append(time.perf_counter() - start)
+
+    stop = asyncio.Event()
+    stall = asyncio.create_task(ticker(stop))
+    await asyncio.sleep(0.01)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    return elapsed, sorted(latencies), rejected, await stall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--cost', type=int, default=10)
+    parser.add_argument('--workers', type=int, nargs='+', default=sorted({1, 2, os.cpu_count() or 1}))
+    parser.add_argument('--max-queue', type=int, default=32)
+    parser.add_argument('--target-ms', type=float, default=250.0, help='target latency for the calibration report')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    calibrated = calibrate_cost(args.target_ms / 1000)
+    print(f'calibrated cost for {args.target_ms:.0f} ms: {calibrated} (took {time.perf_counter() - start:.2f} s)')
+
+    hashed = hash_password('benchmark', args.cost)
+    print(f'{args.logins} logins at cost {args.cost}, {os.cpu_count()} CPUs')
+    print(f'{"case":<22}{"seconds":>9}{"logins/s":>10}{"p50 ms":>9}{"p99 ms":>9}{"busy":>6}{"loop stall ms":>15}')
+
+    async def inline():
+        check_password('benchmark', hashed)
+
+    async def shared():
+        await asyncio.get_running_loop().run_in_executor(get_crypto_executor(), check_password, 'benchmark', hashed)
+
+    cases = [('inline', inline), ('crypto executor', shared)]
+    for workers in args.workers:
+        hasher = PasswordHasher(args.cost, workers, args.max_queue)
+        cases.append((f'hasher {workers}w/{args.max_queue}q', lambda h=hasher: h.check_async('benchmark', hashed)))
+
+    for label, check in cases:
+        elapsed, latencies, rejected, stall = asyncio.run(burst(check, args.logins))
+        accepted = len(latencies)
+        p50 = statistics.median(latencies) * 1000 if latencies else 0.0
+        p99 = latencies[min(accepted - 1, int(accepted * 0.99))] * 1000 if latencies else 0.0
+        print(f'{label:<22}{elapsed:>9.3f}{accepted / elapsed:>10.1f}{p50:>9.1f}{p99:>9.1f}{rejected:>6}'
+              f'{stall * 1000:>15.1f}')
+
+
+if __name__ == '__main__':
+    main()
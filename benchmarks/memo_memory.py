@@ -0,0 +1,89 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    benchmarks/memo_memory.py
+
+
+Description:
+    Reports, with tracemalloc, how many bytes each held memo costs beyond its body text under different in-memory
+    layouts: bare strings (the original `MemoServer.memos`), one dict per memo, one `MemoRecord` per memo, and the
+    columnar `MemoryMemoStore`.
+
+    Usage:
+        python -m benchmarks.memo_memory [--memos N]
+
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from inspyred_memo_server.store import MemoRecord, MemoryMemoStore
+
+
+AUTHORS = ['alice', 'bob', 'carol', 'dave']
+
+
+def bare_strings(bodies):
+    return list(bodies)
+
+
+def dicts(bodies):
+    now = time.time()
+    return [
+        {'id': i, 'created_at': now + i * 1e-6, 'author': AUTHORS[i % 4], 'size': len(body), 'body': body}
+        for i, body in enumerate(bodies)
+    ]
+
+
+def records(bodies):
+    now = time.time()
+    return [MemoRecord(i, now + i * 1e-6, AUTHORS[i % 4], len(body), body) for i, body in enumerate(bodies)]
+
+
+def store(bodies):
+    memo_store = MemoryMemoStore()
+    for start in range(0, len(bodies), 1000):
+        memo_store.add_many(bodies[start:start + 1000], author=AUTHORS[(start // 1000) % 4])
+    return memo_store
+
+
+def measure(layout, bodies):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = layout(bodies)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del held
+    return after - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--memos', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    # The bodies exist before measuring, so only the per-memo overhead of each layout is counted.
+    bodies = [f'memo number {i}' for i in range(args.memos)]
+
+    print(f'{"layout":<20}{"total MiB":>12}{"bytes/memo":>12}')
+    for name, layout in (
+            ('bare str', bare_strings),
+            ('dict', dicts),
+            ('MemoRecord', records),
+            ('MemoryMemoStore', store),
+    ):
+        size = measure(layout, bodies)
+        print(f'{name:<20}{size / 2 ** 20:>12.1f}{size / args.memos:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
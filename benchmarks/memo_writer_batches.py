@@ -0,0 +1,69 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    benchmarks/memo_writer_batches.py
+
+
+Description:
+    Measures how many memo rows per second `MemoWriter` inserts into SQLite at different batch sizes, with several
+    producer threads submitting one memo at a time (as connection handlers do).
+
+    Usage:
+        python -m benchmarks.memo_writer_batches [--rows N] [--producers P] [--batch-size B ...]
+
+"""
+import argparse
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from sqlalchemy import create_engine
+from inspyred_memo_server.database.user import Base
+from inspyred_memo_server.database.writer import MemoWriter
+
+
+def run(batch_size, rows, producers, memo):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f'sqlite:///{Path(tmp) / "bench.db"}')
+        Base.metadata.create_all(engine)
+        writer = MemoWriter(engine, batch_size=batch_size, flush_interval=0.01, max_queue=rows)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(producers) as executor:
+            futures = list(executor.map(lambda _: writer.submit([memo]), range(rows)))
+        for future in futures:
+            future.result()
+        elapsed = time.perf_counter() - start
+
+        batches = writer.batches_written
+        writer.close()
+        engine.dispose()
+
+    return elapsed, batches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--producers', type=int, default=8)
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[1, 10, 100, 500, 2000])
+    parser.add_argument('--memo-size', type=int, default=200)
+    args = parser.parse_args()
+
+    memo = 'x' * args.memo_size
+
+    print(f'{"batch size":>10}{"seconds":>10}{"rows/sec":>14}{"transactions":>14}')
+    for batch_size in args.batch_size:
+        elapsed, batches = run(batch_size, args.rows, args.producers, memo)
+        print(f'{batch_size:>10}{elapsed:>10.3f}{args.rows / elapsed:>14,.0f}{batches:>14}')
+
+
+if __name__ == '__main__':
+    main()
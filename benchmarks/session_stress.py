@@ -0,0 +1,137 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    benchmarks/session_stress.py
+
+
+Description:
+    Stress-tests `SessionManager` with hundreds of concurrent writers, first as threads using `unit_of_work()` (as the
+    threaded server's handlers would) and then as asyncio tasks using `run_async()`. Every writer inserts memos through
+    the ORM; the run fails if any unit of work raised or if the table does not end up with exactly the rows written.
+
+    Usage:
+        python -m benchmarks.session_stress [--writers W] [--units U] [--rows R] [--pool-size P]
+
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from sqlalchemy import create_engine, func, select
+from inspyred_memo_server.database.crypt import get_encryption_manager
+from inspyred_memo_server.database.memo import Memo
+from inspyred_memo_server.database.session import SessionManager, pool_options
+from inspyred_memo_server.database.tuning import DEFAULT_PROFILE, install_profile
+from inspyred_memo_server.database.user import Base
+
+
+def write_memos(session, writer, unit, rows):
+    now = time.time()
+    encrypt = get_encryption_manager().encrypt
+    session.add_all(
+        Memo(author=f'writer-{writer}', created_at=now, size=8, body=encrypt(f'memo {unit}.{row}'))
+        for row in range(rows)
+    )
+
+
+def run_threads(sessions, writers, units, rows):
+    errors = []
+    barrier = threading.Barrier(writers)
+
+    def writer(number):
+        barrier.wait()
+        for unit in range(units):
+            try:
+                with sessions.unit_of_work() as session:
+                    write_memos(session, number, unit, rows)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(number,)) for number in range(writers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return time.perf_counter() - start, errors
+
+
+async def run_tasks(sessions, writers, units, rows, threads):
+    errors = []
+
+    async def writer(number):
+        for unit in range(units):
+            try:
+                await sessions.run_async(write_memos, number, unit, rows, executor=executor)
+            except Exception as e:
+                errors.append(e)
+
+    with ThreadPoolExecutor(threads) as executor:
+        start = time.perf_counter()
+        await asyncio.gather(*(writer(number) for number in range(writers)))
+        elapsed = time.perf_counter() - start
+
+    return elapsed, errors
+
+
+def count_memos(sessions):
+    with sessions.unit_of_work() as session:
+        return session.scalar(select(func.count()).select_from(Memo))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', type=int, default=300)
+    parser.add_argument('--units', type=int, default=10, help='units of work per writer')
+    parser.add_argument('--rows', type=int, default=5, help='memos inserted per unit of work')
+    parser.add_argument('--pool-size', type=int, default=16)
+    parser.add_argument('--max-overflow', type=int, default=16)
+    args = parser.parse_args()
+
+    failed = False
+    print(f'{"mode":<10}{"writers":>9}{"seconds":>10}{"units/sec":>12}{"errors":>8}{"rows ok":>9}')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f'sqlite:///{Path(tmp) / "bench.db"}'
+        engine = create_engine(url, **pool_options(url, pool_size=args.pool_size, max_overflow=args.max_overflow))
+        install_profile(engine, DEFAULT_PROFILE)
+        Base.metadata.create_all(engine)
+        sessions = SessionManager(engine)
+
+        expected = 0
+        for mode in ('threads', 'asyncio'):
+            if mode == 'threads':
+                elapsed, errors = run_threads(sessions, args.writers, args.units, args.rows)
+            else:
+                threads = args.pool_size + args.max_overflow
+                elapsed, errors = asyncio.run(run_tasks(sessions, args.writers, args.units, args.rows, threads))
+
+            expected += (args.writers * args.units - len(errors)) * args.rows
+            rows_ok = count_memos(sessions) == expected
+            failed = failed or bool(errors) or not rows_ok
+
+            units = args.writers * args.units
+            print(f'{mode:<10}{args.writers:>9}{elapsed:>10.3f}{units / elapsed:>12,.0f}{len(errors):>8}'
+                  f'{"yes" if rows_ok else "NO":>9}')
+            for error in errors[:3]:
+                print(f'    {type(error).__name__}: {error}')
+
+        engine.dispose()
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
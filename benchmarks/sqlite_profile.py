@@ -0,0 +1,101 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    benchmarks/sqlite_profile.py
+
+
+Description:
+    Measures concurrent read/write throughput on the memos table with SQLite's defaults (rollback journal,
+    synchronous=FULL, small cache) and with the tuning profile: one writer committing small batches while several
+    readers page through the table.
+
+    Usage:
+        python -m benchmarks.sqlite_profile [--seconds S] [--readers R] [--seed-rows N]
+
+"""
+import argparse
+import tempfile
+import threading
+import time
+from pathlib import Path
+from sqlalchemy import create_engine, insert, select
+from inspyred_memo_server.database.memo import Memo
+from inspyred_memo_server.database.tuning import DEFAULT_PROFILE, WalCheckpointer, install_profile
+from inspyred_memo_server.database.user import Base
+
+
+def _rows(count):
+    now = time.time()
+    return [{'author': None, 'created_at': now, 'size': 100, 'body': 'x' * 100} for _ in range(count)]
+
+
+def run(profile, seconds, readers, seed_rows, batch):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f'sqlite:///{Path(tmp) / "bench.db"}', connect_args={'timeout': 30})
+        checkpointer = None
+        if profile is not None:
+            install_profile(engine, profile)
+            checkpointer = WalCheckpointer(engine, interval=1.0)
+            checkpointer.start()
+
+        Base.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.execute(insert(Memo), _rows(seed_rows))
+
+        stop = threading.Event()
+        counts = {'writes': 0, 'reads': 0}
+        lock = threading.Lock()
+
+        def writer():
+            while not stop.is_set():
+                with engine.begin() as connection:
+                    connection.execute(insert(Memo), _rows(batch))
+                with lock:
+                    counts['writes'] += batch
+
+        def reader():
+            query = select(Memo.id, Memo.body).order_by(Memo.created_at, Memo.id).limit(100)
+            while not stop.is_set():
+                with engine.connect() as connection:
+                    connection.execute(query).all()
+                with lock:
+                    counts['reads'] += 1
+
+        threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(readers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        if checkpointer is not None:
+            checkpointer.stop()
+        engine.dispose()
+
+    return counts['writes'] / seconds, counts['reads'] / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seed-rows', type=int, default=50_000)
+    parser.add_argument('--batch', type=int, default=10, help='rows per write transaction')
+    args = parser.parse_args()
+
+    print(f'{"profile":<12}{"rows written/sec":>18}{"pages read/sec":>16}')
+    for name, profile in (('defaults', None), ('tuned', DEFAULT_PROFILE)):
+        writes, reads = run(profile, args.seconds, args.readers, args.seed_rows, args.batch)
+        print(f'{name:<12}{writes:>18,.0f}{reads:>16,.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    benchmarks/user_load.py
+
+
+Description:
+    Measures what loading users through the ORM costs now that `User.hashed_password` is decrypted lazily: loading
+    every row without touching the field (a listing), and loading every row and reading it (which costs what every
+    load used to cost when a `load` listener decrypted each row).
+
+    The users are inserted directly with one bcrypt hash, encrypted separately for each user, so setting up 100,000
+    users takes seconds rather than hours of bcrypt.
+
+    Usage:
+        python -m benchmarks.user_load [--users N] [--repeat R]
+
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from cryptography.fernet import Fernet
+from sqlalchemy import create_engine, insert, select
+from inspyred_memo_server.database.crypt import EncryptionManager
+from inspyred_memo_server.database.migrations import migrate
+from inspyred_memo_server.database.session import SessionManager
+from inspyred_memo_server.database.user import User, hash_password
+
+
+def populate(engine, users, encryption):
+    token = hash_password('benchmark')
+    with engine.begin() as connection:
+        connection.execute(insert(User), [
+            {'_User__username': f'user{i}', '_User__hashed_pass': encryption.encrypt(token)} for i in range(users)
+        ])
+
+
+def load(sessions, access):
+    with sessions.unit_of_work() as session:
+        start = time.perf_counter()
+        users = session.scalars(select(User)).all()
+        if access:
+            for user in users:
+                user.hashed_password
+        elapsed = time.perf_counter() - start
+
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case; the fastest is reported')
+    args = parser.parse_args()
+
+    encryption = EncryptionManager(Fernet.generate_key())
+    User.hashed_password.encryption = lambda: encryption
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f'sqlite:///{Path(tmp) / "users.db"}')
+        migrate(engine)
+        populate(engine, args.users, encryption)
+        sessions = SessionManager(engine)
+
+        print(f'{"case":<28}{"seconds":>10}{"users/sec":>14}')
+        for label, access in (('load', False), ('load + read hashed_password', True)):
+            elapsed = min(load(sessions, access) for _ in range(args.repeat))
+            print(f'{label:<28}{elapsed:>10.3f}{args.users / elapsed:>14,.0f}')
+
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
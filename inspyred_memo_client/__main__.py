@@ -0,0 +1,6 @@
+from inspyred_memo_client.window import MemoClientWindow
+
+
+if __name__ == '__main__':
+    client_window = MemoClientWindow(auto_build=True)
+    client_window.run()
@@ -0,0 +1,608 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    inspyred_memo_client/connection.py
+
+
+Description:
+    Persistent connections to a memo server, and a bounded pool of them shared by the GUI and scripted clients.
+
+"""
+import itertools
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from inspyred_memo_server.protocol import (
+    FrameReader,
+    MSG_ACK,
+    MSG_BATCH,
+    MSG_BUSY,
+    MSG_ERROR,
+    MSG_LIST,
+    MSG_MEMO,
+    MSG_PAGE,
+    MSG_RESULTS,
+    MSG_SEARCH,
+    encode_frame,
+    encode_json_frame,
+)
+
+
+__all__ = [
+    'ConnectionPool',
+    'MemoConnection',
+    'ServerBusyError',
+    'get_pool',
+]
+
+
+class ServerBusyError(ConnectionError):
+    """
+    Raised when the server turns a connection away because it is at capacity. None of the requests written on that
+    connection were processed.
+    """
+
+
+class MemoConnection:
+    """
+    A single long-lived connection to a memo server.
+
+    Attributes:
+        host (str):
+            The server host.
+
+        port (int):
+            The server port.
+
+        timeout (float):
+            The socket timeout, in seconds.
+    """
+
+    def __init__(self, host='127.0.0.1', port=65432, timeout=5.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+        self.__sock = None
+        self.__reader = None
+        self.__request_ids = itertools.count(1)
+        self.__last_used = None
+
+    @property
+    def connected(self) -> bool:
+        """
+        Whether the connection has an open socket.
+        """
+        return self.__sock is not None
+
+    @property
+    def last_used(self):
+        """
+        The `time.monotonic()` timestamp of the last completed request, or None if the connection is unused.
+        """
+        return self.__last_used
+
+    def connect(self):
+        """
+        Opens the socket to the server.
+        """
+        self.__sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.__sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.__reader = FrameReader(self.__sock, buffer_size=4096)
+
+    def close(self):
+        """
+        Closes the socket, if open.
+        """
+        if self.__sock is not None:
+            try:
+                self.__sock.close()
+            finally:
+                self.__sock = None
+                self.__reader = None
+
+    def is_healthy(self) -> bool:
+        """
+        Checks, without blocking, that the socket is still open and the server has not closed its end.
+
+        Returns:
+            bool:
+                True if the connection can be used for a request.
+        """
+        if self.__sock is None:
+            return False
+
+        self.__sock.setblocking(False)
+        try:
+            self.__sock.recv(1, socket.MSG_PEEK)
+        except (BlockingIOError, InterruptedError):
+            return True
+        except OSError:
+            return False
+        finally:
+            if self.__sock is not None:
+                self.__sock.settimeout(self.timeout)
+
+        # Either the server closed the connection, or it sent something nobody asked for.
+        return False
+
+    def _next_request_id(self):
+        return next(self.__request_ids) % 2 ** 32
+
+    def _read_reply(self, pending, replies) -> int:
+        """
+        Reads one reply frame, recording the ids it acknowledges.
+
+        Returns:
+            int:
+                1 if the frame answered one of the `pending` requests, otherwise 0.
+        """
+        frame = self.__reader.read_frame()
+        if frame is None:
+            raise ConnectionResetError('The server closed the connection mid-request.')
+        if frame.msg_type == MSG_BUSY:
+            raise ServerBusyError(frame.text())
+        if frame.request_id not in pending:
+            return 0
+
+        pending.discard(frame.request_id)
+        if frame.msg_type == MSG_ACK:
+            replies[frame.request_id] = frame.json()['ids']
+        return 1
+
+    def exchange(self, request_ids, frames) -> dict:
+        """
+        Pipelines pre-encoded frames, then collects the acknowledged ids for each request.
+
+        Replies are read as they arrive while the frames are still being written. Writing everything first would
+        deadlock on a long pipeline, with the server blocked sending replies nobody reads and the client blocked
+        sending requests the server has stopped reading.
+
+        Parameters:
+            request_ids (list[int]):
+                The request ids carried by `frames`.
+
+            frames (list[bytes]):
+                The encoded request frames, one per request id.
+
+        Returns:
+            dict:
+                The ids acknowledged by the server, keyed by request id. Requests that failed are absent.
+
+        Raises:
+            ServerBusyError:
+                If the server turned the connection away; the connection is closed.
+
+            OSError:
+                If the connection breaks; the connection is closed and must be reconnected before reuse.
+        """
+        if self.__sock is None:
+            self.connect()
+
+        try:
+            replies = {}
+            pending = set(request_ids)
+            data = memoryview(b''.join(frames))
+            sent = 0
+            # A socket with a timeout is non-blocking underneath, so `send` only writes what the kernel will take.
+            with selectors.DefaultSelector() as selector:
+                selector.register(self.__sock, selectors.EVENT_READ | selectors.EVENT_WRITE)
+                while sent < len(data):
+                    events = selector.select(self.timeout)
+                    if not events:
+                        raise TimeoutError('The server stopped reading and answering requests.')
+
+                    for _, mask in events:
+                        if mask & selectors.EVENT_READ:
+                            self._read_reply(pending, replies)
+                        if mask & selectors.EVENT_WRITE:
+                            sent += self.__sock.send(data[sent:])
+
+            while pending:
+                self._read_reply(pending, replies)
+        except Exception:
+            self.close()
+            raise
+
+        self.__last_used = time.monotonic()
+        return replies
+
+    def send_memos(self, memos) -> list:
+        """
+        Sends memos, pipelining the frames (see `exchange`).
+
+        Parameters:
+            memos (list[str]):
+                The memos to send.
+
+        Returns:
+            list[int | None]:
+                The id the server stored each memo under, in the order given, or None where it was not acknowledged.
+        """
+        request_ids = [self._next_request_id() for _ in memos]
+        frames = [
+            encode_frame(MSG_MEMO, request_id, memo.encode('utf-8'))
+            for request_id, memo in zip(request_ids, memos)
+        ]
+        replies = self.exchange(request_ids, frames)
+
+        return [replies[request_id][0] if request_id in replies else None for request_id in request_ids]
+
+    def send_batch(self, memos):
+        """
+        Sends memos as a single batch, which the server stores in one transaction.
+
+        Parameters:
+            memos (list[str]):
+                The memos to send.
+
+        Returns:
+            list[int] | None:
+                The ids the server stored the memos under, in the order given, or None if the batch was rejected.
+        """
+        request_id = self._next_request_id()
+        replies = self.exchange([request_id], [encode_json_frame(MSG_BATCH, request_id, list(memos))])
+
+        return replies.get(request_id)
+
+    def iter_memos(self, after=None, page_size=500, limit=None):
+        """
+        Streams stored memos from the server, one page at a time, in (created_at, id) order.
+
+        The server sends pages as the client reads them, so neither side holds more than a page in memory. If the
+        generator is abandoned before the last page, the connection is closed, since unread pages are still in
+        flight on it.
+
+        Parameters:
+            after (tuple, optional):
+                The (created_at, id) cursor to start after, e.g. the `next` cursor of an earlier listing.
+
+            page_size (int):
+                The number of memos per page.
+
+            limit (int, optional):
+                The most memos to fetch. Defaults to all of them.
+
+        Yields:
+            dict:
+                Each memo, with its `id`, `created_at`, `author`, `size` and `body`.
+
+        Raises:
+            ServerBusyError:
+                If the server turned the connection away.
+
+            OSError:
+                If the server rejected the request or the connection broke.
+        """
+        if self.__sock is None:
+            self.connect()
+
+        request_id = self._next_request_id()
+        request = {'after': list(after) if after is not None else None, 'page_size': page_size, 'limit': limit}
+
+        finished = False
+        try:
+            self.__sock.sendall(encode_json_frame(MSG_LIST, request_id, request))
+            while True:
+                frame = self.__reader.read_frame()
+                if frame is None:
+                    raise ConnectionResetError('The server closed the connection mid-listing.')
+                if frame.msg_type == MSG_BUSY:
+                    raise ServerBusyError(frame.text())
+                if frame.msg_type == MSG_ERROR:
+                    raise ConnectionError(frame.text())
+                if frame.msg_type != MSG_PAGE or frame.request_id != request_id:
+                    continue
+
+                page = frame.json()
+                if page['last']:
+                    finished = True
+                yield from page['memos']
+                if finished:
+                    break
+        finally:
+            if finished:
+                self.__last_used = time.monotonic()
+            else:
+                self.close()
+
+    def search(self, query, phrase=False, prefix=False, author=None, limit=20, after=None):
+        """
+        Runs a full-text search on the server and fetches one page of results.
+
+        Parameters:
+            query (str):
+                The words to look for.
+
+            phrase (bool):
+                Match the words as one consecutive phrase.
+
+            prefix (bool):
+                Let words match as prefixes.
+
+            author (str, optional):
+                Only match memos by this author.
+
+            limit (int):
+                The most results to return.
+
+            after (list, optional):
+                The `next` cursor returned with the previous page.
+
+        Returns:
+            tuple:
+                The matching memos, best first, and the cursor for the next page (None when there are no more).
+
+        Raises:
+            OSError:
+                If the server rejected the search or the connection broke.
+        """
+        if self.__sock is None:
+            self.connect()
+
+        request_id = self._next_request_id()
+        request = {
+            'query': query,
+            'phrase': phrase,
+            'prefix': prefix,
+            'author': author,
+            'limit': limit,
+            'after': list(after) if after is not None else None,
+        }
+
+        try:
+            self.__sock.sendall(encode_json_frame(MSG_SEARCH, request_id, request))
+            while True:
+                frame = self.__reader.read_frame()
+                if frame is None:
+                    raise ConnectionResetError('The server closed the connection mid-request.')
+                if frame.msg_type == MSG_BUSY:
+                    raise ServerBusyError(frame.text())
+                if frame.request_id == request_id:
+                    break
+        except Exception:
+            self.close()
+            raise
+
+        self.__last_used = time.monotonic()
+        if frame.msg_type != MSG_RESULTS:
+            raise ConnectionError(frame.text())
+
+        results = frame.json()
+        return results['memos'], results['next']
+
+
+class ConnectionPool:
+    """
+    A bounded pool of persistent connections to one `(host, port)`.
+
+    Idle connections are health-checked before they are handed out, and new connections are opened with exponential
+    backoff between failed attempts. Requests turned away with a busy frame are retried with the same backoff; other
+    requests are not retried once written, since the server may already have stored the memos.
+
+    Attributes:
+        host (str):
+            The server host.
+
+        port (int):
+            The server port.
+
+        max_connections (int):
+            The most connections, idle or in use, the pool will hold open at once.
+    """
+
+    def __init__(
+            self,
+            host='127.0.0.1',
+            port=65432,
+            max_connections=4,
+            timeout=5.0,
+            connect_retries=3,
+            backoff=0.1,
+            max_backoff=2.0,
+    ):
+        """
+        Initializes the connection pool.
+
+        Parameters:
+            host (str):
+                The server host.
+
+            port (int):
+                The server port.
+
+            max_connections (int):
+                The most connections the pool will hold open at once; callers block for a free one beyond that.
+
+            timeout (float):
+                The socket timeout, in seconds, and the longest a caller will wait for a free connection.
+
+            connect_retries (int):
+                How many times to retry a failed connect, or a request the server was too busy to take, before
+                giving up.
+
+            backoff (float):
+                The delay, in seconds, before the first retry. Doubles on every further retry.
+
+            max_backoff (float):
+                The longest delay, in seconds, between retries.
+        """
+        self.host = host
+        self.port = port
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.connect_retries = connect_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.__idle = deque()
+        self.__lock = threading.Lock()
+        self.__slots = threading.BoundedSemaphore(max_connections)
+        self.__closed = False
+
+    @property
+    def closed(self) -> bool:
+        """
+        Whether `close` has been called on the pool.
+        """
+        return self.__closed
+
+    @property
+    def idle_count(self) -> int:
+        """
+        The number of open connections waiting to be reused.
+        """
+        return len(self.__idle)
+
+    def _connect(self) -> MemoConnection:
+        """
+        Opens a new connection, retrying with exponential backoff.
+        """
+        delay = self.backoff
+        for attempt in range(self.connect_retries + 1):
+            connection = MemoConnection(self.host, self.port, self.timeout)
+            try:
+                connection.connect()
+                return connection
+            except OSError:
+                if attempt == self.connect_retries:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+
+    def _take_idle(self):
+        """
+        Pops the most recently used idle connection that passes its health check, closing any that fail.
+        """
+        while True:
+            with self.__lock:
+                if not self.__idle:
+                    return None
+                connection = self.__idle.pop()
+
+            if connection.is_healthy():
+                return connection
+
+            connection.close()
+
+    @contextmanager
+    def connection(self):
+        """
+        Checks a connection out of the pool for the duration of the `with` block.
+
+        Yields:
+            MemoConnection:
+                A connected, healthy connection.
+
+        Raises:
+            TimeoutError:
+                If no connection became free within `timeout` seconds.
+        """
+        if self.__closed:
+            raise RuntimeError('The connection pool has been closed.')
+
+        if not self.__slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f'No free connection to {self.host}:{self.port} within {self.timeout}s.')
+
+        connection = None
+        try:
+            connection = self._take_idle() or self._connect()
+            yield connection
+        finally:
+            if connection is not None:
+                if connection.connected and not self.__closed:
+                    with self.__lock:
+                        self.__idle.append(connection)
+                else:
+                    connection.close()
+            self.__slots.release()
+
+    def _request(self, method, *args):
+        """
+        Calls `method` on a pooled connection, retrying with backoff while the server reports that it is busy.
+        """
+        delay = self.backoff
+        for attempt in range(self.connect_retries + 1):
+            try:
+                with self.connection() as connection:
+                    return getattr(connection, method)(*args)
+            except ServerBusyError:
+                if attempt == self.connect_retries:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+
+    def send_memos(self, memos) -> list:
+        """
+        Sends memos over a pooled connection. See `MemoConnection.send_memos`.
+        """
+        return self._request('send_memos', memos)
+
+    def send_batch(self, memos):
+        """
+        Sends a batch of memos over a pooled connection. See `MemoConnection.send_batch`.
+        """
+        return self._request('send_batch', memos)
+
+    def iter_memos(self, after=None, page_size=500, limit=None):
+        """
+        Streams stored memos over a pooled connection, which is held until the generator finishes or is closed. See
+        `MemoConnection.iter_memos`.
+        """
+        with self.connection() as connection:
+            yield from connection.iter_memos(after, page_size, limit)
+
+    def search(self, query, phrase=False, prefix=False, author=None, limit=20, after=None):
+        """
+        Runs a full-text search over a pooled connection. See `MemoConnection.search`.
+        """
+        return self._request('search', query, phrase, prefix, author, limit, after)
+
+    def close(self):
+        """
+        Closes every idle connection; connections in use are closed when they are returned.
+        """
+        self.__closed = True
+        with self.__lock:
+            while self.__idle:
+                self.__idle.pop().close()
+
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(host='127.0.0.1', port=65432, **kwargs) -> ConnectionPool:
+    """
+    Gets the process-wide connection pool for `(host, port)`, creating it on first use.
+
+    Parameters:
+        host (str):
+            The server host.
+
+        port (int):
+            The server port.
+
+        **kwargs:
+            Passed to `ConnectionPool` when the pool is created; ignored afterwards.
+
+    Returns:
+        ConnectionPool:
+            The shared pool.
+    """
+    with _POOLS_LOCK:
+        pool = _POOLS.get((host, port))
+        if pool is None or pool.closed:
+            pool = _POOLS[(host, port)] = ConnectionPool(host, port, **kwargs)
+
+        return pool
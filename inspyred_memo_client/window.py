@@ -0,0 +1,142 @@
+import PySimpleGUI as sg
+import inspect
+from inspyred_memo_client.connection import get_pool
+
+
+class MemoClientWindow:
+    __auto_build = False
+    __blueprint = None
+    __built = False
+    __running = False
+    __title = 'Memo Client'
+    __window = None
+    __no_titlebar = False
+    __instance_name = 'MemoClientWindow'
+    __template_logger = None
+
+    def __init__(self, host='127.0.0.1', port=65432, auto_build=False):
+        self.host = host
+        self.port = port
+        self.__auto_build = auto_build
+        self.__blueprint = [
+            [sg.Text('Enter your memo:')],
+            [sg.InputText(key='memo', size=(40, 1))],
+            [sg.Button('Send'), sg.Button('Exit')]
+        ]
+        if self.__auto_build:
+            self.build()
+
+    def build(self):
+        if self.__built:
+            raise Exception('Window has already been built!')
+        self.__window = sg.Window(self.__title, self.__blueprint, no_titlebar=self.__no_titlebar)
+        self.__built = True
+
+    @property
+    def pool(self):
+        """
+        The connection pool shared by every client talking to this window's `(host, port)`.
+        """
+        return get_pool(self.host, self.port)
+
+    def send_memo(self, memo):
+        return self.send_memos([memo])[0]
+
+    def send_memos(self, memos):
+        """
+        Sends memos to the server over a pooled connection, pipelining the frames.
+
+        Parameters:
+            memos (list[str]):
+                The memos to send.
+
+        Returns:
+            list[int | None]:
+                The id the server stored each memo under, in the order given, or None where it was not acknowledged.
+        """
+        return self.pool.send_memos(memos)
+
+    def send_batch(self, memos):
+        """
+        Sends memos to the server as a single batch, which the server stores in one transaction.
+
+        Parameters:
+            memos (list[str]):
+                The memos to send.
+
+        Returns:
+            list[int] | None:
+                The ids the server stored the memos under, in the order given, or None if the batch was rejected.
+        """
+        return self.pool.send_batch(memos)
+
+    def iter_memos(self, after=None, page_size=500, limit=None):
+        """
+        Streams the memos stored on the server, one page at a time, in the order they were received.
+
+        Parameters:
+            after (tuple, optional):
+                The (created_at, id) cursor to start after.
+
+            page_size (int):
+                The number of memos per page.
+
+            limit (int, optional):
+                The most memos to fetch. Defaults to all of them.
+
+        Yields:
+            dict:
+                Each memo, with its `id`, `created_at`, `author`, `size` and `body`.
+        """
+        yield from self.pool.iter_memos(after, page_size, limit)
+
+    def search(self, query, phrase=False, prefix=False, author=None, limit=20, after=None):
+        """
+        Searches the text of the memos stored on the server.
+
+        Parameters:
+            query (str):
+                The words to look for.
+
+            phrase (bool):
+                Match the words as one consecutive phrase.
+
+            prefix (bool):
+                Let words match as prefixes.
+
+            author (str, optional):
+                Only match memos by this author.
+
+            limit (int):
+                The most results to return.
+
+            after (list, optional):
+                The cursor returned with the previous page.
+
+        Returns:
+            tuple:
+                The matching memos, best first, and the cursor for the next page (None when there are no more).
+        """
+        return self.pool.search(query, phrase, prefix, author, limit, after)
+
+    def run(self):
+        if not self.__built:
+            self.build()
+        self.__running = True
+        while self.__running:
+            event, values = self.__window.read()
+            if event in (sg.WIN_CLOSED, 'Exit'):
+                break
+            elif event == 'Send':
+                memo = values['memo']
+                if memo.strip():
+                    if self.send_memo(memo) is not None:
+                        sg.popup('Memo sent!', keep_on_top=True)
+                    else:
+                        sg.popup('The server did not acknowledge the memo.', keep_on_top=True)
+        self.__window.close()
+
+
+if __name__ == '__main__':
+    client_window = MemoClientWindow(auto_build=True)
+    client_window.run()
@@ -15,8 +15,55 @@ Description:
     
 
 """
+import asyncio
+import inspect
 import socket
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from inspyred_memo_server.errors.protocol import ProtocolError
+from inspyred_memo_server.protocol import (
+    FrameReader,
+    MSG_ACK,
+    MSG_BATCH,
+    MSG_BUSY,
+    MSG_ERROR,
+    MSG_LIST,
+    MSG_MEMO,
+    MSG_PAGE,
+    MSG_RESULTS,
+    MSG_SEARCH,
+    encode_frame,
+    encode_json_frame,
+    read_frame_async,
+)
+from inspyred_memo_server.stats import ConnectionStats
+from inspyred_memo_server.store import MemoRecord, MemoryMemoStore
+from inspyred_memo_server.utils.decorators import validate_type
+
+
+ENGINES = ('threaded', 'asyncio', 'pool')
+"""The connection-handling engines a `MemoServer` can run with."""
+
+DEFAULT_PAGE_SIZE = 500
+"""The number of memos per page when a list request does not ask for a page size."""
+
+DEFAULT_SEARCH_LIMIT = 20
+"""The number of results per page when a search request does not ask for a limit."""
+
+MAX_PAGE_SIZE = 5000
+"""The most memos a single page may hold, whatever the client asks for."""
+
+OVERFLOW_POLICIES = ('reject', 'block')
+"""What the 'pool' engine does with a new connection when every worker is busy and the queue is full."""
+
+
+def _paged_memos(store, page_size):
+    after = None
+    while page := store.page(after, page_size):
+        for memo in page:
+            yield MemoRecord(**memo)
+
+        after = (page[-1]['created_at'], page[-1]['id'])
 
 
 class MemoServer:
@@ -26,52 +73,591 @@ class MemoServer:
     Attributes:
         host (str): The server host.
         port (int): The server port.
-        memos (list): List to store memos.
+        engine (str): The engine used to serve connections (one of `ENGINES`).
+        store (MemoryMemoStore): The store memos are written to.
+        memos (Iterable[MemoRecord]): The stored memos.
+        max_workers (int): The number of worker threads used by the 'pool' engine, and by the 'asyncio' engine to
+                           call a synchronous store.
+        queue_depth (int): How many accepted connections the 'pool' engine lets wait for a worker.
+        overflow (str): What the 'pool' engine does when the queue is full (one of `OVERFLOW_POLICIES`).
+        idle_timeout (float): How long a 'pool' engine worker waits on a silent connection before closing it.
+        reuse_port (bool): Whether the listening socket is bound with SO_REUSEPORT.
+        stats (ConnectionStats): Counters for accepted, queued, active, rejected and completed connections.
     """
 
-    def __init__(self, host='127.0.0.1', port=65432):
+    def __init__(
+            self,
+            host='127.0.0.1',
+            port=65432,
+            engine='threaded',
+            store=None,
+            max_workers=16,
+            queue_depth=64,
+            overflow='reject',
+            idle_timeout=30.0,
+            reuse_port=False,
+    ):
         """
         Initializes the memo server with host and port.
 
         Args:
             host (str): The host to bind the server. Defaults to '127.0.0.1'.
             port (int): The port to bind the server. Defaults to 65432.
+            engine (str): The engine to serve connections with. 'threaded' starts a thread per connection,
+                          'asyncio' serves every connection from a single event loop. Defaults to 'threaded'.
+                          'pool' hands connections to a fixed-size worker pool behind a bounded queue.
+            store (MemoryMemoStore, optional): The store to write memos to. Defaults to a new in-memory store; pass a
+                                               `DurableMemoStore` (from `inspyred_memo_server.store.wal`) to keep
+                                               memos across restarts, or an `AsyncDatabaseMemoStore` (with the
+                                               'asyncio' engine) to store them in the database from the event loop.
+            max_workers (int): The number of worker threads used by the 'pool' engine, and by the 'asyncio' engine to
+                               call a synchronous store off the event loop. Defaults to 16.
+            queue_depth (int): How many accepted connections may wait for a free worker in the 'pool' engine before
+                               the overflow policy applies. Defaults to 64.
+            overflow (str): 'reject' answers excess connections with a busy frame and closes them; 'block' stops
+                            accepting until a worker frees up, leaving new clients in the kernel's listen backlog.
+                            Defaults to 'reject'.
+            idle_timeout (float): How long, in seconds, a 'pool' engine worker waits on a silent connection before
+                                  closing it, so idle persistent clients cannot pin every worker. Defaults to 30.
         """
+        self.__engine = None
+        self.__overflow = None
+        self.__store_executor = None
+
         self.host = host
         self.port = port
-        self.memos = []
+        self.engine = engine
+        self.store = store if store is not None else MemoryMemoStore()
+        self.max_workers = max_workers
+        self.queue_depth = queue_depth
+        self.overflow = overflow
+        self.idle_timeout = idle_timeout
+        self.reuse_port = reuse_port
+        self.stats = ConnectionStats()
+
+    @property
+    def engine(self):
+        """
+        Gets the engine used to serve connections.
+
+        Returns:
+            str:
+                The engine name.
+        """
+        return self.__engine
+
+    @engine.setter
+    @validate_type(str, allowed_values=ENGINES)
+    def engine(self, new):
+        self.__engine = new
+
+    @property
+    def overflow(self):
+        """
+        Gets the overflow policy of the 'pool' engine.
+
+        Returns:
+            str:
+                The policy name.
+        """
+        return self.__overflow
+
+    @overflow.setter
+    @validate_type(str, allowed_values=OVERFLOW_POLICIES)
+    def overflow(self, new):
+        self.__overflow = new
+
+    @property
+    def memos(self):
+        """
+        Gets the stored memos.
+
+        Stores that keep memos in memory hand back their own view. Database-backed stores are walked a page at a time
+        with `page`, so the memos are read lazily rather than loaded all at once.
+
+        Returns:
+            Iterable[MemoRecord]:
+                The memos held by the store, in (created_at, id) order.
+
+        Raises:
+            TypeError:
+                If the store is async; await its `page` method instead.
+        """
+        if hasattr(self.store, 'memos'):
+            return self.store.memos
+
+        if self.async_store:
+            raise TypeError(f'{type(self.store).__name__} is async; page through it with `await store.page(...)`')
+
+        return _paged_memos(self.store, DEFAULT_PAGE_SIZE)
+
+    def store_memo(self, memo):
+        """
+        Stores a received memo.
+
+        Args:
+            memo (str): The memo to store.
+
+        Returns:
+            int: The id of the stored memo.
+        """
+        print(f"Received memo: {memo}")
+        return self.store.add(memo)
+
+    def store_memos(self, memos):
+        """
+        Stores a batch of received memos in a single store transaction.
+
+        Args:
+            memos (list[str]): The memos to store.
+
+        Returns:
+            list[int]: The ids of the stored memos, in the order given.
+        """
+        print(f"Received batch of {len(memos)} memos")
+        return self.store.add_many(memos)
+
+    @property
+    def async_store(self):
+        """
+        Whether the store's methods are coroutines (e.g. `AsyncDatabaseMemoStore`), which only the 'asyncio' engine
+        can await.
+
+        Returns:
+            bool:
+                True for an async store.
+        """
+        return inspect.iscoroutinefunction(getattr(self.store, 'add_many', None))
+
+    @staticmethod
+    def _decode_memo(frame):
+        try:
+            return frame.text()
+        except UnicodeDecodeError as e:
+            raise ValueError(f'Memo is not valid UTF-8: {e}') from e
+
+    @staticmethod
+    def _decode_batch(frame):
+        try:
+            memos = frame.json()
+        except ValueError as e:
+            raise ValueError(f'Batch is not valid JSON: {e}') from e
+
+        if not isinstance(memos, list) or not all(isinstance(memo, str) for memo in memos):
+            raise ValueError('Batch must be a JSON array of strings.')
+
+        return memos
+
+    @staticmethod
+    def _decode_list(frame):
+        try:
+            request = frame.json()
+            after = request.get('after')
+            after = (float(after[0]), int(after[1])) if after is not None else None
+            page_size = min(int(request.get('page_size', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+            limit = request.get('limit')
+            limit = int(limit) if limit is not None else None
+        except (ValueError, TypeError, AttributeError, IndexError, KeyError) as e:
+            raise ValueError(f'Malformed list request: {e}') from e
+
+        return after, page_size, limit
+
+    @staticmethod
+    def _decode_search(frame):
+        try:
+            request = frame.json()
+            after = request.get('after')
+            return {
+                'query': str(request['query']),
+                'phrase': bool(request.get('phrase', False)),
+                'prefix': bool(request.get('prefix', False)),
+                'author': request.get('author'),
+                'limit': min(int(request.get('limit', DEFAULT_SEARCH_LIMIT)), MAX_PAGE_SIZE),
+                'after': (float(after[0]), int(after[1])) if after is not None else None,
+            }
+        except (ValueError, TypeError, AttributeError, IndexError, KeyError) as e:
+            raise ValueError(f'Malformed search request: {e}') from e
+
+    @staticmethod
+    def _error(request_id, message):
+        return encode_frame(MSG_ERROR, request_id, str(message).encode('utf-8'))
+
+    @staticmethod
+    def _results_frame(request_id, results, limit):
+        cursor = [results[-1]['rank'], results[-1]['id']] if len(results) == limit else None
+        return encode_json_frame(MSG_RESULTS, request_id, {'memos': results, 'next': cursor})
+
+    @staticmethod
+    def _page_frame(request_id, page, after, size, sent, limit):
+        """
+        Encodes one page of a listing.
+
+        Returns:
+            tuple: The encoded frame, the cursor after the page, and whether it is the last page.
+        """
+        if page:
+            after = (page[-1]['created_at'], page[-1]['id'])
+
+        exhausted = len(page) < size
+        last = exhausted or (limit is not None and sent >= limit)
+        frame = encode_json_frame(MSG_PAGE, request_id, {
+            'memos': page,
+            'next': None if exhausted else list(after) if after is not None else None,
+            'last': last,
+        })
+        return frame, after, last
+
+    def handle_frame(self, frame):
+        """
+        Handles a single request frame.
+
+        Most requests are answered by one frame; a list request is answered by a stream of pages, produced one at a
+        time so that the server never holds more than a page of results in memory.
+
+        Args:
+            frame (Frame): The request frame.
+
+        Yields:
+            bytes: The encoded reply frames, in order.
+        """
+        decoders = {
+            MSG_MEMO: self._decode_memo,
+            MSG_BATCH: self._decode_batch,
+            MSG_LIST: self._decode_list,
+        }
+        try:
+            request = decoders[frame.msg_type](frame) if frame.msg_type in decoders else None
+        except ValueError as e:
+            yield self._error(frame.request_id, e)
+            return
+
+        if frame.msg_type == MSG_MEMO:
+            yield encode_json_frame(MSG_ACK, frame.request_id, {'ids': [self.store_memo(request)]})
+
+        elif frame.msg_type == MSG_BATCH:
+            yield encode_json_frame(MSG_ACK, frame.request_id, {'ids': self.store_memos(request)})
+
+        elif frame.msg_type == MSG_LIST:
+            yield from self.list_pages(frame.request_id, *request)
+
+        elif frame.msg_type == MSG_SEARCH:
+            yield self.search(frame)
+
+        else:
+            yield self._error(frame.request_id, f'Unknown message type {frame.msg_type}.')
+
+    async def handle_frame_async(self, frame):
+        """
+        Handles a single request frame for an async store, awaiting each store call. See `handle_frame`.
+
+        Args:
+            frame (Frame): The request frame.
+
+        Yields:
+            bytes: The encoded reply frames, in order.
+        """
+        decoders = {
+            MSG_MEMO: self._decode_memo,
+            MSG_BATCH: self._decode_batch,
+            MSG_LIST: self._decode_list,
+            MSG_SEARCH: self._decode_search,
+        }
+        try:
+            request = decoders[frame.msg_type](frame) if frame.msg_type in decoders else None
+        except ValueError as e:
+            yield self._error(frame.request_id, e)
+            return
+
+        if frame.msg_type == MSG_MEMO:
+            print(f"Received memo: {request}")
+            yield encode_json_frame(MSG_ACK, frame.request_id, {'ids': [await self.store.add(request)]})
+
+        elif frame.msg_type == MSG_BATCH:
+            print(f"Received batch of {len(request)} memos")
+            yield encode_json_frame(MSG_ACK, frame.request_id, {'ids': await self.store.add_many(request)})
+
+        elif frame.msg_type == MSG_LIST:
+            after, page_size, limit = request
+            sent = 0
+            last = False
+            while not last:
+                size = page_size if limit is None else min(page_size, limit - sent)
+                page = await self.store.page(after, size) if size > 0 else []
+                sent += len(page)
+                reply, after, last = self._page_frame(frame.request_id, page, after, size, sent, limit)
+                yield reply
+
+        elif frame.msg_type == MSG_SEARCH:
+            try:
+                results = await self.store.search(**request)
+            except ValueError as e:
+                yield self._error(frame.request_id, f'Malformed search request: {e}')
+                return
+            yield self._results_frame(frame.request_id, results, request['limit'])
+
+        else:
+            yield self._error(frame.request_id, f'Unknown message type {frame.msg_type}.')
+
+    def search(self, frame):
+        """
+        Answers a full-text search request with one page of ranked results.
+
+        Args:
+            frame (Frame): The `MSG_SEARCH` request frame.
+
+        Returns:
+            bytes: The encoded `MSG_RESULTS` reply, or a `MSG_ERROR` if the request is malformed or the store cannot
+                   search.
+        """
+        if not hasattr(self.store, 'search'):
+            return self._error(frame.request_id, 'This server\'s memo store does not support search.')
+
+        try:
+            request = self._decode_search(frame)
+        except ValueError as e:
+            return self._error(frame.request_id, e)
+
+        try:
+            results = self.store.search(**request)
+        except ValueError as e:
+            return self._error(frame.request_id, f'Malformed search request: {e}')
+
+        return self._results_frame(frame.request_id, results, request['limit'])
+
+    def list_pages(self, request_id, after=None, page_size=DEFAULT_PAGE_SIZE, limit=None):
+        """
+        Streams stored memos as pages, in (created_at, id) order.
+
+        Each page is fetched from the store with a keyset query that starts just after the last memo of the previous
+        page, so the cost of a page does not depend on how far into the listing it is.
+
+        Args:
+            request_id (int): The id of the list request being answered.
+            after (tuple, optional): The (created_at, id) cursor to start after. Defaults to the beginning.
+            page_size (int): The most memos per page.
+            limit (int, optional): The most memos to send in total. Defaults to all of them.
+
+        Yields:
+            bytes: Encoded `MSG_PAGE` frames; the final one is marked `last`.
+        """
+        sent = 0
+        last = False
+        while not last:
+            size = page_size if limit is None else min(page_size, limit - sent)
+            page = self.store.page(after, size) if size > 0 else []
+            sent += len(page)
+            reply, after, last = self._page_frame(request_id, page, after, size, sent, limit)
+            yield reply
 
     def handle_client(self, connection, address):
         """
         Handles the client connection to receive memos.
 
+        Frames are answered in the order they arrive, so clients may pipeline requests.
+
         Args:
             connection (socket.socket): The client connection.
             address (tuple): The client address.
         """
         print(f"Connected by {address}")
-        while True:
-            data = connection.recv(1024)
-            if not data:
-                break
-            memo = data.decode('utf-8')
-            print(f"Received memo: {memo}")
-            self.memos.append(memo)
-        connection.close()
+        reader = FrameReader(connection)
+        try:
+            while True:
+                frame = reader.read_frame()
+                if frame is None:
+                    break
+                for reply in self.handle_frame(frame):
+                    connection.sendall(reply)
+        except ProtocolError as e:
+            print(f"Dropping {address}: {e}")
+            connection.sendall(encode_frame(MSG_ERROR, 0, e.additional_info.encode('utf-8')))
+        except TimeoutError:
+            print(f"Closing idle connection from {address}")
+        except ConnectionError:
+            print(f"Connection from {address} closed by peer")
+        finally:
+            connection.close()
+
+    async def handle_client_async(self, reader, writer):
+        """
+        Handles a client connection on the event loop to receive memos.
+
+        A synchronous store may block (a `DurableMemoStore` waits for its fsync, a `DatabaseMemoStore` for its
+        writer), so its calls are made on the store executor rather than the loop; frames on one connection are still
+        answered in order.
+
+        Args:
+            reader (asyncio.StreamReader): The stream to read from the client.
+            writer (asyncio.StreamWriter): The stream to write to the client.
+        """
+        address = writer.get_extra_info('peername')
+        print(f"Connected by {address}")
+        self.stats.increment('accepted')
+        self.stats.increment('active')
+        try:
+            while True:
+                frame = await read_frame_async(reader)
+                if frame is None:
+                    break
+                if self.async_store:
+                    async for reply in self.handle_frame_async(frame):
+                        writer.write(reply)
+                        await writer.drain()
+                else:
+                    loop = asyncio.get_running_loop()
+                    replies = self.handle_frame(frame)
+                    # Each step of the generator makes at most one store call; `handle_frame` never yields None.
+                    while (reply := await loop.run_in_executor(self.__store_executor, next, replies, None)) is not None:
+                        writer.write(reply)
+                        await writer.drain()
+        except ProtocolError as e:
+            print(f"Dropping {address}: {e}")
+            writer.write(encode_frame(MSG_ERROR, 0, e.additional_info.encode('utf-8')))
+        except ConnectionError:
+            print(f"Connection from {address} closed by peer")
+        finally:
+            self.stats.move('active', 'completed')
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    def _serve(self, connection, address, queued=False):
+        """
+        Runs `handle_client` for one connection, keeping the connection counters up to date.
+
+        Args:
+            connection (socket.socket): The client connection.
+            address (tuple): The client address.
+            queued (bool): Whether the connection was counted as queued while it waited for a worker.
+        """
+        if queued:
+            self.stats.move('queued', 'active')
+            connection.settimeout(self.idle_timeout)
+        else:
+            self.stats.increment('active')
+
+        try:
+            self.handle_client(connection, address)
+        finally:
+            self.stats.move('active', 'completed')
+
+    def _reject(self, connection, address):
+        """
+        Turns a connection away with a busy frame because the server is at capacity.
+
+        Args:
+            connection (socket.socket): The client connection.
+            address (tuple): The client address.
+        """
+        self.stats.increment('rejected')
+        print(f"Rejecting {address}: server busy")
+        try:
+            connection.sendall(encode_frame(MSG_BUSY, 0, b'Server busy, try again later.'))
+        except OSError:
+            pass
+        finally:
+            connection.close()
+
+    def _listen(self):
+        """
+        Creates the listening socket.
+
+        Returns:
+            socket.socket: The bound, listening socket.
+        """
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if self.reuse_port:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        s.bind((self.host, self.port))
+        s.listen()
+        return s
 
     def start(self):
         """
-        Starts the memo server to accept connections and receive memos.
+        Starts the memo server to accept connections and receive memos, using the configured engine.
         """
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.bind((self.host, self.port))
-            s.listen()
+        if self.async_store and self.engine != 'asyncio':
+            raise ValueError(f"An async memo store needs the 'asyncio' engine, not {self.engine!r}.")
+
+        if self.engine == 'asyncio':
+            asyncio.run(self.start_async())
+        elif self.engine == 'pool':
+            self.start_pooled()
+        else:
+            self.start_threaded()
+
+    async def start_async(self):
+        """
+        Serves connections from a single event loop until cancelled.
+
+        A synchronous store is called from a pool of `max_workers` threads, so a blocking store call holds up only the
+        connection that made it.
+        """
+        # The pool must exist before the first connection can be accepted, or its handler would find none.
+        if not self.async_store:
+            self.__store_executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='memo-store')
+
+        try:
+            server = await asyncio.start_server(
+                self.handle_client_async,
+                self.host,
+                self.port,
+                reuse_port=self.reuse_port or None,
+            )
+            async with server:
+                print(f"Server started at {self.host}:{self.port} (asyncio)")
+                await server.serve_forever()
+        finally:
+            if self.__store_executor is not None:
+                self.__store_executor.shutdown(wait=False)
+                self.__store_executor = None
+
+    def start_threaded(self):
+        """
+        Serves connections by starting a new thread for each accepted connection.
+        """
+        with self._listen() as s:
             print(f"Server started at {self.host}:{self.port}")
             while True:
                 conn, addr = s.accept()
-                thread = threading.Thread(target=self.handle_client, args=(conn, addr))
+                self.stats.increment('accepted')
+                thread = threading.Thread(target=self._serve, args=(conn, addr))
                 thread.start()
 
+    def start_pooled(self):
+        """
+        Serves connections from a fixed-size pool of worker threads.
+
+        At most `max_workers` connections are served at once and at most `queue_depth` more wait for a worker; beyond
+        that the `overflow` policy applies, so a flood of clients raises latency rather than the thread count.
+        """
+        capacity = threading.BoundedSemaphore(self.max_workers + self.queue_depth)
+
+        def serve(connection, address):
+            try:
+                self._serve(connection, address, queued=True)
+            finally:
+                capacity.release()
+
+        with self._listen() as s, ThreadPoolExecutor(self.max_workers, thread_name_prefix='memo-worker') as executor:
+            print(f"Server started at {self.host}:{self.port} (pool of {self.max_workers}, queue {self.queue_depth})")
+            while True:
+                if self.overflow == 'block':
+                    capacity.acquire()
+                    conn, addr = s.accept()
+                    self.stats.increment('accepted')
+                else:
+                    conn, addr = s.accept()
+                    self.stats.increment('accepted')
+                    if not capacity.acquire(blocking=False):
+                        self._reject(conn, addr)
+                        continue
+
+                self.stats.increment('queued')
+                executor.submit(serve, conn, addr)
+
 
 # Example of starting the server
 if __name__ == '__main__':
@@ -17,7 +17,55 @@ Description:
 """
 from inspyred_memo_server.config.dirs import DEFAULT_DIRS
 
-__all__ = ['DATABASE_URL']
+__all__ = ['DATABASE_URL', 'DB_POOL', 'ENCRYPTION_KEY', 'MEMO_COMPRESSION', 'PASSWORD_HASHING', 'SQLITE_PROFILE']
 
 # The database URL.
 DATABASE_URL = f'sqlite:///{DEFAULT_DIRS.data}/memos.db'
+
+# The SQLite pragmas applied to every database connection (see `inspyred_memo_server.database.tuning.SQLiteProfile`).
+SQLITE_PROFILE = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,
+}
+
+# The size of the database connection pool (see `inspyred_memo_server.database.session.pool_options`). Sessions beyond
+# `pool_size + max_overflow` wait up to `pool_timeout` seconds for a connection.
+DB_POOL = {
+    'pool_size': 16,
+    'max_overflow': 16,
+    'pool_timeout': 30.0,
+}
+
+# How memo bodies are compressed before encryption (see `inspyred_memo_server.database.compression.BodyCodec`). Bodies
+# of at least `threshold` UTF-8 bytes are compressed with `codec` ('auto' picks zstd if installed, otherwise zlib).
+MEMO_COMPRESSION = {
+    'threshold': 1024,
+    'codec': 'auto',
+}
+
+# Where the database encryption key comes from (see `inspyred_memo_server.database.crypt.get_key_provider`). `backend`
+# is 'auto', 'env', 'keyring' or 'file'; `file` defaults to `memos.key` in the config directory; and `ttl`, if set, is
+# how many seconds the key is cached before it is fetched again.
+ENCRYPTION_KEY = {
+    'backend': 'auto',
+    'env_var': 'INSPYRED_MEMOS_KEY',
+    'file': None,
+    'ttl': None,
+}
+
+# How passwords are hashed (see `inspyred_memo_server.database.user.auth.get_password_hasher`). bcrypt runs on
+# `max_workers` threads (default: the CPU count, up to 4) with at most `max_queue` more hashes waiting. If `cost` is
+# None, it is calibrated at start-up to the highest cost between `min_cost` and `max_cost` that hashes within
+# `target_latency` seconds.
+PASSWORD_HASHING = {
+    'cost': None,
+    'target_latency': 0.25,
+    'min_cost': 10,
+    'max_cost': 16,
+    'max_workers': None,
+    'max_queue': 64,
+}
@@ -19,7 +19,7 @@ from inspyred_memo_server.config.dirs.defaults import DEFAULT_DIRS
 from pathlib import Path
 import json
 from inspyred_memo_server.utils.helpers.system import open_in_file_explorer
-from inspyred_memo_server.utils.decorators import validate_type, property_alias
+from inspyred_memo_server.utils.decorators import lazy_singleton, validate_type, property_alias
 
 
 @property_alias('data', 'data_dir')
@@ -50,7 +50,6 @@ class AppDirs:
 
         self.__initialized = False
 
-
         self.data_dir = data_dir or self._load_dir_from_cache('data') or DEFAULT_DIRS.data
         self.config_dir = config_dir or self._load_dir_from_cache('config') or DEFAULT_DIRS.config
         self.log_dir = log_dir or self._load_dir_from_cache('log') or DEFAULT_DIRS.log
@@ -64,6 +63,8 @@ class AppDirs:
         self._ensure_dirs_exist()
         self._update_cache_if_needed()
 
+        self.__initialized = True
+
     @property
     def data_dir(self):
         return self.__data_dir
@@ -169,9 +170,19 @@ class AppDirs:
         return None
 
     def _set_directory(self, attribute_name, new_dir, default_dir):
-        
+        """
+        Sets a directory, falling back to a default when no directory is given.
+
+        Args:
+            attribute_name (str): The directory attribute to set (e.g. 'data_dir').
+            new_dir (Path or None): The directory to use.
+            default_dir (Path): The directory to use if `new_dir` is None.
+        """
+        setattr(self, attribute_name, new_dir or default_dir)
 
     def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+
         dirs = [
             'data',
             'cache',
@@ -179,10 +190,26 @@ class AppDirs:
             'log'
         ]
 
-        for _ in dirs:
-            if _ in name:
-                super().__setattr__(name, value)
-                self._update_cache_if_needed()
+        # Only changes made after initialization need to be written back to the cache.
+        if name.removesuffix('_dir') in dirs and self.__dict__.get('_AppDirs__initialized'):
+            self._update_cache_if_needed()
+
+
+@lazy_singleton
+def get_app_dirs():
+    """
+    Gets the application directories, resolving (and creating) them on first use.
+
+    Returns:
+        AppDirs:
+            The application directories.
+    """
+    return AppDirs()
+
 
+def __getattr__(name):
+    # `APP_DIRS` is kept for existing callers, but is only built when first accessed.
+    if name == 'APP_DIRS':
+        return get_app_dirs()
 
-APP_DIRS = AppDirs()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
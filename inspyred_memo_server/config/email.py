@@ -1,6 +1,6 @@
 from configparser import ConfigParser
 from pathlib import Path
-from inspyred_memo_server.config.dirs import APP_DIRS
+from inspyred_memo_server.config.dirs import get_app_dirs
 from inspyred_memo_server.utils.decorators import validate_type
 from inspyred_memo_server.errors.config import *
 
@@ -42,7 +42,7 @@ class EMailConfig:
 
     def __init__(
             self,
-            config_file=APP_DIRS.config_dir.joinpath('email.ini'),
+            config_file=None,
             auto_create=False,
             auto_load=False,
             no_write=False,
@@ -57,6 +57,10 @@ class EMailConfig:
         self.__config = None
         self.__no_write = None
 
+        # Resolved here rather than as the default value, so importing this module does not touch the filesystem.
+        if config_file is None:
+            config_file = get_app_dirs().config_dir.joinpath('email.ini')
+
         self.config_file = config_file
 
 
@@ -192,6 +196,5 @@ class EMailConfig:
 
     def save_config(self):
         if not self.no_write:
-
-        with self.config_file.open('w') as f:
-            self.config.write(f)
+            with self.config_file.open('w') as f:
+                self.config.write(f)
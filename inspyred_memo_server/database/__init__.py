@@ -15,38 +15,122 @@ Description:
     
 
 """
-from sqlalchemy import event, create_engine
-from sqlalchemy.orm import sessionmaker
-from inspyred_memo_server.config import DATABASE_URL
-from inspyred_memo_server.database.crypt import ENCRYPT_MAN
-from inspyred_memo_server.database.user import User, Base
+from pathlib import Path
+from sqlalchemy import event, create_engine, inspect
+from sqlalchemy.engine import make_url
+from inspyred_memo_server.config import DATABASE_URL, DB_POOL, SQLITE_PROFILE
+from inspyred_memo_server.database.compression import get_body_codec
+from inspyred_memo_server.database.user import Base
+from inspyred_memo_server.database.memo import Memo
+from inspyred_memo_server.database.migrations import migrate
+from inspyred_memo_server.database.search import CREATE_FTS_TABLE, index_memos, unindex_memo
+from inspyred_memo_server.database.session import SessionManager, pool_options
+from inspyred_memo_server.database.tuning import SQLiteProfile, install_profile
+from inspyred_memo_server.utils.decorators import lazy_singleton
 
 
-@event.listens_for(User, 'before_insert')
-def encrypt_password(mapper, connection, target):
+# Create the full-text index alongside the memos table.
+event.listen(Memo.__table__, 'after_create', CREATE_FTS_TABLE)
+
+
+@event.listens_for(Memo, 'after_insert')
+def index_memo(mapper, connection, target):
+    """
+    Adds a memo inserted through the ORM to the full-text index.
+    """
+    body = get_body_codec().decode(target.body, target.codec)
+    index_memos(connection, [{'id': target.id, 'body': body, 'author': target.author}])
+
+
+@event.listens_for(Memo, 'after_update')
+def reindex_memo(mapper, connection, target):
+    """
+    Re-indexes a memo whose body or author changed through the ORM.
+    """
+    state = inspect(target)
+    body_history = state.attrs.body.history
+    codec_history = state.attrs.codec.history
+    author_history = state.attrs.author.history
+    if not body_history.has_changes() and not author_history.has_changes():
+        return
+
+    old_body = body_history.deleted[0] if body_history.deleted else target.body
+    old_codec = codec_history.deleted[0] if codec_history.deleted else target.codec
+    old_author = author_history.deleted[0] if author_history.deleted else target.author
+
+    unindex_memo(connection, target.id, get_body_codec().decode(old_body, old_codec), old_author)
+    index_memo(mapper, connection, target)
+
+
+@event.listens_for(Memo, 'after_delete')
+def unindex_deleted_memo(mapper, connection, target):
+    """
+    Removes a memo deleted through the ORM from the full-text index.
     """
-    Encrypts the password before inserting a user.
+    unindex_memo(connection, target.id, get_body_codec().decode(target.body, target.codec), target.author)
+
+
+@lazy_singleton
+def get_engine():
+    """
+    Gets the application database engine, creating it and bringing the schema up to date on first use.
+
+    Returns:
+        sqlalchemy.engine.Engine:
+            The engine.
     """
-    target.hashed_password = ENCRYPT_MAN.encrypt(target.hashed_password)
+    url = make_url(DATABASE_URL)
+    if url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:'):
+        Path(url.database).parent.mkdir(parents=True, exist_ok=True)
+
+    engine = create_engine(url, **pool_options(url, **DB_POOL))
+
+    # WAL mode lets several server processes share the database file, and readers no longer block the writer.
+    install_profile(engine, SQLiteProfile(**SQLITE_PROFILE))
+
+    migrate(engine)
+    return engine
 
 
-@event.listens_for(User, 'before_update')
-def encrypt_password(mapper, connection, target):
+@lazy_singleton
+def get_sessions():
     """
-    Encrypts the password before updating a user.
+    Gets the session manager for the application database.
+
+    Use `get_sessions().unit_of_work()` for a session of your own, or `get_sessions().scoped` for a session shared
+    within the current thread or asyncio task (released with `get_sessions().remove()`).
+
+    Returns:
+        SessionManager:
+            The session manager.
     """
-    target.hashed_password = ENCRYPT_MAN.encrypt(target.hashed_password)
+    return SessionManager(get_engine())
 
 
-@event.listens_for(User, 'load')
-def decrypt_password(target, context):
+def dispose_engine(close=True):
     """
-    Decrypts the password after loading a user.
+    Disposes of the application engine's pooled connections, if the engine has been created.
+
+    Parameters:
+        close (bool):
+            Whether to close the connections. A process forked from one that used the engine must pass False, so it
+            drops its copies of the parent's connections without closing them under the parent.
     """
-    target.hashed_password = ENCRYPT_MAN.decrypt(target.hashed_password)
+    if get_engine.initialized():
+        get_engine().dispose(close=close)
+
+
+_LAZY_GLOBALS = {
+    'DB_ENGINE': get_engine,
+    'SESSIONS': get_sessions,
+    'Session': lambda: get_sessions().factory,
+    'DB_SESSION': lambda: get_sessions().scoped,
+}
+
 
+def __getattr__(name):
+    # The old module-level names still work, but nothing is connected or created until one is first used.
+    if name in _LAZY_GLOBALS:
+        return _LAZY_GLOBALS[name]()
 
-DB_ENGINE = create_engine(DATABASE_URL)
-Session = sessionmaker(bind=DB_ENGINE)
-DB_SESSION = Session()
-Base.metadata.create_all(DB_ENGINE)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,170 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    inspyred_memo_server/database/aio.py
+
+
+Description:
+    The asyncio side of the database layer: an async engine on the aiosqlite driver, async unit-of-work sessions, and
+    an executor for the CPU-heavy Fernet work that must stay off the event loop.
+
+    The schema is still migrated by the synchronous engine (see `prepare_schema`), once, before the async engine is
+    used. ORM event hooks (password encryption, full-text indexing, cache invalidation) fire for async sessions just
+    as they do for synchronous ones.
+
+"""
+import asyncio
+import functools
+from contextlib import asynccontextmanager
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from inspyred_memo_server.config import DATABASE_URL, DB_POOL, SQLITE_PROFILE
+from inspyred_memo_server.database.crypt import get_crypto_executor
+from inspyred_memo_server.database.session import pool_options
+from inspyred_memo_server.database.tuning import SQLiteProfile, install_profile
+from inspyred_memo_server.utils.decorators import lazy_singleton
+
+
+__all__ = [
+    'AsyncSessionManager',
+    'async_url',
+    'get_async_engine',
+    'get_async_sessions',
+    'get_crypto_executor',
+    'prepare_schema',
+    'run_cpu',
+]
+
+
+def async_url(url):
+    """
+    Gets the async-driver equivalent of a database URL.
+
+    Parameters:
+        url (str | sqlalchemy.engine.URL):
+            The database URL, e.g. `sqlite:///memos.db`.
+
+    Returns:
+        sqlalchemy.engine.URL:
+            The URL with an async driver, e.g. `sqlite+aiosqlite:///memos.db`.
+    """
+    url = make_url(url)
+    if url.drivername in ('sqlite', 'sqlite+pysqlite'):
+        url = url.set(drivername='sqlite+aiosqlite')
+
+    return url
+
+
+async def run_cpu(func, *args, **kwargs):
+    """
+    Runs a CPU-heavy function on the crypto executor and waits for its result without blocking the event loop.
+
+    Returns:
+        The value `func` returned.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_crypto_executor(), functools.partial(func, *args, **kwargs))
+
+
+class AsyncSessionManager:
+    """
+    Hands out async ORM sessions for one async engine, one per unit of work.
+
+    Attributes:
+        engine (sqlalchemy.ext.asyncio.AsyncEngine):
+            The engine sessions are bound to.
+
+        factory (sqlalchemy.ext.asyncio.async_sessionmaker):
+            Makes new sessions bound to the engine.
+    """
+
+    def __init__(self, engine, **session_options):
+        """
+        Initializes the manager.
+
+        Parameters:
+            engine (sqlalchemy.ext.asyncio.AsyncEngine):
+                The engine to bind sessions to.
+
+            **session_options:
+                Passed on to `async_sessionmaker`. `expire_on_commit` defaults to False, as expired attributes cannot
+                be lazily reloaded outside the session in async code.
+        """
+        session_options.setdefault('expire_on_commit', False)
+        self.engine = engine
+        self.factory = async_sessionmaker(engine, **session_options)
+
+    @asynccontextmanager
+    async def unit_of_work(self):
+        """
+        Runs a block in its own session and transaction.
+
+        Yields:
+            sqlalchemy.ext.asyncio.AsyncSession:
+                The session, committed when the block exits normally and rolled back if it raises.
+        """
+        session = self.factory()
+        try:
+            yield session
+            await session.commit()
+        except BaseException:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+    async def run(self, work, *args, **kwargs):
+        """
+        Awaits `work(session, *args, **kwargs)` inside a unit of work.
+
+        Returns:
+            The value `work` returned.
+        """
+        async with self.unit_of_work() as session:
+            return await work(session, *args, **kwargs)
+
+
+@lazy_singleton
+def get_async_engine():
+    """
+    Gets the async engine for the application database.
+
+    Creating it does no I/O; await `prepare_schema()` before first use so the schema is up to date.
+
+    Returns:
+        sqlalchemy.ext.asyncio.AsyncEngine:
+            The engine.
+    """
+    url = async_url(DATABASE_URL)
+    engine = create_async_engine(url, **pool_options(url, **DB_POOL))
+    install_profile(engine.sync_engine, SQLiteProfile(**SQLITE_PROFILE))
+    return engine
+
+
+@lazy_singleton
+def get_async_sessions():
+    """
+    Gets the async session manager for the application database.
+
+    Returns:
+        AsyncSessionManager:
+            The session manager.
+    """
+    return AsyncSessionManager(get_async_engine())
+
+
+async def prepare_schema():
+    """
+    Creates or migrates the application database's schema, on a worker thread, if that has not happened yet.
+    """
+    from inspyred_memo_server.database import get_engine
+
+    if not get_engine.initialized():
+        await asyncio.to_thread(get_engine)
@@ -0,0 +1,311 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    inspyred_memo_server/database/archive.py
+
+
+Description:
+    Exports memos to, and imports them from, newline-delimited JSON (NDJSON) archives, optionally gzip-compressed,
+    for backups and for moving memos between databases.
+
+    Each line of an archive is one memo:
+
+        {"id": 1, "author": "alice", "created_at": 1718000000.5, "body": "..."}
+
+    Bodies are written in *plaintext*: an export decrypts every memo, and an import encrypts (and compresses) it again
+    with the target database's key and codec, so archives can move memos between installations with different keys.
+    Keep archives somewhere as safe as the key itself.
+
+    Both directions stream: an export reads through a server-side cursor `chunk_size` rows at a time, and an import
+    reads a line at a time and inserts `batch_size` memos per transaction, so memory use does not grow with the size
+    of the archive. An import records how far through the archive it got in the same transaction as each batch, so an
+    interrupted import carries on from the last committed batch when run again, without duplicating memos.
+
+    Usage:
+        python -m inspyred_memo_server.database.archive export memos.ndjson.gz
+        python -m inspyred_memo_server.database.archive import memos.ndjson.gz [--restart]
+
+"""
+import argparse
+import gzip
+import json
+import os
+from pathlib import Path
+from sqlalchemy import insert, select, text
+from inspyred_memo_server.database.compression import get_body_codec
+from inspyred_memo_server.database.memo import Memo
+from inspyred_memo_server.database.search import create_search_index, index_memos
+
+
+__all__ = [
+    'IMPORT_PROGRESS_TABLE',
+    'export_memos',
+    'import_memos',
+    'import_position',
+]
+
+
+IMPORT_PROGRESS_TABLE = 'memo_import_progress'
+"""Records how far into each archive an import has committed, so an interrupted import resumes rather than restarts."""
+
+
+def _is_gzip(path, compress):
+    return Path(path).suffix == '.gz' if compress is None else compress
+
+
+def _open(path, mode, compress=None, level=6):
+    """
+    Opens an archive for binary reading or writing, through gzip if `compress` is set (or, by default, if the file
+    name ends in `.gz`).
+    """
+    if _is_gzip(path, compress):
+        return gzip.open(path, mode, compresslevel=level) if 'w' in mode else gzip.open(path, mode)
+
+    return open(path, mode)
+
+
+def _engine(engine):
+    if engine is None:
+        from inspyred_memo_server.database import get_engine
+        engine = get_engine()
+
+    return engine
+
+
+def export_memos(path, engine=None, chunk_size=1000, compress=None, codec=None) -> int:
+    """
+    Writes every memo to an NDJSON archive, in id order.
+
+    The archive is written to `<path>.partial` and renamed into place once complete, so `path` never holds a
+    truncated export.
+
+    Parameters:
+        path (str | Path):
+            Where to write the archive.
+
+        engine (sqlalchemy.engine.Engine, optional):
+            The database to export. Defaults to the application database.
+
+        chunk_size (int):
+            How many rows to fetch from the cursor at a time.
+
+        compress (bool, optional):
+            Whether to gzip the archive. Defaults to doing so if `path` ends in `.gz`.
+
+        codec (BodyCodec, optional):
+            Decrypts the memo bodies. Defaults to the application's codec.
+
+    Returns:
+        int:
+            The number of memos exported.
+    """
+    engine = _engine(engine)
+    decode = (codec if codec is not None else get_body_codec()).decode
+    partial = Path(f'{path}.partial')
+    count = 0
+
+    query = select(Memo.id, Memo.author, Memo.created_at, Memo.body, Memo.codec).order_by(Memo.id)
+    with engine.connect() as connection, _open(partial, 'wb', _is_gzip(path, compress)) as archive:
+        result = connection.execution_options(stream_results=True, yield_per=chunk_size).execute(query)
+        for rows in result.partitions():
+            archive.write(''.join(
+                json.dumps(
+                    {'id': memo_id, 'author': author, 'created_at': created_at, 'body': decode(body, body_codec)},
+                    ensure_ascii=False,
+                ) + '\n'
+                for memo_id, author, created_at, body, body_codec in rows
+            ).encode('utf-8'))
+            count += len(rows)
+
+    os.replace(partial, path)
+    return count
+
+
+def _ensure_progress_table(connection):
+    connection.exec_driver_sql(
+        f'CREATE TABLE IF NOT EXISTS {IMPORT_PROGRESS_TABLE} '
+        '(archive TEXT PRIMARY KEY, position INTEGER NOT NULL, line INTEGER NOT NULL, imported INTEGER NOT NULL)'
+    )
+
+
+def _archive_name(path):
+    return str(Path(path).resolve())
+
+
+def import_position(path, engine=None):
+    """
+    Gets how far a previous import of an archive got.
+
+    Parameters:
+        path (str | Path):
+            The archive.
+
+        engine (sqlalchemy.engine.Engine, optional):
+            The database imported into. Defaults to the application database.
+
+    Returns:
+        tuple | None:
+            The (byte offset into the uncompressed archive, lines read, memos imported), or None if the archive has
+            not been imported into this database.
+    """
+    with _engine(engine).begin() as connection:
+        _ensure_progress_table(connection)
+        row = connection.execute(
+            text(f'SELECT position, line, imported FROM {IMPORT_PROGRESS_TABLE} WHERE archive = :archive'),
+            {'archive': _archive_name(path)},
+        ).one_or_none()
+
+    return tuple(row) if row is not None else None
+
+
+def _parse(line, number) -> dict:
+    try:
+        memo = json.loads(line)
+    except ValueError as e:
+        raise ValueError(f'Line {number} of the archive is not valid JSON: {e}') from e
+
+    if not isinstance(memo, dict) or not isinstance(memo.get('body'), str):
+        raise ValueError(f'Line {number} of the archive is not a memo with a text body.')
+    if not isinstance(memo.get('created_at'), (int, float)):
+        raise ValueError(f'Line {number} of the archive has no created_at timestamp.')
+
+    return memo
+
+
+def import_memos(path, engine=None, batch_size=1000, compress=None, restart=False, codec=None) -> int:
+    """
+    Adds the memos in an NDJSON archive to a database.
+
+    Memos get new ids in the target database; their authors, timestamps and text are kept. Each batch is inserted,
+    added to the full-text index and checkpointed in one transaction.
+
+    Parameters:
+        path (str | Path):
+            The archive to read.
+
+        engine (sqlalchemy.engine.Engine, optional):
+            The database to import into. Defaults to the application database.
+
+        batch_size (int):
+            How many memos to insert per transaction.
+
+        compress (bool, optional):
+            Whether the archive is gzipped. Defaults to assuming so if `path` ends in `.gz`.
+
+        restart (bool):
+            Whether to ignore an earlier import of the same archive and start again from its first line. Memos that
+            import already added are added again.
+
+        codec (BodyCodec, optional):
+            Compresses and encrypts the memo bodies. Defaults to the application's codec.
+
+    Returns:
+        int:
+            The number of memos imported by this call (not counting any imported by an earlier, interrupted call).
+
+    Raises:
+        ValueError:
+            If a line of the archive is not a memo. Batches before it stay imported.
+    """
+    engine = _engine(engine)
+    encode = (codec if codec is not None else get_body_codec()).encode
+    archive_name = _archive_name(path)
+    statement = insert(Memo).returning(Memo.id, sort_by_parameter_order=True)
+
+    with engine.begin() as connection:
+        create_search_index(connection)
+        _ensure_progress_table(connection)
+        if restart:
+            connection.execute(
+                text(f'DELETE FROM {IMPORT_PROGRESS_TABLE} WHERE archive = :archive'), {'archive': archive_name}
+            )
+
+    position, line_number, imported = import_position(path, engine) or (0, 0, 0)
+    count = 0
+
+    def flush(memos):
+        rows = []
+        for memo in memos:
+            body, body_codec = encode(memo['body'])
+            rows.append({
+                'author': memo.get('author'),
+                'created_at': memo['created_at'],
+                'size': len(memo['body'].encode('utf-8')),
+                'body': body,
+                'codec': body_codec,
+            })
+
+        with engine.begin() as connection:
+            ids = connection.execute(statement, rows).scalars().all()
+            index_memos(connection, [
+                {'id': memo_id, 'body': memo['body'], 'author': memo.get('author')}
+                for memo_id, memo in zip(ids, memos)
+            ])
+            connection.execute(
+                text(
+                    f'INSERT INTO {IMPORT_PROGRESS_TABLE} (archive, position, line, imported) '
+                    'VALUES (:archive, :position, :line, :imported) '
+                    'ON CONFLICT (archive) DO UPDATE SET '
+                    'position = excluded.position, line = excluded.line, imported = excluded.imported'
+                ),
+                {'archive': archive_name, 'position': position, 'line': line_number, 'imported': imported + count},
+            )
+
+    with _open(path, 'rb', compress) as archive:
+        # Seeking a gzip file decompresses up to the offset, which is still far cheaper than re-importing.
+        archive.seek(position)
+
+        batch = []
+        for line in archive:
+            position += len(line)
+            line_number += 1
+            if not line.strip():
+                continue
+
+            batch.append(_parse(line, line_number))
+            if len(batch) >= batch_size:
+                count += len(batch)
+                flush(batch)
+                batch = []
+
+        if batch:
+            count += len(batch)
+            flush(batch)
+
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = commands.add_parser('export', help='write every memo to an NDJSON archive')
+    export_parser.add_argument('path')
+    export_parser.add_argument('--chunk-size', type=int, default=1000)
+    export_parser.add_argument('--gzip', action=argparse.BooleanOptionalAction, default=None,
+                               help='compress the archive (default: if the path ends in .gz)')
+
+    import_parser = commands.add_parser('import', help='add the memos in an NDJSON archive to the database')
+    import_parser.add_argument('path')
+    import_parser.add_argument('--batch-size', type=int, default=1000)
+    import_parser.add_argument('--gzip', action=argparse.BooleanOptionalAction, default=None,
+                               help='read the archive as gzip (default: if the path ends in .gz)')
+    import_parser.add_argument('--restart', action='store_true', help='ignore the progress of an earlier import')
+
+    args = parser.parse_args()
+    if args.command == 'export':
+        print(f'Exported {export_memos(args.path, chunk_size=args.chunk_size, compress=args.gzip)} memos.')
+    else:
+        count = import_memos(args.path, batch_size=args.batch_size, compress=args.gzip, restart=args.restart)
+        print(f'Imported {count} memos.')
+
+
+if __name__ == '__main__':
+    main()
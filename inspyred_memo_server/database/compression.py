@@ -0,0 +1,212 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    inspyred_memo_server/database/compression.py
+
+
+Description:
+    Compresses large memo bodies before they are encrypted, so they take less room at rest.
+
+    Fernet output is base64 text, a third larger than the plaintext, and encrypted data does not compress, so a
+    memo has to be compressed first if it is to be compressed at all. Bodies shorter than the threshold (most memos)
+    are not worth it and are stored exactly as before.
+
+    Each row's `codec` column names how its body was compressed, or is NULL for a body that is simply encrypted text.
+    Rows written before compression existed are NULL, so they stay readable, and the codec can be changed at any time
+    without rewriting old rows.
+
+    Codecs:
+        zlib:
+            From the standard library; always available.
+
+        zstd:
+            Zstandard, from the optional `zstandard` package. Faster than zlib at a similar or better ratio; used by
+            default when installed.
+
+    Compressing before encrypting lets the stored length depend on the content. The plaintext size is already stored
+    alongside every memo, so this reveals little more than how repetitive a memo is.
+
+"""
+import zlib
+from inspyred_memo_server.config import MEMO_COMPRESSION
+from inspyred_memo_server.database.crypt import get_encryption_manager
+from inspyred_memo_server.utils.decorators import lazy_singleton
+
+
+__all__ = [
+    'BodyCodec',
+    'CODECS',
+    'available_codecs',
+    'get_body_codec',
+]
+
+
+class _Zlib:
+    name = 'zlib'
+
+    def __init__(self, level=6):
+        self.level = level
+
+    def compress(self, data):
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data):
+        return zlib.decompress(data)
+
+
+class _Zstd:
+    name = 'zstd'
+
+    def __init__(self, level=3):
+        import zstandard
+
+        self.level = level
+        self.__zstandard = zstandard
+
+    def compress(self, data):
+        # Compressors are not thread-safe, and cheap enough to make per call.
+        return self.__zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def decompress(self, data):
+        return self.__zstandard.ZstdDecompressor().decompress(data)
+
+
+CODECS = {
+    'zlib': _Zlib,
+    'zstd': _Zstd,
+}
+"""The codecs that can be named in a row's `codec` column, by name. Never rename or remove one."""
+
+
+def available_codecs() -> list:
+    """
+    Gets the names of the codecs that can be used here, best first.
+
+    Returns:
+        list[str]:
+            The codec names; `zlib` is always among them.
+    """
+    names = []
+    for name in ('zstd', 'zlib'):
+        try:
+            CODECS[name]()
+        except ImportError:
+            continue
+        names.append(name)
+
+    return names
+
+
+class BodyCodec:
+    """
+    Turns memo text into a stored body and codec tag, and back.
+
+    Attributes:
+        threshold (int):
+            The smallest body, in UTF-8 bytes, that is compressed.
+
+        codec (str):
+            The codec used for new bodies.
+    """
+
+    def __init__(self, encryption, threshold=1024, codec='auto', level=None):
+        """
+        Initializes the codec.
+
+        Parameters:
+            encryption (EncryptionManager):
+                Encrypts and decrypts the bodies.
+
+            threshold (int):
+                The smallest body, in UTF-8 bytes, to compress. None disables compression for new bodies.
+
+            codec (str):
+                The codec for new bodies: a name from `CODECS`, or 'auto' for the best one available.
+
+            level (int, optional):
+                The compression level. Defaults to the codec's own default.
+
+        Raises:
+            ValueError:
+                If the codec is unknown.
+
+            ImportError:
+                If the codec needs a package that is not installed.
+        """
+        if codec == 'auto':
+            codec = available_codecs()[0]
+        if codec not in CODECS:
+            raise ValueError(f"codec must be one of auto, {', '.join(CODECS)}, got {codec}")
+
+        self.encryption = encryption
+        self.threshold = threshold
+        self.codec = codec
+        self.__compressor = CODECS[codec]() if level is None else CODECS[codec](level)
+        self.__decompressors = {codec: self.__compressor}
+
+    def _decompressor(self, name):
+        decompressor = self.__decompressors.get(name)
+        if decompressor is None:
+            if name not in CODECS:
+                raise ValueError(f'Unknown memo codec: {name}')
+            decompressor = self.__decompressors[name] = CODECS[name]()
+
+        return decompressor
+
+    def encode(self, text) -> tuple:
+        """
+        Encrypts memo text, compressing it first if it is large enough and compresses well.
+
+        Returns:
+            tuple:
+                The stored body, and the codec it was compressed with (None if it was not).
+        """
+        data = text.encode('utf-8')
+        if self.threshold is not None and len(data) >= self.threshold:
+            compressed = self.__compressor.compress(data)
+            if len(compressed) < len(data):
+                return self.encryption.encrypt_bytes(compressed), self.codec
+
+        return self.encryption.encrypt(text), None
+
+    def decode(self, body, codec=None) -> str:
+        """
+        Decrypts (and decompresses) a stored body.
+
+        Parameters:
+            body (str):
+                The stored body.
+
+            codec (str, optional):
+                The row's codec tag.
+
+        Returns:
+            str:
+                The memo text.
+        """
+        if codec is None:
+            return self.encryption.decrypt(body)
+
+        return self._decompressor(codec).decompress(self.encryption.decrypt_bytes(body)).decode('utf-8')
+
+    def __repr__(self):
+        return f'BodyCodec(threshold={self.threshold}, codec={self.codec!r})'
+
+
+@lazy_singleton
+def get_body_codec():
+    """
+    Gets the codec for memo bodies, configured from `MEMO_COMPRESSION` and using the application's encryption key.
+
+    Returns:
+        BodyCodec:
+            The codec.
+    """
+    return BodyCodec(get_encryption_manager(), **MEMO_COMPRESSION)
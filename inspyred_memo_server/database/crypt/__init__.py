@@ -12,13 +12,33 @@ File:
  
 
 Description:
-    
+    Field encryption for the database, and where its key comes from.
+
+    The key is fetched once per process by a `KeyProvider`, which then serves it, and the `Fernet` objects built from
+    it, from memory. A keyring lookup goes through the desktop's secret service (over D-Bus on Linux), which can take
+    tens of milliseconds, or block while the keyring is locked; without the provider every `EncryptionKey.get_key()` or
+    `generate_cipher()` call paid that again. Headless servers with no keyring daemon can supply the key through an
+    environment variable or a key file instead (see `get_key_provider`).
+
+    Key rotation:
+        A key source may hold several keys, newest first, separated by commas or newlines. New data is always
+        encrypted with the newest key, and data encrypted with any of them can still be decrypted (via `MultiFernet`).
+        `KeyProvider.rotate()` adds a new key in front; `inspyred_memo_server.database.rotation` then re-encrypts the
+        stored data with it in the background, after which `KeyProvider.retire()` drops the old keys.
 
 """
-import keyring
-from cryptography.fernet import Fernet
+import itertools
+import os
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from cryptography.fernet import Fernet, MultiFernet
 from inspyred_memo_server.__about__ import __PROG__ as PROG_NAME
 from inspyred_memo_server.errors.database import EncryptionKeyNotFoundError
+from inspyred_memo_server.utils.decorators import lazy_singleton
 
 
 class EncryptionKey:
@@ -94,6 +114,9 @@ class EncryptionKey:
             key (bytes):
                 The encryption key to store.
         """
+        # Imported here, as loading keyring's backends is slow and the key is rarely needed at import time.
+        import keyring
+
         keyring.set_password(self.keyring_service, self.keyring_user, key.decode())
 
     def _retrieve_key(self):
@@ -108,6 +131,8 @@ class EncryptionKey:
             EncryptionKeyNotFoundError:
                 If the encryption key is not found in the system keyring.
         """
+        import keyring
+
         key = keyring.get_password(self.keyring_service, self.keyring_user)
         if not key:
             raise EncryptionKeyNotFoundError('Encryption key not found in system keyring.')
@@ -116,29 +141,378 @@ class EncryptionKey:
 
     def get_key(self):
         """
-        Gets the encryption key from the system keyring.
+        Gets the encryption key from the system keyring, generating and storing one if there is none yet.
+
+        Every call asks the keyring; use `get_key_provider()` for a cached key.
+
+        Returns:
+            bytes:
+                The encryption key.
+
+        Raises:
+            EncryptionKeyNotFoundError:
+                If there is no usable keyring backend (e.g. on a headless server with no secret service running).
+        """
+        from keyring.errors import InitError, NoKeyringError
+
+        try:
+            try:
+                return self._retrieve_key()
+            except EncryptionKeyNotFoundError:
+                return self.generate_key()
+        except (InitError, NoKeyringError) as e:
+            raise EncryptionKeyNotFoundError(f'No keyring backend is available: {e}') from e
+
+
+def split_keys(value) -> list:
+    """
+    Splits a key source's value into its keys, newest first.
+
+    Parameters:
+        value (bytes | str):
+            One key, or several separated by commas or whitespace.
+
+    Returns:
+        list[bytes]:
+            The keys.
+    """
+    if isinstance(value, str):
+        value = value.encode()
+
+    return value.replace(b',', b' ').split()
+
+
+class EnvironmentKey:
+    """
+    Reads the encryption key from an environment variable, for containers and other deployments that inject secrets
+    that way. A key is never generated, and the variable cannot be rewritten by `KeyProvider.rotate()`; to rotate,
+    set it to the new key followed by the old ones, comma-separated.
+
+    Attributes:
+        variable (str):
+            The name of the environment variable.
+    """
+
+    def __init__(self, variable='INSPYRED_MEMOS_KEY'):
+        self.variable = variable
+
+    def get_key(self):
+        """
+        Gets the encryption key from the environment.
 
         Returns:
             bytes:
                 The encryption key.
+
+        Raises:
+            EncryptionKeyNotFoundError:
+                If the variable is not set.
         """
+        key = os.environ.get(self.variable)
+        if not key:
+            raise EncryptionKeyNotFoundError(f'{self.variable} is not set.')
+
+        return key.strip().encode()
+
+
+class FileKey:
+    """
+    Keeps the encryption key in a file that only its owner can read, for servers with no keyring daemon.
+
+    Attributes:
+        path (Path):
+            The key file.
+
+        create (bool):
+            Whether to generate a key (and the file) if the file does not exist.
+    """
+
+    def __init__(self, path, create=True):
+        self.path = Path(path)
+        self.create = create
+
+    def get_key(self):
+        """
+        Gets the encryption key from the file, generating it first if allowed.
+
+        Returns:
+            bytes:
+                The encryption key.
+
+        Raises:
+            EncryptionKeyNotFoundError:
+                If the file does not exist and `create` is False.
+        """
+        try:
+            return self.path.read_bytes().strip()
+        except FileNotFoundError:
+            if not self.create:
+                raise EncryptionKeyNotFoundError(f'No key file at {self.path}.') from None
+
+        key = Fernet.generate_key()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
         try:
-            return self._retrieve_key()
-        except EncryptionKeyNotFoundError:
-            return self.generate_key()
+            # O_EXCL: if another process created the file first, use its key rather than overwrite it.
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            return self.path.read_bytes().strip()
+
+        with os.fdopen(fd, 'wb') as file:
+            file.write(key)
+
+        return key
+
+    def store_key(self, key: bytes):
+        """
+        Replaces the file's contents, atomically, so a reader never sees a partly written key.
+        """
+        partial = self.path.with_name(f'{self.path.name}.partial')
+        fd = os.open(partial, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as file:
+            file.write(b'\n'.join(split_keys(key)) + b'\n')
+
+        os.replace(partial, self.path)
+
+
+class KeyProvider:
+    """
+    Fetches the encryption key once and serves it, and the ciphers built from it, from memory.
+
+    The key is fetched from the first of `sources` that has one; a source that has none (an unset environment
+    variable, an absent key file, no keyring backend) raises `EncryptionKeyNotFoundError` and the next is tried. Any
+    other failure, such as a locked keyring, is raised rather than skipped, so a transient problem can never switch
+    the process to a different key.
+
+    The key is fetched again after `ttl` seconds, after `refresh()`, or on the next use after `invalidate()` (which is
+    safe to call from a signal handler; see `refresh_on_signal`). If a timed refresh fails, the cached key stays in use.
+
+    A source may hold several keys (see `split_keys`); `key` and `fernet` are the newest, which encrypts, and
+    `multi_fernet` decrypts with any of them.
+
+    Attributes:
+        sources (list):
+            Where the key may come from, in order of preference. Each has a `get_key()` method returning the key.
+
+        ttl (float, optional):
+            Seconds after which the key is fetched again. None keeps it for the life of the process.
+    """
+
+    def __init__(self, sources, ttl=None):
+        self.sources = list(sources)
+        self.ttl = ttl
+
+        self.__lock = threading.Lock()
+        self.__state = None  # (keys, fernet, multi_fernet, fetched at, source)
+        self.__stale = False
+        self.__fetches = 0
+
+    @classmethod
+    def from_key(cls, key):
+        """
+        Makes a provider that always serves one key, e.g. for tests and tools given a key directly.
+        """
+        if isinstance(key, (list, tuple)):
+            key = b','.join(k.encode() if isinstance(k, str) else k for k in key)
+
+        return cls([_StaticKey(key)])
+
+    @property
+    def fetches(self) -> int:
+        """
+        How many times the key has been fetched from its sources.
+        """
+        return self.__fetches
+
+    def _fetch(self):
+        for source in self.sources:
+            try:
+                return split_keys(source.get_key()), source
+            except EncryptionKeyNotFoundError:
+                continue
+
+        raise EncryptionKeyNotFoundError('None of the key sources has an encryption key.')
+
+    def _fresh(self, state):
+        return (
+            state is not None
+            and not self.__stale
+            and (self.ttl is None or time.monotonic() < state[3] + self.ttl)
+        )
+
+    def _current(self):
+        state = self.__state
+        if self._fresh(state):
+            return state
+
+        with self.__lock:
+            state = self.__state
+            if self._fresh(state):
+                return state
+
+            self.__stale = False
+            try:
+                keys, source = self._fetch()
+            except Exception:
+                if state is None or self.ttl is None:
+                    raise
+                # Keep serving the cached key, and try again after another `ttl`.
+                state = self.__state = (*state[:3], time.monotonic(), state[4])
+                return state
+
+            self.__fetches += 1
+            if state is not None and state[0] == keys:
+                state = self.__state = (*state[:3], time.monotonic(), source)
+            else:
+                fernets = [Fernet(key) for key in keys]
+                state = self.__state = (keys, fernets[0], MultiFernet(fernets), time.monotonic(), source)
+
+            return state
+
+    @property
+    def key(self) -> bytes:
+        """
+        The encryption key (the newest, if there are several).
+        """
+        return self._current()[0][0]
+
+    @property
+    def keys(self) -> list:
+        """
+        Every key, newest first.
+        """
+        return list(self._current()[0])
+
+    @property
+    def fernet(self) -> Fernet:
+        """
+        A `Fernet` for the key, shared by every caller.
+        """
+        return self._current()[1]
+
+    @property
+    def multi_fernet(self) -> MultiFernet:
+        """
+        A `MultiFernet` over every key, shared by every caller.
+        """
+        return self._current()[2]
+
+    def _store(self, keys):
+        source = self._current()[4]
+        if not hasattr(source, 'store_key'):
+            raise ValueError(f'The key comes from a {type(source).__name__}, which cannot be written to.')
+
+        source.store_key(b','.join(keys))
+        self.refresh()
+
+    def rotate(self, new_key=None) -> bytes:
+        """
+        Makes a new key the one that encrypts, keeping the current keys for decryption, and saves them to the source the
+        key came from.
+
+        Other processes sharing the source start encrypting with the new key once they refresh theirs (see `ttl` and
+        `refresh_on_signal`); data already stored keeps its old key until it is re-encrypted (see
+        `inspyred_memo_server.database.rotation`).
+
+        Parameters:
+            new_key (bytes, optional):
+                The new key. Defaults to a newly generated one.
+
+        Returns:
+            bytes:
+                The new key.
+
+        Raises:
+            ValueError:
+                If the key came from a source that cannot be written to, such as an environment variable.
+        """
+        self.refresh()
+        new_key = new_key if new_key is not None else Fernet.generate_key()
+        self._store([new_key, *self.keys])
+        return new_key
+
+    def retire(self, keep=1):
+        """
+        Drops all but the `keep` newest keys from the source. Only do this once nothing is encrypted with the older
+        keys any more; it would no longer decrypt.
+
+        Raises:
+            ValueError:
+                If the key came from a source that cannot be written to.
+        """
+        self.refresh()
+        self._store(self.keys[:max(1, keep)])
+
+    def refresh(self):
+        """
+        Fetches the key from its sources now.
+        """
+        self.__stale = True
+        self._current()
+
+    def invalidate(self):
+        """
+        Marks the key stale, so it is fetched again on next use. Does no I/O, so it is safe in a signal handler.
+        """
+        self.__stale = True
+
+    def refresh_on_signal(self, signum=None):
+        """
+        Marks the key stale whenever the process receives a signal (SIGHUP by default, where there is one).
+
+        Must be called from the main thread.
+
+        Returns:
+            The previous handler for the signal.
+        """
+        signum = signal.SIGHUP if signum is None else signum
+        return signal.signal(signum, lambda received, frame: self.invalidate())
+
+
+class _StaticKey:
+    def __init__(self, key):
+        self.key = key
+
+    def get_key(self):
+        return self.key
 
 
 def generate_cipher():
     """
-    Generates a new cipher for encryption and decryption.
+    Gets the cipher for encryption and decryption.
 
     Returns:
         Fernet:
-            The Fernet cipher.
+            The application's shared Fernet cipher (see `get_key_provider`).
+    """
+    return get_key_provider().fernet
+
+
+def _encrypt_chunk(key, chunk):
+    cipher = Fernet(key)
+    return [cipher.encrypt(data.encode('utf-8')).decode('utf-8') for data in chunk]
+
+
+def _decrypt_chunk(keys, chunk):
+    cipher = MultiFernet([Fernet(key) for key in keys])
+    return [cipher.decrypt(token.encode('utf-8')).decode('utf-8') for token in chunk]
+
+
+def _ordered_map(func, key, items, chunk_size, executor, max_pending):
     """
-    key_manager = EncryptionKey()
-    key = key_manager.get_key()
-    return Fernet(key)
+    Applies `func(key, chunk)` to successive chunks of `items` on an executor, yielding the results in input order.
+
+    At most `max_pending` chunks are in flight at once, so a long or endless input is never read far ahead of the
+    results being consumed.
+    """
+    items = iter(items)
+    pending = deque()
+    while chunk := list(itertools.islice(items, chunk_size)):
+        pending.append(executor.submit(func, key, chunk))
+        if len(pending) >= max_pending:
+            yield from pending.popleft().result()
+
+    while pending:
+        yield from pending.popleft().result()
 
 
 class EncryptionManager:
@@ -147,8 +521,28 @@ class EncryptionManager:
     """
 
     def __init__(self, key):
-        self.fernet_key = key
-        self.cipher_suite = Fernet(self.fernet_key)
+        """
+        Initializes the manager.
+
+        Parameters:
+            key (bytes | str | KeyProvider):
+                The Fernet key, or a provider to get it from.
+        """
+        self.provider = key if isinstance(key, KeyProvider) else KeyProvider.from_key(key)
+
+    @property
+    def fernet_key(self):
+        """
+        The Fernet key.
+        """
+        return self.provider.key
+
+    @property
+    def cipher_suite(self):
+        """
+        The Fernet cipher for the key.
+        """
+        return self.provider.fernet
 
     def encrypt(self, data):
         """
@@ -157,9 +551,209 @@ class EncryptionManager:
         return self.cipher_suite.encrypt(data.encode('utf-8')).decode('utf-8')
 
     def decrypt(self, data):
-        return self.cipher_suite.decrypt(data.encode('utf-8')).decode('utf-8')
+        return self.provider.multi_fernet.decrypt(data.encode('utf-8')).decode('utf-8')
+
+    def encrypt_bytes(self, data):
+        """
+        Encrypts binary data (e.g. a compressed memo) into a Fernet token, as text.
+        """
+        return self.cipher_suite.encrypt(data).decode('ascii')
+
+    def decrypt_bytes(self, token):
+        """
+        Decrypts a token made by `encrypt_bytes` back into binary data.
+        """
+        return self.provider.multi_fernet.decrypt(token.encode('ascii'))
+
+    def rotate(self, token):
+        """
+        Re-encrypts a token (from `encrypt` or `encrypt_bytes`) with the newest key, whichever key it was made with.
+        """
+        return self.provider.multi_fernet.rotate(token.encode('ascii')).decode('ascii')
+
+    def encrypt_many(self, data, chunk_size=256, executor=None, max_pending=None):
+        """
+        Encrypts many strings in parallel, yielding the tokens in the order the strings were given.
+
+        The input is split into chunks of `chunk_size`, which are encrypted on `executor`'s workers. The input is
+        consumed lazily, so it may be a generator over more data than fits in memory.
+
+        Parameters:
+            data (Iterable[str]):
+                The strings to encrypt.
+
+            chunk_size (int):
+                How many strings each task encrypts. Larger chunks cost less in scheduling; smaller ones spread a short
+                input over more workers.
+
+            executor (concurrent.futures.Executor, optional):
+                Where the chunks are encrypted. Defaults to the shared crypto thread pool (see
+                `get_crypto_executor`). A `ProcessPoolExecutor` also works.
+
+            max_pending (int, optional):
+                The most chunks submitted ahead of the results consumed. Defaults to twice the number of CPUs.
+
+        Yields:
+            str:
+                The Fernet tokens, one per input string, in order.
+        """
+        return _ordered_map(
+            _encrypt_chunk, self.fernet_key, data, chunk_size,
+            executor if executor is not None else get_crypto_executor(),
+            max_pending or 2 * (os.cpu_count() or 1),
+        )
+
+    def decrypt_many(self, tokens, chunk_size=256, executor=None, max_pending=None):
+        """
+        Decrypts many tokens in parallel, yielding the strings in the order the tokens were given. See `encrypt_many`.
+
+        Raises:
+            cryptography.fernet.InvalidToken:
+                When the results reach a token that cannot be decrypted with this key.
+        """
+        return _ordered_map(
+            _decrypt_chunk, self.provider.keys, tokens, chunk_size,
+            executor if executor is not None else get_crypto_executor(),
+            max_pending or 2 * (os.cpu_count() or 1),
+        )
+
+
+@lazy_singleton
+def get_key_manager():
+    """
+    Gets the manager of the application's encryption key.
+
+    Returns:
+        EncryptionKey:
+            The key manager.
+    """
+    return EncryptionKey()
+
+
+@lazy_singleton
+def get_key_provider():
+    """
+    Gets the application's key provider, configured by `ENCRYPTION_KEY`.
+
+    With the 'auto' backend the key comes from, in order: the environment variable, if set; the key file, if it
+    exists; the system keyring (where a key is generated on first run); and, if there is no keyring backend at all,
+    a newly generated key file. Once a key file exists it keeps being used, so a server never switches keys because
+    the keyring became available later.
+
+    Returns:
+        KeyProvider:
+            The key provider.
+    """
+    from inspyred_memo_server.config import ENCRYPTION_KEY
+
+    backend = ENCRYPTION_KEY['backend']
+    path = ENCRYPTION_KEY['file']
+    if path is None:
+        from inspyred_memo_server.config.dirs import get_app_dirs
+        path = get_app_dirs().config_dir / 'memos.key'
+
+    environment = EnvironmentKey(ENCRYPTION_KEY['env_var'])
+    sources = {
+        'auto': [environment, FileKey(path, create=False), get_key_manager(), FileKey(path)],
+        'env': [environment],
+        'keyring': [get_key_manager()],
+        'file': [FileKey(path)],
+    }
+    if backend not in sources:
+        raise ValueError(f"ENCRYPTION_KEY['backend'] must be one of {', '.join(sources)}, got {backend}")
+
+    return KeyProvider(sources[backend], ttl=ENCRYPTION_KEY['ttl'])
+
+
+@lazy_singleton
+def get_encryption_manager():
+    """
+    Gets the encryption manager for database fields, which takes its key from `get_key_provider()` on first use.
+
+    Returns:
+        EncryptionManager:
+            The encryption manager.
+    """
+    return EncryptionManager(get_key_provider())
+
+
+@lazy_singleton
+def get_crypto_executor():
+    """
+    Gets the thread pool that runs encryption and decryption off the calling thread, for async code and bulk
+    operations. (Password hashing has a pool of its own; see `inspyred_memo_server.database.user.auth`.)
+
+    Fernet (via OpenSSL) releases the GIL for its heavy lifting, so these threads run in parallel.
+
+    Returns:
+        concurrent.futures.ThreadPoolExecutor:
+            The executor.
+    """
+    return ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix='memo-crypto')
+
+
+class EncryptedField:
+    """
+    A descriptor that presents an encrypted mapped column as plaintext, decrypting it only when it is read.
+
+    The column itself always holds the Fernet token, so loading a row costs nothing extra and a row is never marked
+    changed just by being loaded. The first read decrypts the token and caches the plaintext on the instance, next to
+    the token it came from; a later read reuses it for as long as the column still holds that token (so a refreshed or
+    expired row is decrypted afresh). Assigning encrypts straight away, and assigning the value the field already has
+    does nothing, so an unchanged field is never re-encrypted or written back.
+
+    Attributes:
+        column (str):
+            The name of the mapped attribute holding the token.
+
+        encryption (callable):
+            Returns the `EncryptionManager` to use. Defaults to `get_encryption_manager`.
+    """
+
+    def __init__(self, column, encryption=None, doc=None):
+        self.column = column
+        self.encryption = encryption if encryption is not None else get_encryption_manager
+        self.__doc__ = doc
+        self.cache_key = None
+
+    def __set_name__(self, owner, name):
+        self.cache_key = f'_{name}_plaintext'
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+
+        token = getattr(instance, self.column)
+        if token is None:
+            return None
+
+        cached = instance.__dict__.get(self.cache_key)
+        if cached is not None and cached[0] == token:
+            return cached[1]
+
+        plaintext = self.encryption().decrypt(token)
+        instance.__dict__[self.cache_key] = (token, plaintext)
+        return plaintext
+
+    def __set__(self, instance, value):
+        if value == self.__get__(instance):
+            return
+
+        token = None if value is None else self.encryption().encrypt(value)
+        setattr(instance, self.column, token)
+        instance.__dict__[self.cache_key] = (token, value)
+
+
+_LAZY_GLOBALS = {
+    'KEY_MAN': get_key_manager,
+    'KEY': lambda: get_key_provider().key,
+    'ENCRYPT_MAN': get_encryption_manager,
+}
+
 
+def __getattr__(name):
+    # The old module-level names still work, but the keyring is only consulted when one is first used.
+    if name in _LAZY_GLOBALS:
+        return _LAZY_GLOBALS[name]()
 
-KEY_MAN = EncryptionKey()
-KEY = KEY_MAN.get_key()
-ENCRYPT_MAN = EncryptionManager(KEY)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
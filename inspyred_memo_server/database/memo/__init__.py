@@ -0,0 +1,56 @@
+"""
+
+
+Author: 
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File: 
+    inspyred_memo_server/database/memo/__init__.py
+ 
+
+Description:
+    
+
+"""
+from sqlalchemy import Column, Float, Index, Integer, String, Text
+from inspyred_memo_server.database.user import Base
+
+
+class Memo(Base):
+    """
+    Memo class for storing received memos.
+
+    Attributes:
+        id (int):
+            The memo ID.
+
+        author (str):
+            The username of the memo's author, if known.
+
+        created_at (float):
+            When the memo was received, as a UNIX timestamp.
+
+        size (int):
+            The length of the plaintext memo, in UTF-8 bytes.
+
+        body (str):
+            The memo text, encrypted with the database encryption key (and compressed first if it is large).
+
+        codec (str):
+            The codec the body was compressed with, or None if it was not (see
+            `inspyred_memo_server.database.compression`).
+    """
+    __tablename__ = 'memos'
+    __table_args__ = (
+        # Serves keyset pagination over (created_at, id).
+        Index('ix_memos_created_at_id', 'created_at', 'id'),
+    )
+    id = Column(Integer, primary_key=True)
+    author = Column(String, nullable=True)
+    created_at = Column(Float, nullable=False)
+    size = Column(Integer, nullable=False)
+    body = Column(Text, nullable=False)
+    codec = Column(String, nullable=True)
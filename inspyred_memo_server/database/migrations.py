@@ -0,0 +1,299 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    inspyred_memo_server/database/migrations.py
+
+
+Description:
+    A small, versioned schema migration runner for the application's SQLite database.
+
+    The schema version is kept in SQLite's `user_version` header field, so checking an up-to-date database costs a
+    single `PRAGMA user_version`, with no reflection. A brand-new database is created from the models and stamped
+    with the latest version straight away; an older one is brought forward by applying each newer `Migration` in turn.
+
+    Every step runs in a `BEGIN IMMEDIATE` transaction and re-checks the version first, so several processes starting
+    together (see `MemoSupervisor`) apply each migration once.
+
+"""
+import time
+from sqlalchemy import select, text
+from inspyred_memo_server.database.crypt import get_encryption_manager
+from inspyred_memo_server.database.memo import Memo
+from inspyred_memo_server.database.search import FTS_TABLE, create_search_index, index_memos
+from inspyred_memo_server.database.user import Base
+
+
+__all__ = [
+    'MIGRATIONS',
+    'Migration',
+    'SCHEMA_VERSION',
+    'current_version',
+    'migrate',
+]
+
+
+PROGRESS_TABLE = 'schema_migration_progress'
+"""Records how far an interrupted batched migration got, so it resumes rather than restarts."""
+
+
+def current_version(connection) -> int:
+    """
+    Gets the schema version recorded in the database.
+
+    Parameters:
+        connection (sqlalchemy.engine.Connection):
+            A connection to the database.
+
+    Returns:
+        int:
+            The version; 0 for a database that has never been migrated.
+    """
+    return connection.exec_driver_sql('PRAGMA user_version').scalar()
+
+
+def _set_version(connection, version):
+    # PRAGMA arguments cannot be bound parameters; `version` is always an int from a `Migration`.
+    connection.exec_driver_sql(f'PRAGMA user_version = {int(version)}')
+
+
+def _begin_immediate(connection):
+    """
+    Starts a transaction that takes SQLite's write lock straight away, so the version check that follows cannot be
+    invalidated by another process before this one writes.
+    """
+    connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+
+class Migration:
+    """
+    One step in the schema's history, which moves the database to `version`.
+
+    A migration has up to two parts:
+
+    - `upgrade(connection)` makes the schema change (new tables, columns or indexes) in one short transaction.
+    - `backfill(connection, position, target, limit)` then fills in existing data, `limit` rows per transaction, and
+      returns the position it reached (or None once it is done). The write lock is released between batches, and
+      `pause` seconds are left between them, so other connections can keep writing while a large table is processed.
+      Progress is committed with each batch, so an interrupted backfill resumes where it stopped.
+
+    `upgrade` may return a target position for the backfill to stop at (e.g. the highest existing row id, as newer rows
+    are handled by the application itself), or None to skip the backfill.
+
+    SQLite cannot build a B-tree index incrementally, so a `CREATE INDEX` runs as one statement. In WAL mode readers
+    are not blocked while it runs; writers wait for it (up to `busy_timeout`). Work that can be split, such as
+    populating the full-text index, belongs in `backfill`.
+
+    Attributes:
+        version (int):
+            The schema version the migration produces.
+
+        description (str):
+            What the migration does.
+    """
+
+    def __init__(self, version, description, upgrade, backfill=None, batch_size=1000, pause=0.01):
+        """
+        Initializes the migration.
+
+        Parameters:
+            version (int):
+                The schema version the migration produces.
+
+            description (str):
+                What the migration does.
+
+            upgrade (callable):
+                Makes the schema change; called with a connection inside a transaction.
+
+            backfill (callable, optional):
+                Processes one batch of existing data; see the class description.
+
+            batch_size (int):
+                The most rows per backfill transaction.
+
+            pause (float):
+                Seconds to wait between backfill batches.
+        """
+        self.version = version
+        self.description = description
+        self.upgrade = upgrade
+        self.backfill = backfill
+        self.batch_size = batch_size
+        self.pause = pause
+
+    def _progress(self, connection):
+        return connection.execute(
+            text(f'SELECT position, target FROM {PROGRESS_TABLE} WHERE version = :version'),
+            {'version': self.version},
+        ).one_or_none()
+
+    def _finish(self, connection):
+        connection.execute(text(f'DELETE FROM {PROGRESS_TABLE} WHERE version = :version'), {'version': self.version})
+        _set_version(connection, self.version)
+
+    def apply(self, engine):
+        """
+        Applies the migration, unless the database is already at or past its version.
+
+        Parameters:
+            engine (sqlalchemy.engine.Engine):
+                The engine for the database to migrate.
+        """
+        with engine.connect() as connection:
+            _begin_immediate(connection)
+            if current_version(connection) >= self.version:
+                connection.rollback()
+                return
+
+            connection.exec_driver_sql(
+                f'CREATE TABLE IF NOT EXISTS {PROGRESS_TABLE} '
+                '(version INTEGER PRIMARY KEY, position INTEGER NOT NULL, target INTEGER NOT NULL)'
+            )
+            if self._progress(connection) is None:
+                target = self.upgrade(connection)
+                if self.backfill is None or target is None:
+                    self._finish(connection)
+                    connection.commit()
+                    return
+
+                connection.execute(
+                    text(f'INSERT INTO {PROGRESS_TABLE} (version, position, target) VALUES (:version, 0, :target)'),
+                    {'version': self.version, 'target': target},
+                )
+            connection.commit()
+
+            while True:
+                _begin_immediate(connection)
+                progress = self._progress(connection)
+                if progress is None:
+                    # Another process finished the backfill.
+                    connection.rollback()
+                    return
+
+                position = self.backfill(connection, progress.position, progress.target, self.batch_size)
+                if position is None:
+                    self._finish(connection)
+                    connection.commit()
+                    return
+
+                connection.execute(
+                    text(f'UPDATE {PROGRESS_TABLE} SET position = :position WHERE version = :version'),
+                    {'version': self.version, 'position': position},
+                )
+                connection.commit()
+                time.sleep(self.pause)
+
+    def __repr__(self):
+        return f'Migration({self.version}, {self.description!r})'
+
+
+def _create_memos_table(connection):
+    # The table as first released; later changes to the model are separate migrations.
+    connection.exec_driver_sql(
+        'CREATE TABLE IF NOT EXISTS memos ('
+        'id INTEGER NOT NULL PRIMARY KEY, author VARCHAR, created_at FLOAT NOT NULL, size INTEGER NOT NULL, '
+        'body TEXT NOT NULL)'
+    )
+
+
+def _create_created_at_index(connection):
+    connection.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_memos_created_at_id ON memos (created_at, id)')
+
+
+def _create_search_table(connection):
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {'name': FTS_TABLE},
+    ).first()
+    if exists:
+        # Created alongside the memos table, which means every memo was indexed as it was written.
+        return None
+
+    create_search_index(connection)
+
+    # Newer memos are indexed by the writer as they are inserted; only these need backfilling.
+    return connection.execute(select(Memo.id).order_by(Memo.id.desc()).limit(1)).scalar() or 0
+
+
+def _backfill_search_index(connection, position, target, limit):
+    rows = connection.execute(
+        select(Memo.id, Memo.body, Memo.author)
+        .where(Memo.id > position, Memo.id <= target)
+        .order_by(Memo.id)
+        .limit(limit)
+    ).all()
+    if not rows:
+        return None
+
+    decrypt = get_encryption_manager().decrypt
+    index_memos(connection, [{'id': memo_id, 'body': decrypt(body), 'author': author} for memo_id, body, author in rows])
+    return rows[-1].id
+
+
+def _add_codec_column(connection):
+    # Existing bodies are uncompressed, which a NULL codec already means.
+    connection.exec_driver_sql('ALTER TABLE memos ADD COLUMN codec VARCHAR')
+
+
+MIGRATIONS = [
+    Migration(1, 'Create the memos table', _create_memos_table),
+    Migration(2, 'Index memos by (created_at, id) for keyset pagination', _create_created_at_index),
+    Migration(3, 'Build the full-text search index over existing memos', _create_search_table, _backfill_search_index),
+    Migration(4, 'Record the codec each memo body is compressed with', _add_codec_column),
+]
+"""Every migration, in version order. Append new ones; never change or remove released ones."""
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
+"""The schema version the models describe."""
+
+
+def migrate(engine, migrations=None, metadata=Base.metadata) -> int:
+    """
+    Brings a database's schema up to date.
+
+    Parameters:
+        engine (sqlalchemy.engine.Engine):
+            The engine for the database.
+
+        migrations (list[Migration], optional):
+            The migrations to apply, in version order. Defaults to `MIGRATIONS`.
+
+        metadata (sqlalchemy.MetaData):
+            The models, used to create a new database outright.
+
+    Returns:
+        int:
+            The schema version the database is now at.
+    """
+    migrations = MIGRATIONS if migrations is None else migrations
+    latest = migrations[-1].version if migrations else 0
+
+    with engine.connect() as connection:
+        version = current_version(connection)
+    if version >= latest:
+        return version
+
+    if version == 0:
+        with engine.connect() as connection:
+            _begin_immediate(connection)
+            tables = set(connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'")).scalars())
+            if current_version(connection) == 0 and not tables & set(metadata.tables):
+                # A new database gets the current schema directly; migrations are only for upgrading.
+                metadata.create_all(connection)
+                _set_version(connection, latest)
+                connection.commit()
+                return latest
+            connection.rollback()
+
+    for migration in migrations:
+        if migration.version > version:
+            migration.apply(engine)
+
+    return latest
@@ -0,0 +1,473 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    inspyred_memo_server/database/rotation.py
+
+
+Description:
+    Re-encrypts stored data with the newest encryption key after a key rotation, in the background, while the server
+    keeps running.
+
+    Rotating a key (`KeyProvider.rotate()`) only changes which key encrypts new data; rows already stored keep their
+    old key, which stays available for decryption. A `ReencryptionJob` then walks a table in primary-key order, a
+    chunk per short `BEGIN IMMEDIATE` transaction, replacing each token with one made by the newest key. Its
+    watermark (the last id done) is committed with every chunk, so a stopped or interrupted job resumes where it left
+    off, and the rate is capped so live writers get the lock between chunks.
+
+    Only the tokens are touched: nothing is decrypted to plaintext beyond the `MultiFernet.rotate` call, compressed
+    memo bodies stay compressed, and the full-text index (built from plaintext) is unaffected.
+
+    Memos kept by a `PartitionedMemoStore` live in one SQLite file per partition, so every partition file gets a job
+    of its own, with its watermark kept in that file.
+
+    Rows written by processes that have not yet picked up the new key are still encrypted with an old one. Refresh
+    every server's key first (`KeyProvider.refresh_on_signal` / SIGHUP, or the provider's `ttl`), and only retire old
+    keys once every job reports finished; `retire` refuses to run before then.
+
+    Usage:
+        python -m inspyred_memo_server.database.rotation [--partitions DIR] rotate
+        python -m inspyred_memo_server.database.rotation [--partitions DIR] reencrypt [--chunk-size N] [--rate ROWS/S]
+        python -m inspyred_memo_server.database.rotation [--partitions DIR] status
+        python -m inspyred_memo_server.database.rotation [--partitions DIR] retire
+
+"""
+import argparse
+import hashlib
+import threading
+import time
+from sqlalchemy import bindparam, func, select, text, update
+from inspyred_memo_server.database.crypt import get_encryption_manager, get_key_provider
+from inspyred_memo_server.database.memo import Memo
+from inspyred_memo_server.database.user import User
+
+
+__all__ = [
+    'ENCRYPTED_COLUMNS',
+    'PROGRESS_TABLE',
+    'ReencryptionJob',
+    'reencryption_jobs',
+]
+
+
+PROGRESS_TABLE = 'key_rotation_progress'
+"""Records each re-encryption job's watermark, per table and per target key."""
+
+ENCRYPTED_COLUMNS = {
+    Memo.__table__: ('body',),
+    User.__table__: ('_User__hashed_pass',),
+}
+"""The columns holding Fernet tokens, by table."""
+
+
+def _key_id(key) -> str:
+    # Identifies the key a job re-encrypts to, without storing the key itself.
+    return hashlib.sha256(key).hexdigest()[:16]
+
+
+class ReencryptionJob:
+    """
+    Re-encrypts the token columns of one table with the newest key, a chunk at a time.
+
+    Use `run()` to work in the calling thread until done, or `start()` / `stop()` to work in the background. Progress
+    is kept per (table, newest key), so after another rotation the job starts over, and running a finished job again
+    does nothing.
+
+    Attributes:
+        engine (sqlalchemy.engine.Engine):
+            The database.
+
+        table (sqlalchemy.Table):
+            The table to re-encrypt. Its primary key must be a single integer column.
+
+        columns (tuple[str]):
+            The names of the columns holding tokens.
+
+        chunk_size (int):
+            The most rows re-encrypted per transaction.
+
+        max_rows_per_second (float, optional):
+            The fastest the job may go. None removes the limit.
+
+        pause (float):
+            The least time, in seconds, left between chunks, so writers waiting for the lock get it.
+
+        label (str):
+            What the job is called in reports. Defaults to the table's name.
+    """
+
+    def __init__(
+            self,
+            engine,
+            table,
+            columns,
+            encryption=None,
+            chunk_size=500,
+            max_rows_per_second=5000.0,
+            pause=0.01,
+            label=None,
+    ):
+        """
+        Initializes the job.
+
+        Parameters:
+            engine (sqlalchemy.engine.Engine):
+                The database.
+
+            table (sqlalchemy.Table):
+                The table to re-encrypt.
+
+            columns (Iterable[str]):
+                The names of the columns holding tokens.
+
+            encryption (EncryptionManager, optional):
+                Holds the keys. Defaults to the application's encryption manager.
+
+            chunk_size (int):
+                The most rows re-encrypted per transaction.
+
+            max_rows_per_second (float, optional):
+                The fastest the job may go. None removes the limit.
+
+            pause (float):
+                The least time, in seconds, left between chunks.
+
+            label (str, optional):
+                What the job is called in reports. Defaults to the table's name.
+        """
+        self.engine = engine
+        self.table = table
+        self.columns = tuple(columns)
+        self.encryption = encryption if encryption is not None else get_encryption_manager()
+        self.chunk_size = chunk_size
+        self.max_rows_per_second = max_rows_per_second
+        self.pause = pause
+        self.label = label if label is not None else table.name
+
+        (self.__id,) = table.primary_key.columns
+        self.__key_id = None
+        self.__stop = threading.Event()
+        self.__thread = None
+        self.__error = None
+        self.__started_at = None
+        self.__done_at_start = 0
+        self.__progress = None  # (position, target, done, total)
+
+    @property
+    def name(self) -> str:
+        """
+        The name of the table being re-encrypted.
+        """
+        return self.table.name
+
+    @property
+    def error(self):
+        """
+        The exception that stopped the background job, if one did.
+        """
+        return self.__error
+
+    def _ensure_progress_table(self, connection):
+        connection.exec_driver_sql(
+            f'CREATE TABLE IF NOT EXISTS {PROGRESS_TABLE} ('
+            'name TEXT NOT NULL, key_id TEXT NOT NULL, position INTEGER NOT NULL, target INTEGER NOT NULL, '
+            'done INTEGER NOT NULL, total INTEGER NOT NULL, PRIMARY KEY (name, key_id))'
+        )
+
+    def _load(self, connection):
+        row = connection.execute(
+            text(f'SELECT position, target, done, total FROM {PROGRESS_TABLE} WHERE name = :name AND key_id = :key_id'),
+            {'name': self.name, 'key_id': self.__key_id},
+        ).one_or_none()
+        return tuple(row) if row is not None else None
+
+    def _initial_progress(self, connection) -> tuple:
+        # Rows added later are written with the newest key already.
+        target = connection.execute(select(func.max(self.__id))).scalar() or 0
+        total = connection.execute(select(func.count()).where(self.__id <= target)).scalar()
+        return 0, target, 0, total
+
+    def _peek(self) -> tuple:
+        """
+        Reads the job's watermark without writing anything; a job that has not started yet has everything up to the
+        current highest id still to do.
+        """
+        self.__key_id = _key_id(self.encryption.fernet_key)
+        with self.engine.connect() as connection:
+            started = connection.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': PROGRESS_TABLE}
+            ).first() is not None
+            progress = self._load(connection) if started else None
+            return progress if progress is not None else self._initial_progress(connection)
+
+    def _prepare(self):
+        """
+        Loads the job's watermark, or sets one up: everything up to the current highest id is to be re-encrypted.
+        """
+        self.__key_id = _key_id(self.encryption.fernet_key)
+        with self.engine.connect() as connection:
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+            self._ensure_progress_table(connection)
+            progress = self._load(connection)
+            if progress is None:
+                progress = self._initial_progress(connection)
+                connection.execute(
+                    text(
+                        f'INSERT INTO {PROGRESS_TABLE} (name, key_id, position, target, done, total) '
+                        'VALUES (:name, :key_id, :position, :target, :done, :total)'
+                    ),
+                    dict(zip(('position', 'target', 'done', 'total'), progress), name=self.name, key_id=self.__key_id),
+                )
+            connection.commit()
+
+        self.__done_at_start = progress[2]
+        self.__started_at = time.monotonic()
+        self.__progress = progress
+
+    def step(self) -> int:
+        """
+        Re-encrypts the next chunk of rows in one transaction.
+
+        Returns:
+            int:
+                The number of rows re-encrypted; 0 once the job is finished.
+        """
+        if self.__progress is None:
+            self._prepare()
+
+        position, target, done, total = self.__progress
+        if position >= target:
+            return 0
+
+        columns = [self.table.c[name] for name in self.columns]
+        statement = (
+            update(self.table)
+            .where(self.__id == bindparam('row_id'))
+            .values({name: bindparam(f'new_{name}') for name in self.columns})
+        )
+        rotate = self.encryption.rotate
+
+        with self.engine.connect() as connection:
+            # Take the write lock first, so no other writer can change the rows between reading and rewriting them.
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+            rows = connection.execute(
+                select(self.__id, *columns)
+                .where(self.__id > position, self.__id <= target)
+                .order_by(self.__id)
+                .limit(self.chunk_size)
+            ).all()
+
+            if rows:
+                connection.execute(statement, [
+                    {'row_id': row[0], **{
+                        f'new_{name}': rotate(token) if token is not None else None
+                        for name, token in zip(self.columns, row[1:])
+                    }}
+                    for row in rows
+                ])
+                position, done = rows[-1][0], done + len(rows)
+            else:
+                position = target
+
+            connection.execute(
+                text(
+                    f'UPDATE {PROGRESS_TABLE} SET position = :position, done = :done '
+                    'WHERE name = :name AND key_id = :key_id'
+                ),
+                {'position': position, 'done': done, 'name': self.name, 'key_id': self.__key_id},
+            )
+            connection.commit()
+
+        self.__progress = (position, target, done, total)
+        return len(rows)
+
+    def progress(self) -> dict:
+        """
+        Reports how far the job has got.
+
+        Only reads the database: a job that has not run in this process reports the watermark committed by earlier
+        runs, or, if it has never run, that everything is still to do.
+
+        Returns:
+            dict:
+                `done` and `remaining` rows, `rows_per_second` since the job (re)started in this process, the
+                `position` watermark and `target` id, and whether the job is `finished`.
+        """
+        progress = self.__progress
+        if progress is None:
+            position, target, done, total = self._peek()
+            rows_per_second = 0.0
+        else:
+            position, target, done, total = progress
+            elapsed = time.monotonic() - self.__started_at
+            rows_per_second = (done - self.__done_at_start) / elapsed if elapsed > 0 else 0.0
+
+        return {
+            'job': self.label,
+            'table': self.name,
+            'done': done,
+            'remaining': max(0, total - done) if position < target else 0,
+            'rows_per_second': rows_per_second,
+            'position': position,
+            'target': target,
+            'finished': position >= target,
+        }
+
+    def run(self):
+        """
+        Re-encrypts chunks until the job is finished or `stop()` is called, keeping under `max_rows_per_second`.
+        """
+        while not self.__stop.is_set():
+            started = time.monotonic()
+            rows = self.step()
+            if not rows:
+                return
+
+            # Waiting between chunks leaves the write lock free for live traffic; SQLite's lock is not fair, so a
+            # job that went straight on to its next chunk would keep it.
+            wait = self.pause
+            if self.max_rows_per_second:
+                wait = max(wait, rows / self.max_rows_per_second - (time.monotonic() - started))
+            self.__stop.wait(wait)
+
+    def _run_in_background(self):
+        try:
+            self.run()
+        except Exception as e:
+            self.__error = e
+            print(f'Re-encrypting {self.label} failed: {e}')
+
+    def start(self):
+        """
+        Starts re-encrypting in the background.
+        """
+        if self.__thread is not None and self.__thread.is_alive():
+            return
+
+        self.__stop.clear()
+        self.__error = None
+        self.__thread = threading.Thread(
+            target=self._run_in_background, name=f'memo-reencrypt-{self.label}', daemon=True
+        )
+        self.__thread.start()
+
+    def stop(self):
+        """
+        Stops the background job after its current chunk. It resumes from there when started again.
+        """
+        self.__stop.set()
+        self.join()
+
+    def join(self, timeout=None):
+        """
+        Waits for the background job to finish or stop.
+        """
+        if self.__thread is not None:
+            self.__thread.join(timeout)
+            if not self.__thread.is_alive():
+                self.__thread = None
+
+    def __repr__(self):
+        return f'ReencryptionJob({self.label!r}, columns={self.columns})'
+
+
+def reencryption_jobs(engine=None, partitions=None, prefix='memos', **options) -> list:
+    """
+    Makes a re-encryption job for every table holding encrypted data (see `ENCRYPTED_COLUMNS`), and one for the memos
+    in every partition file that exists.
+
+    Parameters:
+        engine (sqlalchemy.engine.Engine, optional):
+            The database. Defaults to the application database.
+
+        partitions (str | Path, optional):
+            The directory holding `PartitionedMemoStore` partition files. Defaults to the store's default directory.
+
+        prefix (str):
+            The partition files' name prefix (see `PartitionRouter`).
+
+        **options:
+            Passed on to each `ReencryptionJob` (e.g. `chunk_size`, `max_rows_per_second`).
+
+    Returns:
+        list[ReencryptionJob]:
+            The jobs. Partition jobs have an engine of their own, which the caller should dispose of when done.
+    """
+    from inspyred_memo_server.store.partitioned import PartitionRouter, default_directory, partition_engine
+
+    if engine is None:
+        from inspyred_memo_server.database import get_engine
+        engine = get_engine()
+
+    jobs = [ReencryptionJob(engine, table, columns, **options) for table, columns in ENCRYPTED_COLUMNS.items()]
+
+    router = PartitionRouter(partitions if partitions is not None else default_directory(), None, prefix)
+    for partition in sorted(router.existing()):
+        jobs.append(ReencryptionJob(
+            partition_engine(router.path(partition), pool_size=1, max_overflow=0), Memo.__table__,
+            ENCRYPTED_COLUMNS[Memo.__table__], label=f'{Memo.__table__.name}[{partition}]', **options,
+        ))
+
+    return jobs
+
+
+def _report(jobs):
+    for job in jobs:
+        progress = job.progress()
+        state = 'finished' if progress['finished'] else f"{progress['remaining']} rows remaining"
+        rate = progress['rows_per_second']
+        print(f"{progress['job']:<14}{progress['done']:>10} done{rate:>12,.0f} rows/s  {state}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--partitions', help='the partition directory of a partitioned memo store')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('rotate', help='add a new key that encrypts from now on')
+    reencrypt_parser = commands.add_parser('reencrypt', help='re-encrypt stored data with the newest key')
+    reencrypt_parser.add_argument('--chunk-size', type=int, default=500)
+    reencrypt_parser.add_argument('--rate', type=float, default=5000.0, help='the most rows per second (0: no limit)')
+    commands.add_parser('status', help='show how far re-encryption has got')
+    commands.add_parser('retire', help='drop the old keys, once re-encryption has finished')
+    args = parser.parse_args()
+
+    if args.command == 'rotate':
+        get_key_provider().rotate()
+        print('Added a new key. Refresh running servers (SIGHUP), then run `reencrypt`.')
+        return
+
+    if args.command == 'reencrypt':
+        jobs = reencryption_jobs(
+            partitions=args.partitions, chunk_size=args.chunk_size, max_rows_per_second=args.rate or None
+        )
+        for job in jobs:
+            job.start()
+            while True:
+                job.join(1.0)
+                _report([job])
+                if job.progress()['finished']:
+                    break
+                if job.error is not None:
+                    raise SystemExit(1)
+        return
+
+    jobs = reencryption_jobs(partitions=args.partitions)
+    if args.command == 'status':
+        _report(jobs)
+        return
+
+    unfinished = [job.label for job in jobs if not job.progress()['finished']]
+    if unfinished:
+        raise SystemExit(f"Re-encryption has not finished for: {', '.join(unfinished)}")
+    get_key_provider().retire()
+    print('Dropped the old keys.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    inspyred_memo_server/database/search.py
+
+
+Description:
+    A full-text index over memos, backed by an SQLite FTS5 table kept next to the `memos` table.
+
+    What is indexed:
+        Memo bodies are encrypted at rest, so the index is built from the *plaintext* body (decrypted, or not yet
+        encrypted, at write time) and from the author's username. `created_at` and `size` are not indexed.
+
+        The FTS5 table is contentless (`content=''`): it stores the inverted index (the distinct terms, and which
+        rows and positions contain them) but never a copy of the body, so it cannot return memo text. Results are
+        ids, which are then read (and decrypted) from `memos`. The terms themselves are stored in plaintext, so
+        anyone with the database file can see which words occur in which memos, though not the memos themselves.
+
+    Because the index is contentless, removing a row from it requires the values it was indexed with; updates and
+    deletes therefore pass the old plaintext.
+
+"""
+from sqlalchemy import DDL, text
+
+
+__all__ = [
+    'CREATE_FTS_TABLE',
+    'FTS_TABLE',
+    'build_match_query',
+    'create_search_index',
+    'index_memos',
+    'search_memos',
+    'unindex_memo',
+]
+
+
+FTS_TABLE = 'memos_fts'
+"""The name of the FTS5 table; its rowid is the memo id."""
+
+CREATE_FTS_TABLE = DDL(
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "body, author, content='', tokenize='unicode61 remove_diacritics 2')"
+)
+"""The statement that creates the FTS5 table."""
+
+
+def create_search_index(connection):
+    """
+    Creates the FTS5 table if it does not exist.
+
+    Parameters:
+        connection (sqlalchemy.engine.Connection):
+            The connection to create it on.
+    """
+    connection.execute(CREATE_FTS_TABLE)
+
+
+def index_memos(connection, memos):
+    """
+    Adds memos to the full-text index, in the caller's transaction.
+
+    Parameters:
+        connection (sqlalchemy.engine.Connection):
+            The connection the memos were inserted on.
+
+        memos (list[dict]):
+            The memos to index, each with its `id`, plaintext `body` and `author`.
+    """
+    if not memos:
+        return
+
+    connection.execute(
+        text(f'INSERT INTO {FTS_TABLE}(rowid, body, author) VALUES (:id, :body, :author)'),
+        [{'id': memo['id'], 'body': memo['body'], 'author': memo['author'] or ''} for memo in memos],
+    )
+
+
+def unindex_memo(connection, memo_id, body, author):
+    """
+    Removes a memo from the full-text index, in the caller's transaction.
+
+    Parameters:
+        connection (sqlalchemy.engine.Connection):
+            The connection the memo is being changed on.
+
+        memo_id (int):
+            The memo ID.
+
+        body (str):
+            The plaintext body the memo was indexed with.
+
+        author (str | None):
+            The author the memo was indexed with.
+    """
+    connection.execute(
+        text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, body, author) VALUES ('delete', :id, :body, :author)"),
+        {'id': memo_id, 'body': body, 'author': author or ''},
+    )
+
+
+def _quote(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def build_match_query(query: str, phrase=False, prefix=False, author=None) -> str:
+    """
+    Turns user input into an FTS5 MATCH expression, quoting every term so that input cannot inject query syntax.
+
+    Parameters:
+        query (str):
+            The words to look for.
+
+        phrase (bool):
+            Match the words as one consecutive phrase, rather than each anywhere in the memo.
+
+        prefix (bool):
+            Let the last word (for a phrase) or every word match as a prefix, e.g. 'mem' matches 'memo'.
+
+        author (str, optional):
+            Only match memos by this author.
+
+    Returns:
+        str:
+            The MATCH expression.
+
+    Raises:
+        ValueError:
+            If the query has no words.
+    """
+    terms = query.split()
+    if not terms:
+        raise ValueError('A search needs at least one word.')
+
+    if phrase:
+        expression = _quote(' '.join(terms)) + (' *' if prefix else '')
+    else:
+        expression = ' AND '.join(_quote(term) + ('*' if prefix else '') for term in terms)
+
+    expression = '{body}: (' + expression + ')'
+    if author is not None:
+        expression += ' AND {author}: ' + _quote(author)
+
+    return expression
+
+
+def search_memos(connection, match, limit=20, after=None) -> list:
+    """
+    Finds the memos matching an FTS5 expression, best match first.
+
+    Results are ordered by (bm25 rank, id), and pages are fetched with a keyset condition on that pair rather than
+    OFFSET. Ranks shift slightly as memos are added, so page boundaries are only exact while the index is unchanged.
+
+    Parameters:
+        connection (sqlalchemy.engine.Connection):
+            The connection to search on.
+
+        match (str):
+            The MATCH expression, e.g. from `build_match_query`.
+
+        limit (int):
+            The most results to return.
+
+        after (tuple, optional):
+            The (rank, id) of the last result already seen.
+
+    Returns:
+        list[tuple]:
+            Up to `limit` (memo id, rank) pairs. Lower ranks are better matches.
+    """
+    # FTS5's `rank` column is bm25() by default; ordering by it, rather than by bm25() itself, lets FTS5 sort the
+    # matches internally.
+    sql = f'SELECT rowid, rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match'
+    parameters = {'match': match, 'limit': limit}
+    if after is not None:
+        sql += ' AND (rank > :rank OR (rank = :rank AND rowid > :id))'
+        parameters.update(rank=after[0], id=after[1])
+    sql += ' ORDER BY rank, rowid LIMIT :limit'
+
+    return [tuple(row) for row in connection.execute(text(sql), parameters)]
@@ -0,0 +1,188 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    inspyred_memo_server/database/session.py
+
+
+Description:
+    Thread- and task-safe access to ORM sessions: a unit-of-work context manager that gives each caller its own
+    session, a scoped session registry for code that wants an implicit "current" session, and connection pool sizing
+    for the engines they draw from.
+
+"""
+import asyncio
+import functools
+import threading
+from contextlib import contextmanager
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+
+__all__ = [
+    'SessionManager',
+    'current_scope',
+    'pool_options',
+]
+
+
+def current_scope():
+    """
+    Identifies the scope a scoped session belongs to: the running asyncio task, or else the current thread.
+
+    Tasks on one event loop share a thread, so scoping by thread alone would hand them all the same session.
+
+    Returns:
+        int:
+            The identity of the current task or thread.
+    """
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+
+    return id(task) if task is not None else threading.get_ident()
+
+
+def pool_options(url, pool_size=16, max_overflow=16, pool_timeout=30.0, pool_recycle=-1) -> dict:
+    """
+    Gets the `create_engine` arguments that size an engine's connection pool.
+
+    The pool caps how many sessions can hold a connection at once; further sessions wait up to `pool_timeout`
+    seconds for one to be returned. Sizing it to the number of workers that touch the database (rather than
+    SQLAlchemy's default of 5 + 10 overflow) keeps a busy server from failing with pool timeouts, while still bounding
+    the number of connections contending for SQLite's single write lock.
+
+    In-memory SQLite databases exist only inside one connection, so they keep SQLAlchemy's per-thread pool and are
+    not sized.
+
+    Parameters:
+        url (str | sqlalchemy.engine.URL):
+            The database URL.
+
+        pool_size (int):
+            The number of connections kept open.
+
+        max_overflow (int):
+            The number of extra connections opened under load and closed when returned.
+
+        pool_timeout (float):
+            Seconds to wait for a free connection before raising `sqlalchemy.exc.TimeoutError`.
+
+        pool_recycle (int):
+            Seconds after which a connection is replaced; -1 keeps connections indefinitely.
+
+    Returns:
+        dict:
+            Keyword arguments for `sqlalchemy.create_engine`.
+    """
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return {}
+
+    return {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': pool_timeout,
+        'pool_recycle': pool_recycle,
+    }
+
+
+class SessionManager:
+    """
+    Hands out ORM sessions for one engine.
+
+    Sessions are not thread-safe, so none is ever shared between threads or tasks:
+
+    - `unit_of_work()` opens a new session for the block, commits it if the block succeeds, rolls it back if it raises,
+      and always closes it, returning its connection to the pool.
+    - `scoped` is a `scoped_session` registry whose session is private to the current thread or asyncio task (see
+      `current_scope`). Code using it must call `remove()` when its thread or task is done with the session.
+
+    Sessions block while they talk to the database. From asyncio code, use `run_async`, which runs a unit of work on
+    an executor thread instead of the event loop.
+
+    Attributes:
+        engine (sqlalchemy.engine.Engine):
+            The engine sessions are bound to.
+
+        factory (sqlalchemy.orm.sessionmaker):
+            Makes new sessions bound to the engine.
+
+        scoped (sqlalchemy.orm.scoped_session):
+            The registry of per-thread/per-task sessions.
+    """
+
+    def __init__(self, engine, **session_options):
+        """
+        Initializes the manager.
+
+        Parameters:
+            engine (sqlalchemy.engine.Engine):
+                The engine to bind sessions to.
+
+            **session_options:
+                Passed on to `sessionmaker`, e.g. `expire_on_commit=False`.
+        """
+        self.engine = engine
+        self.factory = sessionmaker(bind=engine, **session_options)
+        self.scoped = scoped_session(self.factory, scopefunc=current_scope)
+
+    @contextmanager
+    def unit_of_work(self):
+        """
+        Runs a block in its own session and transaction.
+
+        Yields:
+            sqlalchemy.orm.Session:
+                The session, committed when the block exits normally and rolled back if it raises.
+        """
+        session = self.factory()
+        try:
+            yield session
+            session.commit()
+        except BaseException:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def run(self, work, *args, **kwargs):
+        """
+        Calls `work(session, *args, **kwargs)` inside a unit of work.
+
+        Returns:
+            The value `work` returned.
+        """
+        with self.unit_of_work() as session:
+            return work(session, *args, **kwargs)
+
+    async def run_async(self, work, *args, executor=None, **kwargs):
+        """
+        Calls `work(session, *args, **kwargs)` inside a unit of work on an executor thread, so the event loop is not
+        blocked while it talks to the database.
+
+        Parameters:
+            work (callable):
+                The function to run; it receives the session as its first argument.
+
+            executor (concurrent.futures.Executor, optional):
+                The executor to run on. Defaults to the event loop's default executor.
+
+        Returns:
+            The value `work` returned.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(self.run, work, *args, **kwargs))
+
+    def remove(self):
+        """
+        Closes and forgets the current thread's or task's scoped session.
+        """
+        self.scoped.remove()
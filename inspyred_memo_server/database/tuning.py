@@ -0,0 +1,249 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    inspyred_memo_server/database/tuning.py
+
+
+Description:
+    SQLite performance profiles, applied to every new connection of an engine, and periodic WAL checkpointing.
+
+"""
+import threading
+from sqlalchemy import event, text
+
+
+__all__ = [
+    'DEFAULT_PROFILE',
+    'SQLiteProfile',
+    'WalCheckpointer',
+    'install_profile',
+]
+
+
+JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+SYNCHRONOUS_LEVELS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+TEMP_STORES = ('DEFAULT', 'FILE', 'MEMORY')
+
+
+class SQLiteProfile:
+    """
+    A set of SQLite pragmas to apply to every connection.
+
+    The defaults favour concurrent ingest: WAL lets readers and the writer proceed together, synchronous=NORMAL only
+    syncs at checkpoints (still crash-safe in WAL mode; a power cut may lose the last transactions), and a larger
+    page cache and memory map keep hot pages out of the read() path.
+
+    Attributes:
+        journal_mode (str):
+            The journal mode (one of `JOURNAL_MODES`).
+
+        synchronous (str):
+            How hard SQLite syncs to disk (one of `SYNCHRONOUS_LEVELS`).
+
+        mmap_size (int):
+            The most bytes of the database file to memory-map; 0 disables memory-mapped I/O.
+
+        cache_size (int):
+            The page cache size: a positive number of pages, or a negative number of KiB.
+
+        temp_store (str):
+            Where temporary tables and indices are kept (one of `TEMP_STORES`).
+
+        busy_timeout (int):
+            How long, in milliseconds, to wait for a lock held by another connection before failing.
+    """
+
+    def __init__(
+            self,
+            journal_mode='WAL',
+            synchronous='NORMAL',
+            mmap_size=256 * 1024 * 1024,
+            cache_size=-64 * 1024,
+            temp_store='MEMORY',
+            busy_timeout=5000,
+    ):
+        journal_mode = journal_mode.upper()
+        synchronous = synchronous.upper()
+        temp_store = temp_store.upper()
+
+        if journal_mode not in JOURNAL_MODES:
+            raise ValueError(f"journal_mode must be one of {', '.join(JOURNAL_MODES)}, got {journal_mode}")
+        if synchronous not in SYNCHRONOUS_LEVELS:
+            raise ValueError(f"synchronous must be one of {', '.join(SYNCHRONOUS_LEVELS)}, got {synchronous}")
+        if temp_store not in TEMP_STORES:
+            raise ValueError(f"temp_store must be one of {', '.join(TEMP_STORES)}, got {temp_store}")
+
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.mmap_size = int(mmap_size)
+        self.cache_size = int(cache_size)
+        self.temp_store = temp_store
+        self.busy_timeout = int(busy_timeout)
+
+    def pragmas(self) -> list:
+        """
+        Gets the pragma statements that apply the profile.
+
+        Returns:
+            list[str]:
+                The statements, in the order they should run.
+        """
+        return [
+            f'PRAGMA busy_timeout={self.busy_timeout}',
+            f'PRAGMA journal_mode={self.journal_mode}',
+            f'PRAGMA synchronous={self.synchronous}',
+            f'PRAGMA mmap_size={self.mmap_size}',
+            f'PRAGMA cache_size={self.cache_size}',
+            f'PRAGMA temp_store={self.temp_store}',
+        ]
+
+    def apply(self, dbapi_connection):
+        """
+        Runs the profile's pragmas on a raw DB-API connection.
+
+        Parameters:
+            dbapi_connection (sqlite3.Connection):
+                The connection to configure.
+        """
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in self.pragmas():
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    def __repr__(self):
+        return (
+            f'SQLiteProfile(journal_mode={self.journal_mode!r}, synchronous={self.synchronous!r}, '
+            f'mmap_size={self.mmap_size}, cache_size={self.cache_size}, temp_store={self.temp_store!r}, '
+            f'busy_timeout={self.busy_timeout})'
+        )
+
+
+DEFAULT_PROFILE = SQLiteProfile()
+"""The profile applied to the application database unless configured otherwise."""
+
+
+def install_profile(engine, profile=DEFAULT_PROFILE):
+    """
+    Applies a profile to every connection the engine opens from now on.
+
+    Parameters:
+        engine (sqlalchemy.engine.Engine):
+            The engine to configure.
+
+        profile (SQLiteProfile):
+            The profile to apply.
+
+    Returns:
+        callable:
+            The installed `connect` listener, which can be passed to `sqlalchemy.event.remove`.
+    """
+    def apply_profile(dbapi_connection, connection_record):
+        profile.apply(dbapi_connection)
+
+    event.listen(engine, 'connect', apply_profile)
+    return apply_profile
+
+
+class WalCheckpointer:
+    """
+    Periodically checkpoints an engine's write-ahead log.
+
+    SQLite checkpoints automatically from whichever connection commits past `wal_autocheckpoint` pages, which puts the
+    cost on an unlucky writer and lets the WAL grow without bound while readers hold old snapshots. This runs a
+    PASSIVE checkpoint (which never blocks readers or the writer) on its own thread every `interval` seconds, and a
+    TRUNCATE checkpoint, to give the disk space back, whenever the log has grown past `truncate_pages`.
+
+    Attributes:
+        engine (sqlalchemy.engine.Engine):
+            The engine to checkpoint.
+
+        interval (float):
+            Seconds between checkpoints.
+
+        truncate_pages (int):
+            The WAL size, in pages, beyond which the log is truncated after being checkpointed.
+    """
+
+    def __init__(self, engine, interval=30.0, truncate_pages=100_000):
+        self.engine = engine
+        self.interval = interval
+        self.truncate_pages = truncate_pages
+
+        self.__stop = threading.Event()
+        self.__thread = None
+        self.__last_result = None
+        self.__checkpoints = 0
+
+    @property
+    def checkpoints(self) -> int:
+        """
+        The number of checkpoints run so far.
+        """
+        return self.__checkpoints
+
+    @property
+    def last_result(self):
+        """
+        The (busy, log pages, checkpointed pages) row reported by the last checkpoint, or None before the first.
+        """
+        return self.__last_result
+
+    def checkpoint(self, mode='PASSIVE'):
+        """
+        Runs one checkpoint.
+
+        Parameters:
+            mode (str):
+                The checkpoint mode: PASSIVE, FULL, RESTART or TRUNCATE.
+
+        Returns:
+            tuple:
+                SQLite's (busy, log pages, checkpointed pages) result.
+        """
+        if mode.upper() not in ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'):
+            raise ValueError(f'Unknown checkpoint mode {mode}')
+
+        with self.engine.connect() as connection:
+            result = tuple(connection.execute(text(f'PRAGMA wal_checkpoint({mode.upper()})')).one())
+
+        self.__last_result = result
+        self.__checkpoints += 1
+        return result
+
+    def _run(self):
+        while not self.__stop.wait(self.interval):
+            try:
+                busy, log_pages, _ = self.checkpoint('PASSIVE')
+                if not busy and log_pages > self.truncate_pages:
+                    self.checkpoint('TRUNCATE')
+            except Exception as e:
+                print(f"WAL checkpoint failed: {e}")
+
+    def start(self):
+        """
+        Starts checkpointing in the background.
+        """
+        if self.__thread is not None and self.__thread.is_alive():
+            return
+
+        self.__stop.clear()
+        self.__thread = threading.Thread(target=self._run, name='memo-wal-checkpointer', daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        """
+        Stops the background checkpoints.
+        """
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
@@ -19,12 +19,42 @@ import bcrypt
 from sqlalchemy import create_engine, Column, Integer, String, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from inspyred_memo_server.database.crypt import EncryptedField
 
 
 # Set up base class for declarative base
 Base = declarative_base()
 
 
+def hash_password(password: str, cost: int = 12) -> str:
+    """
+    Hashes a password with bcrypt.
+
+    Parameters:
+        password (str):
+            The password to hash.
+
+        cost (int):
+            The bcrypt cost factor; each step doubles the work.
+
+    Returns:
+        str:
+            The bcrypt hash.
+    """
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=cost)).decode('utf-8')
+
+
+def check_password(password: str, hashed_password: str) -> bool:
+    """
+    Checks a password against a bcrypt hash, at whatever cost the hash was made with.
+
+    Returns:
+        bool:
+            Whether the password matches.
+    """
+    return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+
 class User(Base):
     """
     User class for storing user data.
@@ -36,8 +66,8 @@ class User(Base):
         username (str):
             The username.
 
-        password (str):
-            The hashed password.
+        hashed_password (str):
+            The bcrypt hash of the password. It is stored encrypted, and only decrypted when read.
     """
     __tablename__ = 'users'
     __id = Column(Integer, primary_key=True)
@@ -45,16 +75,7 @@ class User(Base):
     __username = Column(String, unique=True, nullable=False)
     __hashed_pass = Column(Text, nullable=False)
 
-    @property
-    def hashed_password(self):
-        """
-        Gets the hashed password.
-
-        Returns:
-            Column[Text]:
-                The hashed password.
-        """
-        return self.__hashed_pass
+    hashed_password = EncryptedField('_User__hashed_pass', doc='The bcrypt hash of the password.')
 
     @property
     def id(self):
@@ -78,9 +99,14 @@ class User(Base):
         """
         return self.__username
 
+    @username.setter
+    def username(self, new):
+        self.__username = new
+
     def set_password(self, password: str):
         """
-        Sets the password for the user.
+        Sets the password for the user, hashing it on the calling thread at the default cost. Servers should hash
+        through `inspyred_memo_server.database.user.auth.PasswordHasher` (as the user repositories do) instead.
 
         Parameters:
             password (str):
@@ -89,7 +115,7 @@ class User(Base):
         Returns:
             None
         """
-        self.__hashed_pass = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        self.hashed_password = hash_password(password)
 
     def check_password(self, password: str) -> bool:
-        return bcrypt.checkpw(password.encode('utf-8'), self.hashed_password.encode('utf-8'))
+        return check_password(password, self.hashed_password)
@@ -0,0 +1,286 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    inspyred_memo_server/database/user/auth.py
+
+
+Description:
+    Runs bcrypt on a small executor of its own, so a burst of logins cannot stall the threads (or the event loop) that
+    serve everything else, nor crowd Fernet work off the shared crypto executor.
+
+    At most `max_workers` hashes run at once and at most `max_queue` more wait for a worker; anything past that is
+    refused with `AuthBusyError` straight away, since a login that waits behind hundreds of others would time out on
+    the client anyway. The cost factor is configurable, or calibrated at start-up to the highest cost that hashes within
+    a target latency on this machine. Hashes made at a lower cost than the current one are upgraded by the user
+    repositories after a successful login, while the plaintext password is at hand.
+
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from inspyred_memo_server.database.user import check_password, hash_password
+from inspyred_memo_server.errors.auth import AuthBusyError
+from inspyred_memo_server.utils.decorators import lazy_singleton
+
+
+__all__ = [
+    'PasswordHasher',
+    'calibrate_cost',
+    'get_password_hasher',
+    'hash_cost',
+]
+
+
+MIN_COST = 4
+MAX_COST = 31
+
+
+def hash_cost(hashed_password: str) -> int:
+    """
+    Reads the cost factor out of a bcrypt hash (the `12` in `$2b$12$...`).
+
+    Returns:
+        int:
+            The cost the hash was made with.
+    """
+    try:
+        return int(hashed_password.split('$')[2])
+    except (IndexError, ValueError):
+        raise ValueError('Not a bcrypt hash') from None
+
+
+def _time_hash(cost, repeat=1) -> float:
+    fastest = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        hash_password('calibration', cost)
+        fastest = min(fastest, time.perf_counter() - start)
+
+    return fastest
+
+
+def calibrate_cost(target_latency=0.25, minimum=10, maximum=16, probe=8) -> int:
+    """
+    Picks the highest bcrypt cost that hashes a password within `target_latency` seconds on this machine.
+
+    Each step of cost doubles the work, so the cost is extrapolated from the fastest of three hashes at the cheap
+    `probe` cost, then one hash at the chosen cost checks the estimate (and the cost is lowered while it overshoots).
+    The result never goes below `minimum`, however slow the machine.
+
+    Parameters:
+        target_latency (float):
+            The most seconds one hash should take.
+
+        minimum (int):
+            The lowest cost returned.
+
+        maximum (int):
+            The highest cost returned.
+
+        probe (int):
+            The cost timed to make the first estimate.
+
+    Returns:
+        int:
+            The cost.
+    """
+    if not MIN_COST <= minimum <= maximum <= MAX_COST:
+        raise ValueError(f'Costs must satisfy {MIN_COST} <= minimum <= maximum <= {MAX_COST}, '
+                         f'got {minimum} and {maximum}')
+
+    if target_latency <= 0:
+        raise ValueError(f'target_latency must be positive, got {target_latency}')
+
+    elapsed = _time_hash(probe, repeat=3)
+    cost = min(max(probe + math.floor(math.log2(target_latency / elapsed)), minimum), maximum)
+    while cost > minimum and _time_hash(cost) > target_latency:
+        cost -= 1
+
+    return cost
+
+
+class PasswordHasher:
+    """
+    Hashes and checks passwords on a dedicated, bounded thread pool.
+
+    bcrypt releases the GIL while it works, so the workers run in parallel; there is little point having more of them
+    than there are CPUs. Every method that takes a password returns (or awaits) a future from the pool and raises
+    `AuthBusyError` instead when `max_workers + max_queue` hashes are already in flight.
+
+    Attributes:
+        cost (int):
+            The bcrypt cost new hashes are made with.
+
+        max_workers (int):
+            The most hashes computed at once.
+
+        max_queue (int):
+            The most hashes waiting for a worker.
+    """
+
+    def __init__(self, cost=12, max_workers=None, max_queue=64):
+        """
+        Initializes the hasher.
+
+        Parameters:
+            cost (int):
+                The bcrypt cost new hashes are made with.
+
+            max_workers (int, optional):
+                The most hashes computed at once. Defaults to the number of CPUs, up to 4.
+
+            max_queue (int):
+                The most hashes waiting for a worker before new ones are refused.
+        """
+        if not MIN_COST <= cost <= MAX_COST:
+            raise ValueError(f'cost must be between {MIN_COST} and {MAX_COST}, got {cost}')
+
+        if max_queue < 0:
+            raise ValueError(f'max_queue must not be negative, got {max_queue}')
+
+        self.cost = cost
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.max_queue = max_queue
+
+        self.__executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='memo-bcrypt')
+        self.__lock = threading.Lock()
+        self.__pending = 0
+        self.__counters = dict.fromkeys(('hashes', 'checks', 'rejected'), 0)
+
+    @property
+    def pending(self) -> int:
+        """
+        The hashes running or waiting for a worker.
+        """
+        return self.__pending
+
+    def _done(self, _future):
+        with self.__lock:
+            self.__pending -= 1
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Runs `func` on the hasher's pool, if there is room in the queue.
+
+        Returns:
+            concurrent.futures.Future:
+                The future of `func`'s result.
+
+        Raises:
+            AuthBusyError:
+                If `max_workers + max_queue` calls are already in flight.
+        """
+        with self.__lock:
+            if self.__pending >= self.max_workers + self.max_queue:
+                self.__counters['rejected'] += 1
+                raise AuthBusyError()
+
+            self.__pending += 1
+
+        try:
+            future = self.__executor.submit(func, *args, **kwargs)
+        except BaseException:
+            self._done(None)
+            raise
+
+        future.add_done_callback(self._done)
+        return future
+
+    def submit_hash(self, password):
+        """
+        Starts hashing a password at the hasher's cost. See `submit`.
+        """
+        future = self.submit(hash_password, password, self.cost)
+        with self.__lock:
+            self.__counters['hashes'] += 1
+
+        return future
+
+    def submit_check(self, password, hashed_password):
+        """
+        Starts checking a password against a bcrypt hash. See `submit`.
+        """
+        future = self.submit(check_password, password, hashed_password)
+        with self.__lock:
+            self.__counters['checks'] += 1
+
+        return future
+
+    def hash(self, password) -> str:
+        """
+        Hashes a password at the hasher's cost, waiting for the result.
+        """
+        return self.submit_hash(password).result()
+
+    def check(self, password, hashed_password) -> bool:
+        """
+        Checks a password against a bcrypt hash, waiting for the result.
+        """
+        return self.submit_check(password, hashed_password).result()
+
+    async def hash_async(self, password) -> str:
+        """
+        Hashes a password at the hasher's cost without blocking the event loop.
+        """
+        return await asyncio.wrap_future(self.submit_hash(password))
+
+    async def check_async(self, password, hashed_password) -> bool:
+        """
+        Checks a password against a bcrypt hash without blocking the event loop.
+        """
+        return await asyncio.wrap_future(self.submit_check(password, hashed_password))
+
+    def needs_rehash(self, hashed_password) -> bool:
+        """
+        Whether a hash was made at a lower cost than the hasher's, and should be replaced on the next successful login.
+        """
+        return hash_cost(hashed_password) < self.cost
+
+    def stats(self) -> dict:
+        """
+        Gets the hasher's counters.
+
+        Returns:
+            dict:
+                Hashes and checks started, calls rejected for a full queue, and the calls currently pending.
+        """
+        with self.__lock:
+            return dict(self.__counters, pending=self.__pending)
+
+    def shutdown(self, wait=True):
+        """
+        Stops the pool, by default after the pending calls finish.
+        """
+        self.__executor.shutdown(wait=wait)
+
+
+@lazy_singleton
+def get_password_hasher():
+    """
+    Gets the application's password hasher, configured by `PASSWORD_HASHING`.
+
+    If no cost is configured it is calibrated now, which takes up to a few times `target_latency`; call this at
+    start-up rather than in the middle of the first login.
+
+    Returns:
+        PasswordHasher:
+            The password hasher.
+    """
+    from inspyred_memo_server.config import PASSWORD_HASHING
+
+    cost = PASSWORD_HASHING['cost']
+    if cost is None:
+        cost = calibrate_cost(PASSWORD_HASHING['target_latency'], PASSWORD_HASHING['min_cost'],
+                              PASSWORD_HASHING['max_cost'])
+
+    return PasswordHasher(cost, PASSWORD_HASHING['max_workers'], PASSWORD_HASHING['max_queue'])
@@ -0,0 +1,618 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    inspyred_memo_server/database/user/repository.py
+
+
+Description:
+    Looks users up by username or id through a bounded LRU/TTL cache, so repeated logins by active users skip both
+    the database and the Fernet decryption that reading `User.hashed_password` performs.
+
+    The cache holds `UserRecord` snapshots rather than ORM instances, which belong to the session that loaded them,
+    are not safe to share between threads, and expire when that session commits. A snapshot is immutable and carries
+    the password hash already decrypted. Any update or delete of a `User` through the ORM evicts that user from every
+    live cache, both as the change is flushed and again once it commits. A lookup that read the row before the change
+    committed could still try to cache the old row after both evictions, so each lookup notes the cache's generation
+    before it reads, and `UserCache.put` discards the record if the user has been invalidated since.
+
+    bcrypt runs on the repository's `PasswordHasher` rather than the calling thread. When a login succeeds against a
+    hash made at a lower cost than the hasher's, the password is rehashed at the current cost on the hasher's pool and
+    stored by the caller (in the background, for the async repository) only if the user's hash has not changed in
+    the meantime.
+
+"""
+import asyncio
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, object_session
+from inspyred_memo_server.database.crypt import get_encryption_manager
+from inspyred_memo_server.database.user import User, check_password
+from inspyred_memo_server.database.user.auth import get_password_hasher
+from inspyred_memo_server.errors.auth import AuthBusyError
+
+
+__all__ = [
+    'AsyncUserRepository',
+    'UserCache',
+    'UserRecord',
+    'UserRepository',
+]
+
+
+_ID = User._User__id
+_USERNAME = User._User__username
+_HASHED_PASSWORD = User._User__hashed_pass
+
+_CACHES = weakref.WeakSet()
+_PENDING_KEY = 'inspyred_memo_server.invalidated_users'
+
+
+class UserRecord:
+    """
+    An immutable snapshot of a user, safe to share between threads.
+
+    Attributes:
+        id (int):
+            The user ID.
+
+        username (str):
+            The username.
+
+        hashed_password (str):
+            The bcrypt hash of the user's password (decrypted).
+    """
+    __slots__ = ('id', 'username', 'hashed_password')
+
+    def __init__(self, id, username, hashed_password):
+        self.id = id
+        self.username = username
+        self.hashed_password = hashed_password
+
+    @classmethod
+    def from_user(cls, user):
+        """
+        Takes a snapshot of a loaded `User`.
+        """
+        return cls(user.id, user.username, user.hashed_password)
+
+    def check_password(self, password: str) -> bool:
+        """
+        Checks a password against the stored hash, on the calling thread.
+        """
+        return check_password(password, self.hashed_password)
+
+    def __repr__(self):
+        return f'UserRecord(id={self.id}, username={self.username!r})'
+
+
+class UserCache:
+    """
+    A bounded, thread-safe cache of `UserRecord`s, reachable by id or by username.
+
+    Entries expire `ttl` seconds after they were stored, and the least recently used entry is evicted once more than
+    `max_size` users are held.
+
+    Every invalidation advances the cache's generation and records it against the user's id and username. A lookup
+    that misses takes `generation()` before reading the database and passes it to `put`, which drops the record if the
+    user was invalidated after that, since the row it read may already have been replaced. Only the latest
+    invalidations are remembered; a record older than all of them is dropped too, to be safe.
+
+    Attributes:
+        max_size (int):
+            The most users held at once.
+
+        ttl (float):
+            Seconds an entry stays valid.
+    """
+
+    def __init__(self, max_size=1024, ttl=300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self.__lock = threading.Lock()
+        self.__entries = OrderedDict()  # id -> (record, expires at), least recently used first.
+        self.__ids = {}  # username -> id
+        self.__counters = dict.fromkeys(('hits', 'misses', 'evictions', 'expirations', 'invalidations'), 0)
+        self.__generation = 0
+        self.__invalidated = OrderedDict()  # ('id', id) or ('username', name) -> generation, oldest first.
+        self.__oldest_remembered = 0
+
+        _CACHES.add(self)
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def _drop(self, user_id):
+        record, _ = self.__entries.pop(user_id)
+        self.__ids.pop(record.username, None)
+
+    def get(self, user_id=None, username=None):
+        """
+        Looks a user up by id or username.
+
+        Returns:
+            UserRecord | None:
+                The cached user, or None if it is not cached or has expired.
+        """
+        with self.__lock:
+            if user_id is None:
+                user_id = self.__ids.get(username)
+
+            entry = self.__entries.get(user_id)
+            if entry is None:
+                self.__counters['misses'] += 1
+                return None
+
+            record, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._drop(user_id)
+                self.__counters['expirations'] += 1
+                self.__counters['misses'] += 1
+                return None
+
+            self.__entries.move_to_end(user_id)
+            self.__counters['hits'] += 1
+            return record
+
+    def generation(self) -> int:
+        """
+        Gets the cache's current generation, to pass to `put` with a record read after this call.
+        """
+        with self.__lock:
+            return self.__generation
+
+    def _stale(self, record, generation):
+        if generation < self.__oldest_remembered:
+            return True
+
+        keys = (('id', record.id), ('username', record.username))
+        return any(self.__invalidated.get(key, -1) > generation for key in keys)
+
+    def put(self, record, generation=None):
+        """
+        Stores a user, evicting the least recently used users if the cache is full.
+
+        Parameters:
+            record (UserRecord):
+                The user.
+
+            generation (int, optional):
+                The `generation()` taken before the record was read. If the user has been invalidated since, the
+                record is not stored.
+        """
+        with self.__lock:
+            if generation is not None and self._stale(record, generation):
+                return
+
+            if record.id in self.__entries:
+                self._drop(record.id)
+
+            self.__entries[record.id] = (record, time.monotonic() + self.ttl)
+            self.__ids[record.username] = record.id
+
+            while len(self.__entries) > self.max_size:
+                self._drop(next(iter(self.__entries)))
+                self.__counters['evictions'] += 1
+
+    def invalidate(self, user_id=None, username=None):
+        """
+        Removes a user from the cache, by id, username or both.
+        """
+        with self.__lock:
+            self.__generation += 1
+            for key in (('id', user_id), ('username', username)):
+                if key[1] is not None:
+                    self.__invalidated[key] = self.__generation
+                    self.__invalidated.move_to_end(key)
+
+            while len(self.__invalidated) > 4 * self.max_size:
+                _, forgotten = self.__invalidated.popitem(last=False)
+                self.__oldest_remembered = max(self.__oldest_remembered, forgotten)
+
+            for key in {user_id, self.__ids.get(username)} - {None}:
+                if key in self.__entries:
+                    self._drop(key)
+                    self.__counters['invalidations'] += 1
+
+    def clear(self):
+        """
+        Removes every user from the cache.
+        """
+        with self.__lock:
+            self.__entries.clear()
+            self.__ids.clear()
+            self.__generation += 1
+            self.__invalidated.clear()
+            self.__oldest_remembered = self.__generation
+
+    def stats(self) -> dict:
+        """
+        Gets the cache's counters.
+
+        Returns:
+            dict:
+                Hits, misses, evictions (for space), expirations, invalidations and the current size.
+        """
+        with self.__lock:
+            return dict(self.__counters, size=len(self.__entries))
+
+
+def _invalidate_everywhere(keys):
+    for cache in list(_CACHES):
+        for user_id, username in keys:
+            cache.invalidate(user_id, username)
+
+
+@event.listens_for(User, 'before_update')
+@event.listens_for(User, 'before_delete')
+def invalidate_cached_user(mapper, connection, target):
+    """
+    Evicts a user that is being changed or deleted from every cache, under both its old and new usernames.
+    """
+    history = inspect(target).attrs[_USERNAME.key].history
+    keys = {(target.id, username) for username in (*history.deleted, target.username)}
+    _invalidate_everywhere(keys)
+
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING_KEY, set()).update(keys)
+
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_committed_users(session):
+    """
+    Evicts the changed users again once their changes are visible to other connections.
+    """
+    _invalidate_everywhere(session.info.pop(_PENDING_KEY, ()))
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_rolled_back_users(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+class UserRepository:
+    """
+    Finds, creates and authenticates users, caching lookups.
+
+    `username` is unique, so lookups by name use the unique index SQLite keeps for it.
+    """
+
+    def __init__(self, sessions=None, max_size=1024, ttl=300.0, hasher=None):
+        """
+        Initializes the repository.
+
+        Parameters:
+            sessions (SessionManager, optional):
+                Where sessions come from. Defaults to the application database's session manager.
+
+            max_size (int):
+                The most users cached at once.
+
+            ttl (float):
+                Seconds a cached user stays valid.
+
+            hasher (PasswordHasher, optional):
+                Hashes and checks passwords. Defaults to the application's password hasher.
+        """
+        self.__sessions = sessions
+        self.__hasher = hasher
+        self.cache = UserCache(max_size=max_size, ttl=ttl)
+
+    @property
+    def sessions(self):
+        """
+        The session manager the repository reads and writes through.
+        """
+        if self.__sessions is None:
+            from inspyred_memo_server.database import get_sessions
+            self.__sessions = get_sessions()
+
+        return self.__sessions
+
+    @property
+    def hasher(self):
+        """
+        The password hasher bcrypt runs on.
+        """
+        if self.__hasher is None:
+            self.__hasher = get_password_hasher()
+
+        return self.__hasher
+
+    def _load(self, criterion):
+        with self.sessions.unit_of_work() as session:
+            user = session.scalars(select(User).where(criterion)).first()
+            return UserRecord.from_user(user) if user is not None else None
+
+    def get(self, user_id):
+        """
+        Finds a user by id.
+
+        Returns:
+            UserRecord | None:
+                The user, or None if there is no such user.
+        """
+        record = self.cache.get(user_id=user_id)
+        if record is None:
+            generation = self.cache.generation()
+            record = self._load(_ID == user_id)
+            if record is not None:
+                self.cache.put(record, generation)
+
+        return record
+
+    def get_by_username(self, username):
+        """
+        Finds a user by username.
+
+        Returns:
+            UserRecord | None:
+                The user, or None if there is no such user.
+        """
+        record = self.cache.get(username=username)
+        if record is None:
+            generation = self.cache.generation()
+            record = self._load(_USERNAME == username)
+            if record is not None:
+                self.cache.put(record, generation)
+
+        return record
+
+    def authenticate(self, username, password):
+        """
+        Checks a username and password, upgrading the user's hash in the background if it was made at a lower cost
+        than the hasher's.
+
+        Returns:
+            UserRecord | None:
+                The user, if the password is correct; otherwise None.
+
+        Raises:
+            AuthBusyError:
+                If the hasher's queue is full.
+        """
+        record = self.get_by_username(username)
+        if record is None or not self.hasher.check(password, record.hashed_password):
+            return None
+
+        if self.hasher.needs_rehash(record.hashed_password):
+            # The new hash comes from the hasher's pool, but is stored from this thread, so a bcrypt worker is never
+            # held up by database I/O. This login waits for one more hash; later ones find the upgraded hash.
+            try:
+                hashed_password = self.hasher.hash(password)
+            except AuthBusyError:
+                pass  # The hash is upgraded on a later login instead.
+            else:
+                self.set_hashed_password(username, hashed_password, record.hashed_password)
+
+        return record
+
+    def add(self, username, password):
+        """
+        Creates a user.
+
+        Returns:
+            UserRecord:
+                The new user.
+
+        Raises:
+            AuthBusyError:
+                If the hasher's queue is full.
+        """
+        hashed_password = self.hasher.hash(password)
+        user = User(username=username)
+        user.hashed_password = hashed_password
+        generation = self.cache.generation()
+
+        with self.sessions.unit_of_work() as session:
+            session.add(user)
+            session.flush()
+            record = UserRecord(user.id, username, hashed_password)
+
+        self.cache.put(record, generation)
+        return record
+
+    def set_password(self, username, password):
+        """
+        Changes a user's password.
+
+        Returns:
+            bool:
+                Whether the user exists.
+
+        Raises:
+            AuthBusyError:
+                If the hasher's queue is full.
+        """
+        return self.set_hashed_password(username, self.hasher.hash(password))
+
+    def set_hashed_password(self, username, hashed_password, expected=None):
+        """
+        Stores a bcrypt hash as a user's password.
+
+        Parameters:
+            username (str):
+                The user.
+
+            hashed_password (str):
+                The new hash.
+
+            expected (str, optional):
+                If given, the hash is only replaced if it is still this one.
+
+        Returns:
+            bool:
+                Whether the hash was stored.
+        """
+        with self.sessions.unit_of_work() as session:
+            user = session.scalars(select(User).where(_USERNAME == username)).first()
+            if user is None or (expected is not None and user.hashed_password != expected):
+                return False
+
+            user.hashed_password = hashed_password
+
+        return True
+
+    def stats(self) -> dict:
+        """
+        Gets the cache's hit, miss, eviction, expiration and invalidation counters.
+        """
+        return self.cache.stats()
+
+
+class AsyncUserRepository:
+    """
+    The asyncio counterpart of `UserRepository`, sharing its cache design.
+
+    Lookups that miss the cache read the user's columns through the async engine and decrypt the password hash on the
+    crypto executor; bcrypt runs on the password hasher's own executor. Creating a user or changing a password goes
+    through an async ORM session, so the cache-invalidation hooks still apply; assigning `User.hashed_password`
+    encrypts it on the loop, but one Fernet call on a short hash is negligible next to bcrypt.
+    """
+
+    def __init__(self, sessions=None, max_size=1024, ttl=300.0, hasher=None):
+        """
+        Initializes the repository.
+
+        Parameters:
+            sessions (AsyncSessionManager, optional):
+                Where sessions come from. Defaults to the application database's async session manager.
+
+            max_size (int):
+                The most users cached at once.
+
+            ttl (float):
+                Seconds a cached user stays valid.
+
+            hasher (PasswordHasher, optional):
+                Hashes and checks passwords. Defaults to the application's password hasher.
+        """
+        self.__sessions = sessions
+        self.__hasher = hasher
+        self.__upgrades = set()
+        self.cache = UserCache(max_size=max_size, ttl=ttl)
+
+    @property
+    def sessions(self):
+        """
+        The async session manager the repository reads and writes through.
+        """
+        if self.__sessions is None:
+            from inspyred_memo_server.database.aio import get_async_sessions
+            self.__sessions = get_async_sessions()
+
+        return self.__sessions
+
+    @property
+    def hasher(self):
+        """
+        The password hasher bcrypt runs on.
+        """
+        if self.__hasher is None:
+            self.__hasher = get_password_hasher()
+
+        return self.__hasher
+
+    async def _load(self, criterion):
+        from inspyred_memo_server.database.aio import run_cpu
+
+        generation = self.cache.generation()
+        async with self.sessions.unit_of_work() as session:
+            row = (await session.execute(select(_ID, _USERNAME, _HASHED_PASSWORD).where(criterion))).first()
+
+        if row is None:
+            return None
+
+        user_id, username, encrypted = row
+        record = UserRecord(user_id, username, await run_cpu(get_encryption_manager().decrypt, encrypted))
+        self.cache.put(record, generation)
+        return record
+
+    async def get(self, user_id):
+        """
+        Finds a user by id. See `UserRepository.get`.
+        """
+        return self.cache.get(user_id=user_id) or await self._load(_ID == user_id)
+
+    async def get_by_username(self, username):
+        """
+        Finds a user by username. See `UserRepository.get_by_username`.
+        """
+        return self.cache.get(username=username) or await self._load(_USERNAME == username)
+
+    async def authenticate(self, username, password):
+        """
+        Checks a username and password, with bcrypt running off the event loop. See `UserRepository.authenticate`.
+        """
+        record = await self.get_by_username(username)
+        if record is None or not await self.hasher.check_async(password, record.hashed_password):
+            return None
+
+        if self.hasher.needs_rehash(record.hashed_password):
+            try:
+                future = self.hasher.submit_hash(password)
+            except AuthBusyError:
+                pass  # The hash is upgraded on a later login instead.
+            else:
+                # Stored from the event loop once the hash is ready, without holding up this login.
+                task = asyncio.create_task(self._store_rehash(username, future, record.hashed_password))
+                self.__upgrades.add(task)
+                task.add_done_callback(self.__upgrades.discard)
+
+        return record
+
+    async def _store_rehash(self, username, future, expected):
+        await self.set_hashed_password(username, await asyncio.wrap_future(future), expected)
+
+    async def add(self, username, password):
+        """
+        Creates a user. See `UserRepository.add`.
+        """
+        hashed_password = await self.hasher.hash_async(password)
+        user = User(username=username)
+        user.hashed_password = hashed_password
+        generation = self.cache.generation()
+
+        async with self.sessions.unit_of_work() as session:
+            session.add(user)
+            await session.flush()
+            record = UserRecord(user.id, username, hashed_password)
+
+        self.cache.put(record, generation)
+        return record
+
+    async def set_password(self, username, password):
+        """
+        Changes a user's password. See `UserRepository.set_password`.
+        """
+        return await self.set_hashed_password(username, await self.hasher.hash_async(password))
+
+    async def set_hashed_password(self, username, hashed_password, expected=None):
+        """
+        Stores a bcrypt hash as a user's password. See `UserRepository.set_hashed_password`.
+        """
+        async with self.sessions.unit_of_work() as session:
+            user = (await session.scalars(select(User).where(_USERNAME == username))).first()
+            if user is None or (expected is not None and user.hashed_password != expected):
+                return False
+
+            user.hashed_password = hashed_password
+
+        return True
+
+    def stats(self) -> dict:
+        """
+        Gets the cache's hit, miss, eviction, expiration and invalidation counters.
+        """
+        return self.cache.stats()
@@ -0,0 +1,234 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    inspyred_memo_server/database/writer.py
+
+
+Description:
+    A single background writer that drains a queue of memos into the database in batched, executemany-style inserts.
+
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from sqlalchemy import insert
+from inspyred_memo_server.database.memo import Memo
+from inspyred_memo_server.database.search import index_memos
+
+
+__all__ = [
+    'MemoWriter',
+    'memo_rows',
+]
+
+
+_STOP = object()
+
+
+def memo_rows(memos, author=None, encode=None) -> list:
+    """
+    Builds the `memos` table rows for a group of memos received together.
+
+    Parameters:
+        memos (list[str]):
+            The memo texts.
+
+        author (str, optional):
+            The username to record as the memos' author.
+
+        encode (callable, optional):
+            Turns each memo's text into the (body, codec) to store, e.g. `BodyCodec.encode`. Defaults to storing the
+            text as given.
+
+    Returns:
+        list[dict]:
+            One row per memo, in the order given.
+    """
+    now = time.time()
+    rows = []
+    for memo in memos:
+        body, codec = encode(memo) if encode else (memo, None)
+        rows.append({
+            'author': author,
+            'created_at': now,
+            'size': len(memo.encode('utf-8')),
+            'body': body,
+            'codec': codec,
+        })
+
+    return rows
+
+
+class MemoWriter:
+    """
+    Batches memos from many producer threads into few, large insert transactions.
+
+    Producers call `submit`, which queues the memos and returns a future. A single writer thread gathers queued
+    submissions until `batch_size` rows are waiting or `flush_interval` seconds have passed since the first of them,
+    then inserts them all with one executemany statement in one transaction and resolves each future with the ids
+    of its rows. Each submission is therefore stored all-or-nothing, and the bounded queue pushes back on producers
+    when the disk cannot keep up.
+
+    Attributes:
+        engine (sqlalchemy.engine.Engine):
+            The engine to write to.
+
+        batch_size (int):
+            The number of rows that triggers a flush straight away.
+
+        flush_interval (float):
+            The longest, in seconds, a row waits before being flushed.
+    """
+
+    def __init__(self, engine, batch_size=500, flush_interval=0.05, max_queue=10000, encode=None, index=False):
+        """
+        Initializes the writer and starts its thread.
+
+        Parameters:
+            engine (sqlalchemy.engine.Engine):
+                The engine to write to.
+
+            batch_size (int):
+                The number of rows that triggers a flush straight away.
+
+            flush_interval (float):
+                The longest, in seconds, a row waits before being flushed.
+
+            max_queue (int):
+                The most submissions that may wait for the writer before `submit` blocks.
+
+            encode (callable, optional):
+                Turns each memo's text into the (body, codec) to store. Defaults to storing the text as given.
+
+            index (bool):
+                Whether to add the memos to the full-text index, in the same transaction as the insert.
+        """
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.__encode = encode
+        self.__index = index
+        self.__queue = queue.Queue(maxsize=max_queue)
+        self.__rows_written = 0
+        self.__batches_written = 0
+        self.__thread = threading.Thread(target=self._run, name='memo-db-writer', daemon=True)
+        self.__thread.start()
+
+    @property
+    def rows_written(self) -> int:
+        """
+        The number of rows inserted so far.
+        """
+        return self.__rows_written
+
+    @property
+    def batches_written(self) -> int:
+        """
+        The number of insert transactions committed so far.
+        """
+        return self.__batches_written
+
+    def submit(self, memos, author=None) -> Future:
+        """
+        Queues memos to be inserted together.
+
+        Parameters:
+            memos (list[str]):
+                The memos to insert.
+
+            author (str, optional):
+                The username to record as the memos' author.
+
+        Returns:
+            Future:
+                Resolves to the list of ids of the inserted memos, in the order given.
+        """
+        memos = list(memos)
+        rows = memo_rows(memos, author, self.__encode)
+
+        future = Future()
+        self.__queue.put((rows, memos if self.__index else None, future))
+        return future
+
+    def _gather(self, first):
+        """
+        Collects submissions, starting with `first`, until the batch is full or the flush interval runs out.
+
+        Returns:
+            tuple:
+                The gathered submissions, and whether the writer was asked to stop while gathering.
+        """
+        batch = [first]
+        count = len(first[0])
+        deadline = time.monotonic() + self.flush_interval
+
+        while count < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.__queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+            count += len(item[0])
+
+        return batch, False
+
+    def _flush(self, batch):
+        """
+        Inserts every gathered row in one transaction and resolves the submissions' futures.
+        """
+        rows = [row for submission_rows, _, _ in batch for row in submission_rows]
+        statement = insert(Memo).returning(Memo.id, sort_by_parameter_order=True)
+
+        try:
+            with self.engine.begin() as connection:
+                ids = connection.execute(statement, rows).scalars().all()
+                if self.__index:
+                    plaintexts = [memo for _, submission_memos, _ in batch for memo in submission_memos]
+                    index_memos(connection, [
+                        {'id': memo_id, 'body': body, 'author': row['author']}
+                        for memo_id, body, row in zip(ids, plaintexts, rows)
+                    ])
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.__rows_written += len(rows)
+        self.__batches_written += 1
+
+        offset = 0
+        for submission_rows, _, future in batch:
+            future.set_result(ids[offset:offset + len(submission_rows)])
+            offset += len(submission_rows)
+
+    def _run(self):
+        while True:
+            item = self.__queue.get()
+            if item is _STOP:
+                return
+
+            batch, stopping = self._gather(item)
+            self._flush(batch)
+            if stopping:
+                return
+
+    def close(self):
+        """
+        Flushes everything already submitted and stops the writer thread.
+        """
+        self.__queue.put(_STOP)
+        self.__thread.join()
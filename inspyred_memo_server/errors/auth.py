@@ -0,0 +1,54 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    inspyred_memo_server/errors/auth.py
+
+
+Description:
+
+
+"""
+from inspyred_memo_server.errors import InspyredMemoServerError
+
+
+__all__ = [
+    'AuthError',
+    'AuthBusyError',
+]
+
+
+class AuthError(InspyredMemoServerError):
+    """
+    Base class for authentication errors.
+    """
+    __base_message = 'Auth Error: The credentials could not be processed!'
+
+    def __init__(self, message=None):
+        """
+        Initialize the AuthError class.
+
+        Parameters:
+            message (str):
+                The message to display when the error is raised.
+        """
+        if message is None:
+            message = self.__base_message
+
+        super(AuthError, self).__init__(message)
+
+
+class AuthBusyError(AuthError):
+    """
+    Error raised when the password hasher's queue is full, so the request should be refused rather than queued.
+    """
+    __base_message = 'Auth Busy: Too many password hashes are already waiting, try again later!'
+
+    def __init__(self, message=__base_message):
+        super(AuthBusyError, self).__init__(message)
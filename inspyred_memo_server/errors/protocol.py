@@ -0,0 +1,76 @@
+"""
+
+
+Author: 
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File: 
+    inspyred_memo_server/errors/protocol.py
+ 
+
+Description:
+    
+
+"""
+from inspyred_memo_server.errors import InspyredMemoServerError
+
+
+__all__ = [
+    'ProtocolError',
+    'FrameTooLargeError',
+    'IncompleteFrameError',
+    'UnsupportedVersionError',
+]
+
+
+class ProtocolError(InspyredMemoServerError):
+    """
+    Base class for wire protocol errors.
+    """
+    __base_message = 'Protocol Error: A malformed frame was received!'
+
+    def __init__(self, message=None):
+        """
+        Initialize the ProtocolError class.
+
+        Parameters:
+            message (str):
+                The message to display when the error is raised.
+        """
+        if message is None:
+            message = self.__base_message
+
+        super(ProtocolError, self).__init__(message)
+
+
+class FrameTooLargeError(ProtocolError):
+    """
+    Error raised when a frame announces a payload larger than the protocol allows.
+    """
+    __base_message = 'Frame Too Large: The frame payload exceeds the maximum allowed size!'
+
+    def __init__(self, message=__base_message):
+        super(FrameTooLargeError, self).__init__(message)
+
+
+class IncompleteFrameError(ProtocolError):
+    """
+    Error raised when the peer closes the connection part-way through a frame.
+    """
+    __base_message = 'Incomplete Frame: The connection was closed in the middle of a frame!'
+
+    def __init__(self, message=__base_message):
+        super(IncompleteFrameError, self).__init__(message)
+
+
+class UnsupportedVersionError(ProtocolError):
+    """
+    Error raised when a frame carries a bad magic number or a protocol version this build does not speak.
+    """
+    __base_message = 'Unsupported Version: The frame uses an unknown protocol version!'
+
+    def __init__(self, message=__base_message):
+        super(UnsupportedVersionError, self).__init__(message)
@@ -0,0 +1,349 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    inspyred_memo_server/protocol/__init__.py
+
+
+Description:
+    The length-prefixed frame format spoken between memo clients and the memo server.
+
+    Every frame starts with a fixed 12-byte, network byte order header:
+
+        +-------+---------+----------+------------+----------------+
+        | magic | version | msg type | request id | payload length |
+        | 2s    | B       | B        | I          | I              |
+        +-------+---------+----------+------------+----------------+
+
+    followed by `payload length` bytes of payload. Replies carry the request id of the frame they answer, so a
+    client may write several frames before reading any replies (pipelining); the server answers them in order.
+
+"""
+import asyncio
+import json
+import struct
+from collections import namedtuple
+from inspyred_memo_server.errors.protocol import (
+    FrameTooLargeError,
+    IncompleteFrameError,
+    UnsupportedVersionError,
+)
+
+
+__all__ = [
+    'Frame',
+    'FrameReader',
+    'HEADER',
+    'MAGIC',
+    'MAX_PAYLOAD',
+    'MSG_ACK',
+    'MSG_BATCH',
+    'MSG_BUSY',
+    'MSG_ERROR',
+    'MSG_LIST',
+    'MSG_MEMO',
+    'MSG_PAGE',
+    'MSG_RESULTS',
+    'MSG_SEARCH',
+    'VERSION',
+    'decode_header',
+    'encode_frame',
+    'encode_json_frame',
+    'read_frame_async',
+]
+
+
+MAGIC = b'IM'
+"""The two bytes every frame starts with."""
+
+VERSION = 1
+"""The protocol version written into, and expected from, every frame."""
+
+HEADER = struct.Struct('!2sBBII')
+"""The frame header layout: magic, version, message type, request id, payload length."""
+
+MAX_PAYLOAD = 16 * 1024 * 1024
+"""The largest payload, in bytes, a single frame may carry."""
+
+MSG_MEMO = 1
+"""A single memo; the payload is the UTF-8 encoded memo text."""
+
+MSG_ACK = 2
+"""A reply acknowledging the request with the same request id; the payload is JSON: `{"ids": [...]}`."""
+
+MSG_ERROR = 3
+"""A reply reporting that the request with the same request id failed; the payload is a UTF-8 message."""
+
+MSG_BATCH = 4
+"""Several memos stored as one unit; the payload is a JSON array of strings. Answered by a single `MSG_ACK`."""
+
+MSG_BUSY = 5
+"""Sent by the server, with request id 0, before it closes a connection it has no capacity to serve. No request on
+that connection was processed, so it is safe to retry."""
+
+MSG_LIST = 6
+"""A request to stream stored memos; the payload is JSON: `{"after": [created_at, id] | null, "page_size": int,
+"limit": int | null}`. Answered by one or more `MSG_PAGE` frames."""
+
+MSG_PAGE = 7
+"""One page of a `MSG_LIST` reply; the payload is JSON:
+`{"memos": [{"id", "created_at", "author", "size", "body"}, ...], "next": [created_at, id] | null, "last": bool}`.
+`next` is the cursor to resume from, null once the listing is exhausted; `last` marks the final page sent for the
+request."""
+
+MSG_SEARCH = 8
+"""A full-text search; the payload is JSON: `{"query": str, "phrase": bool, "prefix": bool, "author": str | null,
+"limit": int, "after": [rank, id] | null}`. Answered by one `MSG_RESULTS` frame."""
+
+MSG_RESULTS = 9
+"""The reply to `MSG_SEARCH`; the payload is JSON: `{"memos": [{..., "rank"}, ...], "next": [rank, id] | null}`,
+best match first. `next` is the cursor for the following page, null when there are no more results."""
+
+
+class Frame(namedtuple('Frame', ('msg_type', 'request_id', 'payload'))):
+    """
+    A single decoded frame.
+
+    Attributes:
+        msg_type (int):
+            The message type (one of the `MSG_*` constants).
+
+        request_id (int):
+            The id of the request this frame is, or answers.
+
+        payload (memoryview | bytes):
+            The frame payload. Frames returned by `FrameReader` hold a view into the reader's buffer, which is only
+            valid until the next frame is read.
+    """
+    __slots__ = ()
+
+    def text(self) -> str:
+        """
+        Decodes the payload as UTF-8 text.
+
+        Returns:
+            str:
+                The decoded payload.
+        """
+        return str(self.payload, 'utf-8')
+
+    def json(self):
+        """
+        Decodes the payload as UTF-8 encoded JSON.
+
+        Returns:
+            object:
+                The decoded payload.
+        """
+        return json.loads(self.text())
+
+
+def encode_frame(msg_type: int, request_id: int, payload: bytes = b'') -> bytes:
+    """
+    Encodes a frame ready to be written to the wire.
+
+    Parameters:
+        msg_type (int):
+            The message type (one of the `MSG_*` constants).
+
+        request_id (int):
+            The request id.
+
+        payload (bytes):
+            The frame payload.
+
+    Returns:
+        bytes:
+            The header followed by the payload.
+
+    Raises:
+        FrameTooLargeError:
+            If the payload is larger than `MAX_PAYLOAD`.
+    """
+    if len(payload) > MAX_PAYLOAD:
+        raise FrameTooLargeError(f'Payload of {len(payload)} bytes exceeds the {MAX_PAYLOAD} byte limit.')
+
+    return HEADER.pack(MAGIC, VERSION, msg_type, request_id, len(payload)) + payload
+
+
+def encode_json_frame(msg_type: int, request_id: int, obj) -> bytes:
+    """
+    Encodes a frame whose payload is `obj` serialised as compact UTF-8 JSON.
+
+    Parameters:
+        msg_type (int):
+            The message type (one of the `MSG_*` constants).
+
+        request_id (int):
+            The request id.
+
+        obj (object):
+            The JSON-serialisable payload.
+
+    Returns:
+        bytes:
+            The encoded frame.
+    """
+    payload = json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return encode_frame(msg_type, request_id, payload)
+
+
+def decode_header(header) -> tuple:
+    """
+    Decodes and validates a frame header.
+
+    Parameters:
+        header (bytes | memoryview):
+            Exactly `HEADER.size` bytes.
+
+    Returns:
+        tuple:
+            The message type, request id and payload length.
+
+    Raises:
+        UnsupportedVersionError:
+            If the magic number or the version is not recognised.
+
+        FrameTooLargeError:
+            If the announced payload is larger than `MAX_PAYLOAD`.
+    """
+    magic, version, msg_type, request_id, length = HEADER.unpack(header)
+
+    if magic != MAGIC or version != VERSION:
+        raise UnsupportedVersionError(f'Got magic {magic!r}, version {version}; expected {MAGIC!r}, version {VERSION}.')
+
+    if length > MAX_PAYLOAD:
+        raise FrameTooLargeError(f'Peer announced a payload of {length} bytes.')
+
+    return msg_type, request_id, length
+
+
+class FrameReader:
+    """
+    Reads frames from a blocking socket into a single reusable buffer.
+
+    The buffer is allocated once and only ever grows (to fit the largest frame seen so far), so reading a stream of
+    memos does not allocate and copy a new chunk for every `recv`.
+    """
+
+    def __init__(self, sock, buffer_size: int = 64 * 1024):
+        """
+        Initializes the frame reader.
+
+        Parameters:
+            sock (socket.socket):
+                The connected socket to read from.
+
+            buffer_size (int):
+                The initial size of the receive buffer, in bytes.
+        """
+        self.__sock = sock
+        self.__buffer = bytearray(max(buffer_size, HEADER.size))
+        self.__view = memoryview(self.__buffer)
+
+    @property
+    def buffer_size(self) -> int:
+        """
+        Gets the current size of the receive buffer.
+
+        Returns:
+            int:
+                The buffer size in bytes.
+        """
+        return len(self.__buffer)
+
+    def _grow(self, size: int):
+        """
+        Grows the receive buffer so that it can hold at least `size` bytes.
+        """
+        new_size = len(self.__buffer)
+        while new_size < size:
+            new_size *= 2
+
+        self.__buffer = bytearray(new_size)
+        self.__view = memoryview(self.__buffer)
+
+    def _recv_exactly(self, size: int) -> int:
+        """
+        Fills the first `size` bytes of the buffer from the socket.
+
+        Returns:
+            int:
+                The number of bytes read; less than `size` only if the peer closed the connection.
+        """
+        received = 0
+        while received < size:
+            count = self.__sock.recv_into(self.__view[received:size])
+            if not count:
+                break
+            received += count
+
+        return received
+
+    def read_frame(self):
+        """
+        Reads the next frame.
+
+        Returns:
+            Frame | None:
+                The frame, whose payload is a view into the reader's buffer, or None if the peer closed the
+                connection between frames.
+
+        Raises:
+            IncompleteFrameError:
+                If the peer closed the connection part-way through a frame.
+        """
+        received = self._recv_exactly(HEADER.size)
+        if not received:
+            return None
+        if received < HEADER.size:
+            raise IncompleteFrameError()
+
+        msg_type, request_id, length = decode_header(self.__view[:HEADER.size])
+
+        if length > len(self.__buffer):
+            self._grow(length)
+
+        if self._recv_exactly(length) < length:
+            raise IncompleteFrameError()
+
+        return Frame(msg_type, request_id, self.__view[:length])
+
+
+async def read_frame_async(reader):
+    """
+    Reads the next frame from an asyncio stream.
+
+    Parameters:
+        reader (asyncio.StreamReader):
+            The stream to read from.
+
+    Returns:
+        Frame | None:
+            The frame, or None if the peer closed the connection between frames.
+
+    Raises:
+        IncompleteFrameError:
+            If the peer closed the connection part-way through a frame.
+    """
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise IncompleteFrameError() from e
+
+    msg_type, request_id, length = decode_header(header)
+
+    try:
+        payload = await reader.readexactly(length)
+    except asyncio.IncompleteReadError as e:
+        raise IncompleteFrameError() from e
+
+    return Frame(msg_type, request_id, payload)
@@ -0,0 +1,93 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    inspyred_memo_server/stats.py
+
+
+Description:
+    Thread-safe connection counters kept by the memo server.
+
+"""
+import threading
+
+
+__all__ = [
+    'ConnectionStats',
+]
+
+
+class ConnectionStats:
+    """
+    Counts connections as they move through the server.
+
+    Attributes:
+        accepted (int):
+            Connections accepted from the listening socket.
+
+        queued (int):
+            Connections waiting for a worker.
+
+        active (int):
+            Connections currently being served.
+
+        rejected (int):
+            Connections turned away because the server was at capacity.
+
+        completed (int):
+            Connections that have been served and closed.
+    """
+    FIELDS = ('accepted', 'queued', 'active', 'rejected', 'completed')
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__counts = dict.fromkeys(self.FIELDS, 0)
+
+    def increment(self, field: str, amount: int = 1):
+        """
+        Adds `amount` to a counter.
+
+        Parameters:
+            field (str):
+                The counter to change (one of `FIELDS`).
+
+            amount (int):
+                The amount to add; may be negative.
+        """
+        with self.__lock:
+            self.__counts[field] += amount
+
+    def move(self, source: str, destination: str):
+        """
+        Moves one connection from one counter to another in a single step, so a snapshot never sees it in both.
+        """
+        with self.__lock:
+            self.__counts[source] -= 1
+            self.__counts[destination] += 1
+
+    def as_dict(self) -> dict:
+        """
+        Takes a consistent snapshot of every counter.
+
+        Returns:
+            dict:
+                The counters, keyed by name.
+        """
+        with self.__lock:
+            return dict(self.__counts)
+
+    def __getattr__(self, name):
+        if name in self.FIELDS:
+            return self.as_dict()[name]
+
+        raise AttributeError(name)
+
+    def __repr__(self):
+        counts = ', '.join(f'{name}={value}' for name, value in self.as_dict().items())
+        return f'ConnectionStats({counts})'
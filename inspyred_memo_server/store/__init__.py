@@ -0,0 +1,181 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    inspyred_memo_server/store/__init__.py
+
+
+Description:
+    Stores that hold the memos received by the memo server.
+
+"""
+import sys
+import threading
+import time
+from array import array
+from collections.abc import Sequence
+from inspyred_memo_server.store.record import MemoRecord
+
+
+__all__ = [
+    'MemoRecord',
+    'MemoryMemoStore',
+]
+
+
+class _MemoColumns(Sequence):
+    """
+    A read-only sequence view over a `MemoryMemoStore`'s columns that yields `MemoRecord` objects.
+    """
+
+    def __init__(self, store):
+        self.__store = store
+
+    def __len__(self):
+        return len(self.__store)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.__store.get(memo_id) for memo_id in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('memo index out of range')
+
+        return self.__store.get(index)
+
+
+class MemoryMemoStore:
+    """
+    Keeps memos in the process's memory. A memo's id is its position in the store.
+
+    Memos are held column-wise rather than as one object per memo: timestamps and sizes sit in typed arrays (8 and 4
+    bytes a memo), author names are interned so every memo by the same author shares one string, and only the body
+    is a separate object. `MemoRecord` objects are built on demand when memos are read.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty memo store.
+        """
+        self.__bodies = []
+        self.__authors = []
+        self.__created_at = array('d')
+        self.__sizes = array('I')
+        self.__lock = threading.Lock()
+
+    @property
+    def memos(self):
+        """
+        Gets the stored memos.
+
+        Returns:
+            Sequence[MemoRecord]:
+                A read-only view of the stored memos, in the order they were added.
+        """
+        return _MemoColumns(self)
+
+    def get(self, memo_id) -> MemoRecord:
+        """
+        Gets a single memo.
+
+        Parameters:
+            memo_id (int):
+                The memo ID.
+
+        Returns:
+            MemoRecord:
+                The memo.
+        """
+        return MemoRecord(
+            memo_id,
+            self.__created_at[memo_id],
+            self.__authors[memo_id],
+            self.__sizes[memo_id],
+            self.__bodies[memo_id],
+        )
+
+    def add(self, memo, author=None) -> int:
+        """
+        Adds a single memo.
+
+        Parameters:
+            memo (str):
+                The memo to add.
+
+            author (str, optional):
+                The username of the memo's author.
+
+        Returns:
+            int:
+                The id of the stored memo.
+        """
+        return self.add_many([memo], author=author)[0]
+
+    def add_many(self, memos, created_at=None, author=None) -> list:
+        """
+        Adds several memos as one unit; either all of them are stored, with consecutive ids, or none are.
+
+        Parameters:
+            memos (list[str]):
+                The memos to add.
+
+            created_at (float, optional):
+                When the memos were received, as a UNIX timestamp. Defaults to now.
+
+            author (str, optional):
+                The username of the memos' author.
+
+        Returns:
+            list[int]:
+                The ids of the stored memos, in the order given.
+        """
+        memos = list(memos)
+        sizes = [len(memo.encode('utf-8')) for memo in memos]
+        if author is not None:
+            author = sys.intern(author)
+
+        with self.__lock:
+            # Keep timestamps in id order even if the clock steps backwards, so (created_at, id) order is id order.
+            timestamp = time.time() if created_at is None else created_at
+            if self.__created_at:
+                timestamp = max(timestamp, self.__created_at[-1])
+
+            first_id = len(self.__bodies)
+            self.__bodies.extend(memos)
+            self.__authors.extend([author] * len(memos))
+            self.__sizes.extend(sizes)
+            # The timestamp column is filled last; its length is the number of fully stored memos.
+            self.__created_at.extend([timestamp] * len(memos))
+
+        return list(range(first_id, first_id + len(memos)))
+
+    def page(self, after=None, limit=500) -> list:
+        """
+        Gets the memos that follow a (created_at, id) cursor.
+
+        Parameters:
+            after (tuple, optional):
+                The (created_at, id) of the last memo already seen. Defaults to the beginning.
+
+            limit (int):
+                The most memos to return.
+
+        Returns:
+            list[dict]:
+                Up to `limit` memos, as `MemoRecord.as_dict()` dictionaries, in (created_at, id) order.
+        """
+        start = max(after[1] + 1, 0) if after is not None else 0
+        stop = min(start + limit, len(self))
+
+        return [self.get(memo_id).as_dict() for memo_id in range(start, stop)]
+
+    def __len__(self):
+        return len(self.__created_at)
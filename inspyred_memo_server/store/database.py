@@ -0,0 +1,401 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    inspyred_memo_server/store/database.py
+
+
+Description:
+    A memo store that persists memos to the application database through a batching `MemoWriter`.
+
+"""
+from sqlalchemy import insert, select, tuple_
+from inspyred_memo_server.database import get_engine
+from inspyred_memo_server.database.compression import get_body_codec
+from inspyred_memo_server.database.memo import Memo
+from inspyred_memo_server.database.search import build_match_query, create_search_index, index_memos, search_memos
+from inspyred_memo_server.database.tuning import WalCheckpointer
+from inspyred_memo_server.database.writer import MemoWriter, memo_rows
+from inspyred_memo_server.store.record import MemoRecord
+
+
+__all__ = [
+    'AsyncDatabaseMemoStore',
+    'DatabaseMemoStore',
+]
+
+
+_COLUMNS = (Memo.id, Memo.created_at, Memo.author, Memo.size, Memo.body, Memo.codec)
+
+
+def _page_query(after, limit, columns=_COLUMNS):
+    query = select(*columns).order_by(Memo.created_at, Memo.id).limit(limit)
+    if after is not None:
+        query = query.where(tuple_(Memo.created_at, Memo.id) > tuple_(*after))
+
+    return query
+
+
+def _decrypt_rows(rows, codec) -> list:
+    decode = codec.decode
+    return [
+        MemoRecord(memo_id, created_at, author, size, decode(body, body_codec))
+        for memo_id, created_at, author, size, body, body_codec in rows
+    ]
+
+
+def _ranked(hits, records) -> list:
+    by_id = {record.id: record for record in records}
+    results = []
+    for memo_id, rank in hits:
+        if memo_id in by_id:
+            result = by_id[memo_id].as_dict()
+            result['rank'] = rank
+            results.append(result)
+
+    return results
+
+
+class DatabaseMemoStore:
+    """
+    Stores memos in the `memos` table, encrypted with the database encryption key (large ones compressed first).
+
+    Calls from concurrent connection handlers are funnelled through one `MemoWriter`, which groups them into batched
+    inserts. Memos are added to the full-text index (see `inspyred_memo_server.database.search` for what it holds)
+    in the same transaction.
+    """
+
+    def __init__(
+            self,
+            engine=None,
+            batch_size=500,
+            flush_interval=0.05,
+            max_queue=10000,
+            checkpoint_interval=30.0,
+            codec=None,
+    ):
+        """
+        Initializes the store and starts its writer.
+
+        Parameters:
+            engine (sqlalchemy.engine.Engine, optional):
+                The engine to write to. Defaults to the application database engine.
+
+            batch_size (int):
+                The number of rows that triggers a flush straight away.
+
+            flush_interval (float):
+                The longest, in seconds, a memo waits before being flushed.
+
+            max_queue (int):
+                The most pending submissions before writers block.
+
+            checkpoint_interval (float, optional):
+                Seconds between background WAL checkpoints. None leaves checkpointing to SQLite.
+
+            codec (BodyCodec, optional):
+                Compresses and encrypts memo bodies. Defaults to the application's codec (see `MEMO_COMPRESSION`).
+        """
+        self.__engine = engine if engine is not None else get_engine()
+        self.__codec = codec if codec is not None else get_body_codec()
+        with self.__engine.begin() as connection:
+            create_search_index(connection)
+
+        self.__writer = MemoWriter(
+            self.__engine,
+            batch_size=batch_size,
+            flush_interval=flush_interval,
+            max_queue=max_queue,
+            encode=self.__codec.encode,
+            index=True,
+        )
+        self.__checkpointer = None
+        if checkpoint_interval is not None:
+            self.__checkpointer = WalCheckpointer(self.__engine, interval=checkpoint_interval)
+            self.__checkpointer.start()
+
+    @property
+    def writer(self) -> MemoWriter:
+        """
+        The writer inserting the store's memos.
+        """
+        return self.__writer
+
+    def add(self, memo, author=None) -> int:
+        """
+        Adds a single memo and waits until it is committed.
+
+        Parameters:
+            memo (str):
+                The memo to add.
+
+            author (str, optional):
+                The username of the memo's author.
+
+        Returns:
+            int:
+                The id of the stored memo.
+        """
+        return self.add_many([memo], author=author)[0]
+
+    def add_many(self, memos, author=None) -> list:
+        """
+        Adds several memos in one transaction and waits until they are committed.
+
+        Parameters:
+            memos (list[str]):
+                The memos to add.
+
+            author (str, optional):
+                The username of the memos' author.
+
+        Returns:
+            list[int]:
+                The ids of the stored memos, in the order given.
+        """
+        return self.__writer.submit(list(memos), author=author).result()
+
+    def page(self, after=None, limit=500) -> list:
+        """
+        Gets the memos that follow a (created_at, id) cursor.
+
+        Uses a keyset query on the (created_at, id) index rather than OFFSET, so every page costs the same however
+        deep into the table it is.
+
+        Parameters:
+            after (tuple, optional):
+                The (created_at, id) of the last memo already seen. Defaults to the beginning.
+
+            limit (int):
+                The most memos to return.
+
+        Returns:
+            list[dict]:
+                Up to `limit` decrypted memos, as `MemoRecord.as_dict()` dictionaries, in (created_at, id) order.
+        """
+        with self.__engine.connect() as connection:
+            rows = connection.execute(_page_query(after, limit)).all()
+
+        return [record.as_dict() for record in _decrypt_rows(rows, self.__codec)]
+
+    def page_keys(self, after=None, limit=500) -> list:
+        """
+        Gets the (created_at, id) keys of the memos that `page` would return, without reading or decrypting a body.
+
+        The query is answered from the (created_at, id) index alone, so a caller that only needs some of the page
+        (such as `PartitionedMemoStore` merging several partitions) can pick its rows first and `get_many` them after.
+
+        Returns:
+            list[tuple]:
+                Up to `limit` (created_at, id) tuples, in order.
+        """
+        with self.__engine.connect() as connection:
+            return [tuple(row) for row in connection.execute(
+                _page_query(after, limit, (Memo.created_at, Memo.id))
+            )]
+
+    def get_many(self, memo_ids) -> list:
+        """
+        Reads and decrypts memos by id.
+
+        Parameters:
+            memo_ids (list[int]):
+                The ids to read.
+
+        Returns:
+            list[dict]:
+                The memos found, as `MemoRecord.as_dict()` dictionaries, in the order of `memo_ids`; ids with no row
+                are skipped.
+        """
+        if not memo_ids:
+            return []
+
+        with self.__engine.connect() as connection:
+            by_id = {record.id: record for record in self._fetch(connection, memo_ids)}
+
+        return [by_id[memo_id].as_dict() for memo_id in memo_ids if memo_id in by_id]
+
+    def _fetch(self, connection, memo_ids) -> list:
+        """
+        Reads and decrypts memos by id.
+
+        Returns:
+            list[MemoRecord]:
+                The memos found; ids with no row are skipped.
+        """
+        rows = connection.execute(select(*_COLUMNS).where(Memo.id.in_(memo_ids))).all()
+        return _decrypt_rows(rows, self.__codec)
+
+    def search(self, query, phrase=False, prefix=False, author=None, limit=20, after=None) -> list:
+        """
+        Finds memos whose text matches a query, best match first.
+
+        Parameters:
+            query (str):
+                The words to look for.
+
+            phrase (bool):
+                Match the words as one consecutive phrase.
+
+            prefix (bool):
+                Let words match as prefixes.
+
+            author (str, optional):
+                Only match memos by this author.
+
+            limit (int):
+                The most results to return.
+
+            after (tuple, optional):
+                The (rank, id) of the last result already seen, to fetch the next page.
+
+        Returns:
+            list[dict]:
+                Up to `limit` memos, as `MemoRecord.as_dict()` dictionaries with an added `rank` (lower is better).
+        """
+        match = build_match_query(query, phrase=phrase, prefix=prefix, author=author)
+
+        with self.__engine.connect() as connection:
+            hits = search_memos(connection, match, limit=limit, after=after)
+            records = self._fetch(connection, [memo_id for memo_id, _ in hits]) if hits else []
+
+        return _ranked(hits, records)
+
+    def close(self):
+        """
+        Flushes pending memos and stops the writer and checkpointer.
+        """
+        self.__writer.close()
+        if self.__checkpointer is not None:
+            self.__checkpointer.stop()
+
+
+class AsyncDatabaseMemoStore:
+    """
+    The asyncio counterpart of `DatabaseMemoStore`, for servers running on an event loop.
+
+    Queries go through the aiosqlite async engine, and encryption and decryption run on the crypto executor, so
+    neither database I/O nor Fernet stalls the loop. Each `add_many` call inserts and indexes its memos in one
+    transaction of its own.
+
+    Create one with `await AsyncDatabaseMemoStore.open()`, which makes sure the schema is up to date first.
+    """
+
+    def __init__(self, engine=None, codec=None):
+        """
+        Initializes the store.
+
+        Parameters:
+            engine (sqlalchemy.ext.asyncio.AsyncEngine, optional):
+                The engine to use. Defaults to the application database's async engine.
+
+            codec (BodyCodec, optional):
+                Compresses and encrypts memo bodies. Defaults to the application's codec (see `MEMO_COMPRESSION`).
+        """
+        from inspyred_memo_server.database.aio import get_async_engine
+
+        self.__engine = engine if engine is not None else get_async_engine()
+        self.__codec = codec if codec is not None else get_body_codec()
+
+    @classmethod
+    async def open(cls, engine=None, codec=None):
+        """
+        Prepares the database and creates a store.
+
+        Parameters:
+            engine (sqlalchemy.ext.asyncio.AsyncEngine, optional):
+                The engine to use. Defaults to the application database's async engine, after migrating its schema.
+
+            codec (BodyCodec, optional):
+                Compresses and encrypts memo bodies. Defaults to the application's codec.
+
+        Returns:
+            AsyncDatabaseMemoStore:
+                The store.
+        """
+        from inspyred_memo_server.database.aio import prepare_schema
+
+        if engine is None:
+            await prepare_schema()
+
+        store = cls(engine, codec)
+        async with store.__engine.begin() as connection:
+            await connection.run_sync(create_search_index)
+
+        return store
+
+    async def add(self, memo, author=None) -> int:
+        """
+        Adds a single memo. See `add_many`.
+        """
+        return (await self.add_many([memo], author=author))[0]
+
+    async def add_many(self, memos, author=None) -> list:
+        """
+        Adds several memos in one transaction.
+
+        Parameters:
+            memos (list[str]):
+                The memos to add.
+
+            author (str, optional):
+                The username of the memos' author.
+
+        Returns:
+            list[int]:
+                The ids of the stored memos, in the order given.
+        """
+        from inspyred_memo_server.database.aio import run_cpu
+
+        memos = list(memos)
+        rows = await run_cpu(memo_rows, memos, author, self.__codec.encode)
+        statement = insert(Memo).returning(Memo.id, sort_by_parameter_order=True)
+
+        async with self.__engine.begin() as connection:
+            ids = (await connection.execute(statement, rows)).scalars().all()
+            await connection.run_sync(index_memos, [
+                {'id': memo_id, 'body': memo, 'author': author} for memo_id, memo in zip(ids, memos)
+            ])
+
+        return list(ids)
+
+    async def page(self, after=None, limit=500) -> list:
+        """
+        Gets the memos that follow a (created_at, id) cursor. See `DatabaseMemoStore.page`.
+        """
+        from inspyred_memo_server.database.aio import run_cpu
+
+        async with self.__engine.connect() as connection:
+            rows = (await connection.execute(_page_query(after, limit))).all()
+
+        return [record.as_dict() for record in await run_cpu(_decrypt_rows, rows, self.__codec)]
+
+    async def search(self, query, phrase=False, prefix=False, author=None, limit=20, after=None) -> list:
+        """
+        Finds memos whose text matches a query, best match first. See `DatabaseMemoStore.search`.
+        """
+        from inspyred_memo_server.database.aio import run_cpu
+
+        match = build_match_query(query, phrase=phrase, prefix=prefix, author=author)
+
+        async with self.__engine.connect() as connection:
+            hits = await connection.run_sync(search_memos, match, limit, after)
+            rows = []
+            if hits:
+                rows = (await connection.execute(
+                    select(*_COLUMNS).where(Memo.id.in_([memo_id for memo_id, _ in hits]))
+                )).all()
+
+        return _ranked(hits, await run_cpu(_decrypt_rows, rows, self.__codec))
+
+    async def close(self):
+        """
+        Nothing to flush: every `add_many` has committed by the time it returns. Kept for symmetry with the other
+        stores.
+        """
@@ -0,0 +1,549 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    inspyred_memo_server/store/partitioned.py
+
+
+Description:
+    A memo store that spreads memos over several SQLite files, so writes to different partitions no longer queue
+    behind one database's single writer.
+
+    A partitioner picks the partition for each write: `HashPartitioner` by author (so one author's memos stay
+    together), `TimePartitioner` by when the memo arrived (so old partitions go quiet and can be archived). A
+    `PartitionRouter` maps partitions to files, and `PartitionPool` keeps an LRU of open partitions so the number of
+    open files stays bounded however many partitions exist.
+
+    Memo ids are global: the partition number is kept in the high bits (see `global_id`), so an id still identifies
+    one memo across every partition. Listing and search query each partition with a cursor translated to that
+    partition and merge the results.
+
+"""
+import heapq
+import itertools
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from sqlalchemy import create_engine
+from inspyred_memo_server.database.migrations import migrate
+from inspyred_memo_server.database.session import pool_options
+from inspyred_memo_server.database.tuning import DEFAULT_PROFILE, install_profile
+from inspyred_memo_server.store.database import DatabaseMemoStore
+
+
+__all__ = [
+    'HashPartitioner',
+    'PartitionPool',
+    'PartitionRouter',
+    'PartitionedMemoStore',
+    'TimePartitioner',
+    'default_directory',
+    'global_id',
+    'partition_engine',
+    'split_id',
+]
+
+
+PARTITION_SHIFT = 40
+"""How many low bits of a global memo id hold the id within its partition (about 10^12 memos per partition)."""
+
+_LAST = (1 << PARTITION_SHIFT) - 1
+
+
+def global_id(partition, local_id) -> int:
+    """
+    Combines a partition number and an id within that partition into one memo id.
+    """
+    return (partition << PARTITION_SHIFT) | local_id
+
+
+def default_directory() -> Path:
+    """
+    Gets where partition files are kept unless told otherwise: a `partitions` directory in the application's data
+    directory.
+    """
+    from inspyred_memo_server.config.dirs import get_app_dirs
+    return get_app_dirs().data_dir / 'partitions'
+
+
+def partition_engine(path, pool_size=2, max_overflow=4, profile=DEFAULT_PROFILE):
+    """
+    Opens an engine on one partition's file, with the SQLite profile installed and the schema migrated.
+
+    Returns:
+        sqlalchemy.engine.Engine:
+            The engine.
+    """
+    url = f'sqlite:///{path}'
+    engine = create_engine(url, **pool_options(url, pool_size=pool_size, max_overflow=max_overflow))
+    install_profile(engine, profile)
+    migrate(engine)
+    return engine
+
+
+def split_id(memo_id) -> tuple:
+    """
+    Splits a global memo id into its (partition, id within the partition).
+    """
+    return memo_id >> PARTITION_SHIFT, memo_id & _LAST
+
+
+def _local_cursor(partition, after):
+    """
+    Translates a (sort key, global id) cursor into the equivalent cursor within one partition.
+
+    Rows are ordered by (sort key, global id), and global ids order by partition first, so at the cursor's own sort key
+    a later partition still has all of its rows to come, and an earlier one none.
+    """
+    if after is None:
+        return None
+
+    key, memo_id = after
+    cursor_partition, local_id = split_id(memo_id)
+    if partition > cursor_partition:
+        return key, -1
+    if partition < cursor_partition:
+        return key, _LAST
+
+    return key, local_id
+
+
+class HashPartitioner:
+    """
+    Assigns memos to one of `count` partitions by a stable hash of their author.
+
+    Memos without an author have no affinity to keep, so they are spread round-robin.
+
+    Attributes:
+        count (int):
+            The number of partitions.
+    """
+
+    def __init__(self, count=8):
+        if count < 1:
+            raise ValueError(f'count must be at least 1, got {count}')
+
+        self.count = count
+        self.__anonymous = itertools.count()
+
+    def partition_for(self, author, created_at) -> int:
+        """
+        Gets the partition a new memo belongs in.
+        """
+        if author is None:
+            return next(self.__anonymous) % self.count
+
+        return zlib.crc32(author.encode('utf-8')) % self.count
+
+    def candidates(self, partitions, after_created_at=None) -> list:
+        """
+        Narrows the existing partitions down to those that may hold memos created at or after a time.
+        """
+        return sorted(partitions)
+
+    def __repr__(self):
+        return f'HashPartitioner(count={self.count})'
+
+
+class TimePartitioner:
+    """
+    Rolls over to a new partition every `period` seconds, numbered by how many periods have passed since the epoch.
+
+    Attributes:
+        period (float):
+            The length of a partition, in seconds.
+    """
+
+    SLACK = 60.0
+    """Seconds of overlap allowed between a partition's period and its memos' timestamps, which are taken a moment
+    after the partition is chosen."""
+
+    def __init__(self, period=86400.0):
+        if period <= 0:
+            raise ValueError(f'period must be positive, got {period}')
+
+        self.period = period
+
+    def partition_for(self, author, created_at) -> int:
+        """
+        Gets the partition a new memo belongs in.
+        """
+        return int(created_at // self.period)
+
+    def candidates(self, partitions, after_created_at=None) -> list:
+        """
+        Narrows the existing partitions down to those that may hold memos created at or after a time, skipping
+        partitions whose period ended before it.
+        """
+        if after_created_at is None:
+            return sorted(partitions)
+
+        return sorted(
+            partition for partition in partitions
+            if (partition + 1) * self.period + self.SLACK >= after_created_at
+        )
+
+    def __repr__(self):
+        return f'TimePartitioner(period={self.period})'
+
+
+class PartitionRouter:
+    """
+    Maps partitions to database files in one directory, and decides which partitions a read or write touches.
+
+    Attributes:
+        directory (Path):
+            The directory holding the partition files.
+
+        partitioner (HashPartitioner | TimePartitioner):
+            Chooses the partition for each write.
+
+        prefix (str):
+            The file name prefix; partition 3 is stored in `<prefix>-3.db`.
+    """
+
+    def __init__(self, directory, partitioner, prefix='memos'):
+        self.directory = Path(directory)
+        self.partitioner = partitioner
+        self.prefix = prefix
+        self.__pattern = re.compile(rf'^{re.escape(prefix)}-(\d+)\.db$')
+
+    def path(self, partition) -> Path:
+        """
+        Gets the file a partition is stored in.
+        """
+        return self.directory / f'{self.prefix}-{partition}.db'
+
+    def existing(self) -> list:
+        """
+        Gets the partitions that have a file on disk.
+        """
+        if not self.directory.exists():
+            return []
+
+        partitions = []
+        for path in self.directory.iterdir():
+            match = self.__pattern.match(path.name)
+            if match:
+                partitions.append(int(match.group(1)))
+
+        return partitions
+
+    def for_write(self, author=None, created_at=None) -> int:
+        """
+        Gets the partition a new memo is written to.
+        """
+        return self.partitioner.partition_for(author, time.time() if created_at is None else created_at)
+
+    def for_read(self, after_created_at=None) -> list:
+        """
+        Gets the partitions a listing starting at `after_created_at` needs to read, in order.
+        """
+        return self.partitioner.candidates(self.existing(), after_created_at)
+
+
+class PartitionPool:
+    """
+    An LRU of open partitions, each a `DatabaseMemoStore` on its own engine.
+
+    At most `max_open` partitions are kept open; opening another closes the least recently used idle one, flushing its
+    writer and closing its connections. Partitions in use (see `lease`) are never closed under their users, so the
+    limit can be exceeded briefly when more than `max_open` partitions are busy at once.
+
+    Open files are bounded by about `max_open` x (`pool_size` + `max_overflow`) connections, each holding the database
+    file and, in WAL mode, its -wal and -shm files.
+
+    Attributes:
+        router (PartitionRouter):
+            Locates each partition's file.
+
+        max_open (int):
+            The most partitions kept open while idle.
+    """
+
+    def __init__(self, router, max_open=16, pool_size=2, max_overflow=4, profile=DEFAULT_PROFILE, **store_options):
+        """
+        Initializes the pool.
+
+        Parameters:
+            router (PartitionRouter):
+                Locates each partition's file.
+
+            max_open (int):
+                The most partitions kept open while idle.
+
+            pool_size (int):
+                Connections kept open per partition.
+
+            max_overflow (int):
+                Extra connections a partition may open under load.
+
+            profile (SQLiteProfile):
+                The pragmas applied to every partition's connections.
+
+            **store_options:
+                Passed on to each partition's `DatabaseMemoStore` (e.g. `batch_size`).
+        """
+        self.router = router
+        self.max_open = max_open
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.profile = profile
+        # SQLite's automatic checkpoints suffice for partitions, which each take a share of the writes.
+        store_options.setdefault('checkpoint_interval', None)
+        self.store_options = store_options
+
+        self.__lock = threading.Lock()
+        self.__open = OrderedDict()  # partition -> [store, engine, leases], least recently used first.
+        self.__opened = 0
+        self.__closed = 0
+
+    @property
+    def open_count(self) -> int:
+        """
+        The number of partitions currently open.
+        """
+        return len(self.__open)
+
+    def stats(self) -> dict:
+        """
+        Gets how many partitions are open, and how many have been opened and closed so far.
+        """
+        with self.__lock:
+            return {'open': len(self.__open), 'opened': self.__opened, 'closed': self.__closed}
+
+    def _open(self, partition):
+        path = self.router.path(partition)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        engine = partition_engine(path, self.pool_size, self.max_overflow, self.profile)
+        return DatabaseMemoStore(engine, **self.store_options), engine
+
+    @staticmethod
+    def _close(store, engine):
+        store.close()
+        engine.dispose()
+
+    def _evict(self):
+        """
+        Picks idle partitions to close until the pool is within its limit. Call with the lock held.
+        """
+        victims = []
+        for partition, entry in list(self.__open.items()):
+            if len(self.__open) <= self.max_open:
+                break
+            if entry[2] == 0:
+                del self.__open[partition]
+                victims.append(entry)
+
+        return victims
+
+    @contextmanager
+    def lease(self, partition):
+        """
+        Borrows a partition's store, opening it if needed.
+
+        Yields:
+            DatabaseMemoStore:
+                The partition's store, which stays open until the block exits.
+        """
+        with self.__lock:
+            entry = self.__open.get(partition)
+            if entry is not None:
+                self.__open.move_to_end(partition)
+                entry[2] += 1
+
+        if entry is None:
+            # Opening (and migrating) a partition is slow, so it happens outside the lock.
+            store, engine = self._open(partition)
+            with self.__lock:
+                entry = self.__open.get(partition)
+                if entry is None:
+                    entry = self.__open[partition] = [store, engine, 1]
+                    self.__opened += 1
+                    store = engine = None
+                else:
+                    self.__open.move_to_end(partition)
+                    entry[2] += 1
+
+            if store is not None:
+                # Another thread opened the same partition first.
+                self._close(store, engine)
+
+        try:
+            yield entry[0]
+        finally:
+            with self.__lock:
+                entry[2] -= 1
+                victims = self._evict()
+                self.__closed += len(victims)
+
+            for store, engine, _ in victims:
+                self._close(store, engine)
+
+    def close(self):
+        """
+        Closes every open partition.
+        """
+        with self.__lock:
+            entries = list(self.__open.values())
+            self.__open.clear()
+            self.__closed += len(entries)
+
+        for store, engine, _ in entries:
+            self._close(store, engine)
+
+
+class PartitionedMemoStore:
+    """
+    Stores memos across several SQLite files, routed by a partitioner.
+
+    Each `add_many` call writes to a single partition, chosen from its author (`HashPartitioner`) or the current time
+    (`TimePartitioner`), and is committed in that partition's transaction. Listing merges the partitions' (created_at,
+    id) cursors into one ordered stream, and search merges their ranked results; bm25 ranks are computed per
+    partition, so the interleaving of results from different partitions is approximate.
+    """
+
+    def __init__(self, directory=None, partitioner=None, max_open=16, **pool_options):
+        """
+        Initializes the store.
+
+        Parameters:
+            directory (str | Path, optional):
+                Where the partition files are kept. Defaults to a `partitions` directory in the application's data
+                directory.
+
+            partitioner (HashPartitioner | TimePartitioner, optional):
+                Chooses each write's partition. Defaults to `HashPartitioner(8)`.
+
+            max_open (int):
+                The most partitions kept open while idle.
+
+            **pool_options:
+                Passed on to `PartitionPool` (e.g. `pool_size`, `batch_size`).
+        """
+        if directory is None:
+            directory = default_directory()
+
+        self.router = PartitionRouter(directory, partitioner if partitioner is not None else HashPartitioner())
+        self.pool = PartitionPool(self.router, max_open=max_open, **pool_options)
+
+    def add(self, memo, author=None) -> int:
+        """
+        Adds a single memo and waits until it is committed.
+
+        Returns:
+            int:
+                The memo's global id.
+        """
+        return self.add_many([memo], author=author)[0]
+
+    def add_many(self, memos, author=None) -> list:
+        """
+        Adds several memos to one partition in one transaction and waits until they are committed.
+
+        Parameters:
+            memos (list[str]):
+                The memos to add.
+
+            author (str, optional):
+                The username of the memos' author.
+
+        Returns:
+            list[int]:
+                The memos' global ids, in the order given.
+        """
+        partition = self.router.for_write(author)
+        with self.pool.lease(partition) as store:
+            return [global_id(partition, local_id) for local_id in store.add_many(memos, author=author)]
+
+    @staticmethod
+    def _globalise(partition, memos):
+        for memo in memos:
+            memo['id'] = global_id(partition, memo['id'])
+            yield memo
+
+    def page(self, after=None, limit=500) -> list:
+        """
+        Gets the memos, across every partition, that follow a (created_at, global id) cursor.
+
+        Each partition is asked for the (created_at, id) keys of up to `limit` memos after the cursor (translated to
+        that partition), which come from the index without touching a body. The keys are merged in (created_at, global
+        id) order, and only the `limit` memos that win are read and decrypted, so a page costs `limit` decryptions
+        however many partitions there are.
+
+        Parameters:
+            after (tuple, optional):
+                The (created_at, id) of the last memo already seen. Defaults to the beginning.
+
+            limit (int):
+                The most memos to return.
+
+        Returns:
+            list[dict]:
+                Up to `limit` decrypted memos, as `MemoRecord.as_dict()` dictionaries with global ids.
+        """
+        streams = []
+        for partition in self.router.for_read(after[0] if after is not None else None):
+            with self.pool.lease(partition) as store:
+                keys = store.page_keys(_local_cursor(partition, after), limit)
+            streams.append([(created_at, global_id(partition, memo_id)) for created_at, memo_id in keys])
+
+        winners = [memo_id for _, memo_id in itertools.islice(heapq.merge(*streams), limit)]
+
+        wanted = {}
+        for memo_id in winners:
+            partition, local_id = split_id(memo_id)
+            wanted.setdefault(partition, []).append(local_id)
+
+        by_id = {}
+        for partition, local_ids in wanted.items():
+            with self.pool.lease(partition) as store:
+                memos = store.get_many(local_ids)
+            by_id.update((memo['id'], memo) for memo in self._globalise(partition, memos))
+
+        # A memo deleted between the two reads is skipped rather than failing the page.
+        return [by_id[memo_id] for memo_id in winners if memo_id in by_id]
+
+    def search(self, query, phrase=False, prefix=False, author=None, limit=20, after=None) -> list:
+        """
+        Finds memos, across every partition, whose text matches a query, best match first.
+
+        Parameters are as for `DatabaseMemoStore.search`; `after` is a (rank, global id) cursor.
+
+        Returns:
+            list[dict]:
+                Up to `limit` memos with global ids and an added `rank`.
+        """
+        partitions = self.router.for_read()
+        if author is not None and isinstance(self.router.partitioner, HashPartitioner):
+            # Every memo by this author is in one partition.
+            partitions = [p for p in partitions if p == self.router.for_write(author)]
+
+        streams = []
+        for partition in partitions:
+            with self.pool.lease(partition) as store:
+                results = store.search(
+                    query, phrase=phrase, prefix=prefix, author=author, limit=limit,
+                    after=_local_cursor(partition, after),
+                )
+            streams.append(self._globalise(partition, results))
+
+        merged = heapq.merge(*streams, key=lambda memo: (memo['rank'], memo['id']))
+        return list(itertools.islice(merged, limit))
+
+    def close(self):
+        """
+        Flushes pending memos and closes every open partition.
+        """
+        self.pool.close()
@@ -0,0 +1,74 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    inspyred_memo_server/store/record.py
+
+
+Description:
+    The compact record type memos are handled as while they are held in memory.
+
+"""
+
+
+__all__ = [
+    'MemoRecord',
+]
+
+
+class MemoRecord:
+    """
+    A single memo and its metadata.
+
+    Uses `__slots__`, so a record carries no per-instance `__dict__`; stores keep their memos in columns and build
+    records on demand.
+
+    Attributes:
+        id (int):
+            The memo ID.
+
+        created_at (float):
+            When the memo was received, as a UNIX timestamp.
+
+        author (str | None):
+            The username of the memo's author, if known.
+
+        size (int):
+            The length of the memo, in UTF-8 bytes.
+
+        body (str):
+            The memo text.
+    """
+    __slots__ = ('id', 'created_at', 'author', 'size', 'body')
+
+    def __init__(self, id, created_at, author, size, body):
+        self.id = id
+        self.created_at = created_at
+        self.author = author
+        self.size = size
+        self.body = body
+
+    def as_dict(self) -> dict:
+        """
+        Gets the record as a plain dictionary, e.g. for JSON encoding.
+
+        Returns:
+            dict:
+                The record's fields, keyed by name.
+        """
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other):
+        if not isinstance(other, MemoRecord):
+            return NotImplemented
+
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f'MemoRecord(id={self.id}, created_at={self.created_at}, author={self.author!r}, size={self.size})'
@@ -0,0 +1,386 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    inspyred_memo_server/store/wal.py
+
+
+Description:
+    An append-only, checksummed write-ahead log with group commit, and a memo store that is made durable by it.
+
+    Each record is a fixed header followed by its payload:
+
+        +----------------+-------------------+
+        | payload length | CRC-32 of payload |
+        | I              | I                 |
+        +----------------+-------------------+
+
+    A record's payload is a UTF-8 JSON object, `{"t": created_at, "a": author, "memos": [...]}`, holding every memo
+    written by one `add_many` call, so a batch is replayed all-or-nothing and with its original metadata.
+
+"""
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from pathlib import Path
+from inspyred_memo_server.store import MemoryMemoStore
+
+
+__all__ = [
+    'DurableMemoStore',
+    'RECORD_HEADER',
+    'WriteAheadLog',
+]
+
+
+RECORD_HEADER = struct.Struct('!II')
+"""The record header layout: payload length, CRC-32 of the payload."""
+
+
+class WriteAheadLog:
+    """
+    An append-only log file whose writes are made durable in groups.
+
+    Writers hand records to `write`, which only buffers them, and then block in `wait` until a background flusher
+    has written and fsync'd them. The flusher commits whatever has accumulated once `batch_size` records are
+    pending or `flush_interval` seconds have passed since the oldest of them, so a single fsync covers every
+    concurrent writer in the group.
+
+    A failed commit is not retried: after a failed fsync the kernel may already have dropped the dirty pages, so a
+    second fsync that succeeds proves nothing. Instead the log cuts the file back to its last durable length, fails
+    every record still waiting, and refuses further writes; reopen it (replaying what is on disk) to carry on.
+
+    Attributes:
+        path (Path):
+            The log file.
+
+        flush_interval (float):
+            The longest, in seconds, a record waits in the buffer before being committed.
+
+        batch_size (int):
+            The number of pending records that triggers a commit straight away.
+    """
+
+    def __init__(self, path, flush_interval: float = 0.005, batch_size: int = 256):
+        """
+        Opens (creating if necessary) the log file and starts the flusher thread.
+
+        Parameters:
+            path (str | Path):
+                The log file.
+
+            flush_interval (float):
+                The longest, in seconds, a record waits in the buffer before being committed.
+
+            batch_size (int):
+                The number of pending records that triggers a commit straight away.
+        """
+        self.path = Path(path).expanduser().resolve()
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Unbuffered, so nothing from a failed commit is left in a buffer to be written out later.
+        self.__file = open(self.path, 'ab', buffering=0)
+
+        self.__condition = threading.Condition()
+        self.__pending = bytearray()
+        self.__pending_count = 0
+        self.__pending_since = None
+        self.__written_seq = 0
+        self.__flushed_seq = 0
+        self.__error = None
+        self.__closed = False
+        self.__commits = 0
+
+        self.__flusher = threading.Thread(target=self._flush_loop, name='memo-wal-flusher', daemon=True)
+        self.__flusher.start()
+
+    @property
+    def commits(self) -> int:
+        """
+        The number of fsyncs issued so far; compare with the number of records written to see the grouping.
+        """
+        return self.__commits
+
+    @property
+    def error(self):
+        """
+        The exception that failed a commit and stopped the log, if one did.
+        """
+        return self.__error
+
+    @staticmethod
+    def encode_record(payload: bytes) -> bytes:
+        """
+        Frames a payload as a log record.
+
+        Parameters:
+            payload (bytes):
+                The record payload.
+
+        Returns:
+            bytes:
+                The record header followed by the payload.
+        """
+        return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+    def write(self, payload: bytes) -> int:
+        """
+        Buffers a record for the next group commit, without waiting for it.
+
+        Parameters:
+            payload (bytes):
+                The record payload.
+
+        Returns:
+            int:
+                The record's sequence number, to pass to `wait`.
+
+        Raises:
+            OSError:
+                If an earlier commit failed, which stops the log.
+        """
+        record = self.encode_record(payload)
+        with self.__condition:
+            if self.__error is not None:
+                raise OSError(f'The write-ahead log stopped after a failed commit: {self.__error}') from self.__error
+
+            if self.__closed:
+                raise ValueError('The write-ahead log has been closed.')
+
+            self.__pending += record
+            self.__pending_count += 1
+            if self.__pending_since is None:
+                self.__pending_since = time.monotonic()
+            self.__written_seq += 1
+            self.__condition.notify_all()
+
+            return self.__written_seq
+
+    def wait(self, seq: int):
+        """
+        Blocks until the record with sequence number `seq` has been fsync'd.
+
+        Raises:
+            OSError:
+                If the commit covering the record failed.
+        """
+        with self.__condition:
+            while self.__flushed_seq < seq and self.__error is None:
+                self.__condition.wait()
+
+            if self.__flushed_seq < seq:
+                raise self.__error
+
+    def append(self, payload: bytes):
+        """
+        Writes a record and blocks until it is durable.
+        """
+        self.wait(self.write(payload))
+
+    def _flush_loop(self):
+        while True:
+            with self.__condition:
+                while True:
+                    if self.__pending_count >= self.batch_size or (self.__closed and self.__pending_count):
+                        break
+                    if self.__closed:
+                        return
+                    if self.__pending_count:
+                        remaining = self.__pending_since + self.flush_interval - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self.__condition.wait(remaining)
+                    else:
+                        self.__condition.wait()
+
+                data = self.__pending
+                seq = self.__written_seq
+                self.__pending = bytearray()
+                self.__pending_count = 0
+                self.__pending_since = None
+
+            fd = self.__file.fileno()
+            durable_size = None
+            try:
+                durable_size = os.fstat(fd).st_size
+                view = memoryview(data)
+                while view:
+                    view = view[self.__file.write(view):]
+                os.fsync(fd)
+            except OSError as e:
+                # Cut off whatever part of the group reached the file, so a replay cannot bring back records whose
+                # writers were told they failed.
+                if durable_size is not None:
+                    try:
+                        os.ftruncate(fd, durable_size)
+                    except OSError:
+                        pass
+
+                with self.__condition:
+                    self.__error = e
+                    self.__pending = bytearray()
+                    self.__pending_count = 0
+                    self.__pending_since = None
+                    self.__condition.notify_all()
+                return
+
+            with self.__condition:
+                self.__flushed_seq = seq
+                self.__commits += 1
+                self.__condition.notify_all()
+
+    def replay(self):
+        """
+        Reads back every intact record, in the order they were written.
+
+        A torn or corrupt record (from a crash part-way through a commit) ends the log; it and anything after it are
+        truncated away so that new records are appended after the last good one.
+
+        Yields:
+            bytes:
+                Each record payload.
+        """
+        good_offset = 0
+        with open(self.path, 'rb') as log:
+            while True:
+                header = log.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+
+                length, checksum = RECORD_HEADER.unpack(header)
+                payload = log.read(length)
+                if len(payload) < length or zlib.crc32(payload) != checksum:
+                    break
+
+                good_offset = log.tell()
+                yield payload
+
+            torn = log.seek(0, os.SEEK_END) - good_offset
+
+        if torn:
+            print(f"Truncating {torn} bytes of torn or corrupt records from {self.path}")
+            with self.__condition:
+                os.truncate(self.path, good_offset)
+
+    def close(self):
+        """
+        Commits anything still buffered, stops the flusher and closes the file.
+        """
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+
+        self.__flusher.join()
+        self.__file.close()
+
+
+class DurableMemoStore(MemoryMemoStore):
+    """
+    An in-memory memo store backed by a write-ahead log.
+
+    The log is replayed when the store is created, so memos (and their ids) survive restarts. `add_many` returns only
+    once the memos are on disk, and memos become visible to readers (and get their ids) only then, in log order, so the
+    ids handed out are the ones a replay rebuilds. If a commit fails, the memos it covered are never stored and the
+    store refuses further writes (see `WriteAheadLog`).
+    """
+
+    def __init__(self, path=None, flush_interval: float = 0.005, batch_size: int = 256):
+        """
+        Opens the write-ahead log and rebuilds the store from it.
+
+        Parameters:
+            path (str | Path, optional):
+                The log file. Defaults to 'memos.wal' in the application data directory.
+
+            flush_interval (float):
+                The longest, in seconds, a memo waits for its group commit.
+
+            batch_size (int):
+                The number of pending writes that triggers a group commit straight away.
+        """
+        super().__init__()
+
+        if path is None:
+            from inspyred_memo_server.config.dirs import get_app_dirs
+            path = get_app_dirs().data_dir / 'memos.wal'
+
+        self.__write_lock = threading.Lock()
+        self.__publish_lock = threading.Lock()
+        self.__unpublished = deque()  # [seq, memos, created_at, author, ids], in log order.
+        self.__wal = WriteAheadLog(path, flush_interval=flush_interval, batch_size=batch_size)
+
+        for payload in self.__wal.replay():
+            record = json.loads(payload)
+            super().add_many(record['memos'], created_at=record['t'], author=record.get('a'))
+
+    @property
+    def wal(self) -> WriteAheadLog:
+        """
+        The write-ahead log backing the store.
+        """
+        return self.__wal
+
+    def add_many(self, memos, created_at=None, author=None) -> list:
+        """
+        Adds several memos as one unit and waits until they are durable.
+
+        Parameters:
+            memos (list[str]):
+                The memos to add.
+
+            created_at (float, optional):
+                When the memos were received, as a UNIX timestamp. Defaults to now.
+
+            author (str, optional):
+                The username of the memos' author.
+
+        Returns:
+            list[int]:
+                The ids of the stored memos, in the order given.
+
+        Raises:
+            OSError:
+                If the memos could not be made durable; none of them are stored.
+        """
+        memos = list(memos)
+        created_at = time.time() if created_at is None else created_at
+        payload = json.dumps(
+            {'t': created_at, 'a': author, 'memos': memos},
+            separators=(',', ':'),
+            ensure_ascii=False,
+        ).encode('utf-8')
+
+        # Log order and id order must agree, or replay would hand out different ids; the queue keeps log order.
+        with self.__write_lock:
+            seq = self.__wal.write(payload)
+            entry = [seq, memos, created_at, author, None]
+            self.__unpublished.append(entry)
+
+        self.__wal.wait(seq)
+
+        # Commits are in log order, so every record up to this one is durable; whichever writer gets here first
+        # publishes them all.
+        with self.__publish_lock:
+            while self.__unpublished and self.__unpublished[0][0] <= seq:
+                pending = self.__unpublished.popleft()
+                pending[4] = super().add_many(pending[1], created_at=pending[2], author=pending[3])
+
+        return entry[4]
+
+    def close(self):
+        """
+        Flushes and closes the write-ahead log.
+        """
+        self.__wal.close()
@@ -0,0 +1,234 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    inspyred_memo_server/supervisor.py
+
+
+Description:
+    Runs several `MemoServer` worker processes on one address with SO_REUSEPORT, so the kernel spreads connections
+    across cores, and keeps them running.
+
+"""
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+from inspyred_memo_server import MemoServer
+from inspyred_memo_server.stats import ConnectionStats
+
+
+__all__ = [
+    'MemoSupervisor',
+]
+
+
+CUMULATIVE_FIELDS = ('accepted', 'rejected', 'completed')
+"""Counters that keep growing for the life of the service, and so are carried over when a worker is replaced."""
+
+
+def _default_store_factory():
+    from inspyred_memo_server.store.database import DatabaseMemoStore
+    return DatabaseMemoStore()
+
+
+def _worker_main(index, host, port, store_factory, server_kwargs, shared_stats, publish_interval):
+    """
+    The entry point of a worker process: serves connections and publishes its counters into shared memory.
+    """
+    # Connections pooled by the parent must not be shared with the child.
+    database = sys.modules.get('inspyred_memo_server.database')
+    if database is not None:
+        database.dispose_engine(close=False)
+
+    server = MemoServer(host, port, store=store_factory(), reuse_port=True, **server_kwargs)
+    fields = ConnectionStats.FIELDS
+    offset = index * len(fields)
+
+    def publish():
+        while True:
+            counts = server.stats.as_dict()
+            with shared_stats.get_lock():
+                for position, field in enumerate(fields):
+                    shared_stats[offset + position] = counts[field]
+            time.sleep(publish_interval)
+
+    threading.Thread(target=publish, name='memo-stats-publisher', daemon=True).start()
+    server.start()
+
+
+class MemoSupervisor:
+    """
+    Starts `workers` memo server processes bound to the same `(host, port)`, restarts any that die, and merges their
+    connection counters.
+
+    Every worker builds its own store by calling `store_factory` after it starts. The store must be safe to share
+    between processes; the default, `DatabaseMemoStore`, is, because the database runs in SQLite WAL mode with a busy
+    timeout. The in-memory and write-ahead-log stores are per-process and are not.
+
+    Attributes:
+        host (str):
+            The address the workers listen on.
+
+        port (int):
+            The port the workers listen on.
+
+        workers (int):
+            The number of worker processes.
+    """
+
+    def __init__(
+            self,
+            host='127.0.0.1',
+            port=65432,
+            workers=None,
+            store_factory=None,
+            check_interval=1.0,
+            publish_interval=1.0,
+            **server_kwargs,
+    ):
+        """
+        Initializes the supervisor.
+
+        Parameters:
+            host (str):
+                The address the workers listen on.
+
+            port (int):
+                The port the workers listen on.
+
+            workers (int, optional):
+                The number of worker processes. Defaults to the number of CPUs.
+
+            store_factory (callable, optional):
+                Called in each worker to build its memo store. Defaults to building a `DatabaseMemoStore`.
+
+            check_interval (float):
+                How often, in seconds, to look for dead workers.
+
+            publish_interval (float):
+                How often, in seconds, each worker publishes its counters.
+
+            **server_kwargs:
+                Passed to each worker's `MemoServer`, e.g. `engine='pool'`.
+        """
+        if not hasattr(socket, 'SO_REUSEPORT'):
+            raise OSError('SO_REUSEPORT is not available on this platform.')
+
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.store_factory = store_factory or _default_store_factory
+        self.check_interval = check_interval
+        self.publish_interval = publish_interval
+        self.server_kwargs = server_kwargs
+
+        self.__processes = [None] * self.workers
+        self.__shared_stats = multiprocessing.Array('q', self.workers * len(ConnectionStats.FIELDS))
+        self.__retired = dict.fromkeys(ConnectionStats.FIELDS, 0)
+        self.__restarts = 0
+        self.__running = False
+
+    @property
+    def restarts(self) -> int:
+        """
+        The number of workers that have been replaced after dying.
+        """
+        return self.__restarts
+
+    def _spawn(self, index):
+        process = multiprocessing.Process(
+            target=_worker_main,
+            args=(
+                index,
+                self.host,
+                self.port,
+                self.store_factory,
+                self.server_kwargs,
+                self.__shared_stats,
+                self.publish_interval,
+            ),
+            name=f'memo-worker-{index}',
+            daemon=True,
+        )
+        process.start()
+        self.__processes[index] = process
+
+    def _retire(self, index):
+        """
+        Folds a dead worker's cumulative counters into the running totals and clears its slot.
+        """
+        fields = ConnectionStats.FIELDS
+        offset = index * len(fields)
+        with self.__shared_stats.get_lock():
+            for position, field in enumerate(fields):
+                if field in CUMULATIVE_FIELDS:
+                    self.__retired[field] += self.__shared_stats[offset + position]
+                self.__shared_stats[offset + position] = 0
+
+    def stats(self) -> dict:
+        """
+        Merges the counters of every worker, past and present.
+
+        Returns:
+            dict:
+                The summed counters, keyed by name, plus the number of live `workers`.
+        """
+        fields = ConnectionStats.FIELDS
+        merged = dict(self.__retired)
+        with self.__shared_stats.get_lock():
+            for index in range(self.workers):
+                for position, field in enumerate(fields):
+                    merged[field] += self.__shared_stats[index * len(fields) + position]
+
+        merged['workers'] = sum(1 for process in self.__processes if process is not None and process.is_alive())
+        return merged
+
+    def check_workers(self):
+        """
+        Replaces every worker that has exited.
+        """
+        for index, process in enumerate(self.__processes):
+            if process is not None and not process.is_alive():
+                print(f"Worker {index} (pid {process.pid}) exited with code {process.exitcode}; restarting")
+                self._retire(index)
+                self._spawn(index)
+                self.__restarts += 1
+
+    def start(self):
+        """
+        Starts the workers and supervises them until interrupted or `stop` is called.
+        """
+        self.__running = True
+        for index in range(self.workers):
+            self._spawn(index)
+
+        print(f"Supervisor started {self.workers} workers at {self.host}:{self.port}")
+        try:
+            while self.__running:
+                time.sleep(self.check_interval)
+                if self.__running:
+                    self.check_workers()
+        finally:
+            self.stop()
+
+    def stop(self):
+        """
+        Stops supervising and terminates every worker.
+        """
+        self.__running = False
+        for process in self.__processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+
+        for process in self.__processes:
+            if process is not None:
+                process.join()
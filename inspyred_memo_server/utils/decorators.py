@@ -15,6 +15,7 @@ Description:
     
 
 """
+import threading
 from functools import wraps
 
 
@@ -94,3 +95,48 @@ def property_alias(alias_name: str, original_name: str):
         setattr(cls, alias_name, property(original.fget, original.fset))
         return cls
     return decorator
+
+
+def lazy_singleton(factory):
+    """
+    A decorator that turns a zero-argument factory into an accessor for a lazily created, shared instance.
+
+    The factory runs on the first call, under a lock so that concurrent first calls still create only one instance;
+    every later call returns that instance. Nothing is created at import time.
+
+    Args:
+        factory (callable): Creates the instance.
+
+    Returns:
+        The accessor function. `accessor.initialized()` reports whether the instance exists yet, and
+        `accessor.reset()` forgets it, so the next call creates a new one.
+
+    Example:
+        >>> @lazy_singleton
+        ... def get_engine():
+        ...     return create_engine(DATABASE_URL)
+        ...
+        >>> get_engine() is get_engine()
+        True
+    """
+    lock = threading.Lock()
+    instance = []
+
+    @wraps(factory)
+    def accessor():
+        if not instance:
+            with lock:
+                if not instance:
+                    instance.append(factory())
+        return instance[0]
+
+    def initialized():
+        return bool(instance)
+
+    def reset():
+        with lock:
+            instance.clear()
+
+    accessor.initialized = initialized
+    accessor.reset = reset
+    return accessor
@@ -0,0 +1,73 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    tests/conftest.py
+
+
+Description:
+    Shared fixtures: every test gets its own encryption key (from the environment, so no keyring is touched) and, if
+    it asks for one, a migrated SQLite database in a temporary directory.
+
+"""
+import pytest
+from cryptography.fernet import Fernet
+from sqlalchemy import create_engine
+from inspyred_memo_server import config
+from inspyred_memo_server.database import crypt
+from inspyred_memo_server.database.compression import get_body_codec
+from inspyred_memo_server.database.migrations import migrate
+from inspyred_memo_server.database.session import SessionManager, pool_options
+from inspyred_memo_server.database.tuning import DEFAULT_PROFILE, install_profile
+
+
+def _forget_key():
+    for accessor in (crypt.get_key_provider, crypt.get_encryption_manager, get_body_codec):
+        accessor.reset()
+
+
+@pytest.fixture(autouse=True)
+def encryption_key(monkeypatch):
+    """
+    Gives the test a fresh encryption key through `INSPYRED_MEMOS_KEY`.
+    """
+    key = Fernet.generate_key()
+    monkeypatch.setitem(config.ENCRYPTION_KEY, 'backend', 'env')
+    monkeypatch.setenv(config.ENCRYPTION_KEY['env_var'], key.decode())
+    _forget_key()
+    yield key
+    _forget_key()
+
+
+def make_engine(path, pool_size=16, max_overflow=16):
+    url = f'sqlite:///{path}'
+    engine = create_engine(url, **pool_options(url, pool_size=pool_size, max_overflow=max_overflow))
+    install_profile(engine, DEFAULT_PROFILE)
+    migrate(engine)
+    return engine
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return tmp_path / 'memos.db'
+
+
+@pytest.fixture
+def engine(db_path):
+    """
+    A migrated SQLite database in a temporary directory, with the application's pragmas.
+    """
+    engine = make_engine(db_path)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def sessions(engine):
+    return SessionManager(engine)
@@ -0,0 +1,152 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    tests/test_migrations.py
+
+
+Description:
+    Checks the migration runner: a new database is stamped with the latest version, a first-release database is
+    brought forward (including the batched full-text backfill), an interrupted backfill resumes where it stopped, and
+    processes migrating at once apply each step once.
+
+"""
+import threading
+import time
+import pytest
+from sqlalchemy import create_engine, text
+from inspyred_memo_server.database.crypt import get_encryption_manager
+from inspyred_memo_server.database.migrations import (
+    MIGRATIONS,
+    SCHEMA_VERSION,
+    Migration,
+    _backfill_search_index,
+    _create_search_table,
+    current_version,
+    migrate,
+)
+from inspyred_memo_server.database.session import pool_options
+from inspyred_memo_server.database.tuning import DEFAULT_PROFILE, install_profile
+from inspyred_memo_server.store.database import DatabaseMemoStore
+
+
+MEMOS = 7
+
+
+@pytest.fixture
+def old_engine(db_path):
+    """
+    A database as the first release left it: schema version 1, memos encrypted but neither indexed nor compressed.
+    """
+    url = f'sqlite:///{db_path}'
+    engine = create_engine(url, **pool_options(url, pool_size=8, max_overflow=8))
+    install_profile(engine, DEFAULT_PROFILE)
+    MIGRATIONS[0].apply(engine)
+
+    encrypt = get_encryption_manager().encrypt
+    with engine.begin() as connection:
+        connection.execute(
+            text('INSERT INTO memos (author, created_at, size, body) VALUES (:author, :created_at, :size, :body)'),
+            [
+                {'author': 'alice', 'created_at': time.time(), 'size': 12, 'body': encrypt(f'old memo {number}')}
+                for number in range(MEMOS)
+            ],
+        )
+
+    yield engine
+    engine.dispose()
+
+
+def version(engine):
+    with engine.connect() as connection:
+        return current_version(connection)
+
+
+def search(engine, query):
+    store = DatabaseMemoStore(engine)
+    try:
+        return store.search(query, limit=100)
+    finally:
+        store.close()
+
+
+def test_new_database_is_stamped_with_the_latest_version(engine):
+    assert version(engine) == SCHEMA_VERSION
+    assert migrate(engine) == SCHEMA_VERSION
+
+
+def test_first_release_database_is_brought_forward(old_engine):
+    assert version(old_engine) == 1
+    assert migrate(old_engine) == SCHEMA_VERSION
+
+    results = search(old_engine, 'old')
+    assert sorted(result['body'] for result in results) == [f'old memo {number}' for number in range(MEMOS)]
+    with old_engine.connect() as connection:
+        assert connection.execute(text('SELECT count(*) FROM memos WHERE codec IS NULL')).scalar() == MEMOS
+
+
+def test_interrupted_backfill_resumes(old_engine):
+    batches = []
+
+    def failing_backfill(connection, position, target, limit):
+        if len(batches) == 2:
+            raise RuntimeError('interrupted')
+        batches.append(position)
+        return _backfill_search_index(connection, position, target, limit)
+
+    def steps(backfill):
+        return MIGRATIONS[:2] + [Migration(3, 'Backfill the search index', _create_search_table, backfill,
+                                           batch_size=2, pause=0)] + MIGRATIONS[3:]
+
+    with pytest.raises(RuntimeError):
+        migrate(old_engine, steps(failing_backfill))
+    assert version(old_engine) == 2
+
+    resumed = []
+
+    def backfill(connection, position, target, limit):
+        resumed.append(position)
+        return _backfill_search_index(connection, position, target, limit)
+
+    assert migrate(old_engine, steps(backfill)) == SCHEMA_VERSION
+    assert batches == [0, 2]
+    assert resumed[0] == 4
+    assert len(search(old_engine, 'old')) == MEMOS
+
+
+def test_concurrent_migrations_apply_each_step_once(old_engine):
+    applied = []
+
+    def counted(migration):
+        def upgrade(connection):
+            applied.append(migration.version)
+            return migration.upgrade(connection)
+
+        return Migration(migration.version, migration.description, upgrade, migration.backfill, pause=0)
+
+    migrations = [counted(migration) for migration in MIGRATIONS]
+    barrier = threading.Barrier(8)
+    errors = []
+
+    def run():
+        barrier.wait()
+        try:
+            migrate(old_engine, migrations)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert sorted(applied) == [2, 3, 4]
+    assert version(old_engine) == SCHEMA_VERSION
@@ -0,0 +1,86 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    tests/test_paging.py
+
+
+Description:
+    Checks cursor-paginated listing through `MemoServer.handle_frame`, against the memory and database stores: pages
+    come back in (created_at, id) order with no memo missed or repeated, even where a page boundary splits memos that
+    share a timestamp, and a listing resumed from a `next` cursor carries on where it stopped.
+
+"""
+import json
+import pytest
+from sqlalchemy import update
+from inspyred_memo_server import MemoServer
+from inspyred_memo_server.database.memo import Memo
+from inspyred_memo_server.protocol import HEADER, MSG_LIST, MSG_PAGE, Frame, decode_header
+from inspyred_memo_server.store import MemoryMemoStore
+from inspyred_memo_server.store.database import DatabaseMemoStore
+
+
+BATCHES = 5
+BATCH_SIZE = 3
+
+
+@pytest.fixture(params=['memory', 'database'])
+def server(request):
+    batches = [[f'memo {batch}.{number}' for number in range(BATCH_SIZE)] for batch in range(BATCHES)]
+    if request.param == 'memory':
+        store = MemoryMemoStore()
+        for batch, memos in enumerate(batches):
+            store.add_many(memos, created_at=1000.0 + batch)
+    else:
+        engine = request.getfixturevalue('engine')
+        store = DatabaseMemoStore(engine)
+        for memos in batches:
+            store.add_many(memos)
+        with engine.begin() as connection:
+            connection.execute(update(Memo).values(created_at=1000.0 + (Memo.id - 1) // BATCH_SIZE))
+
+    # Every memo in a batch shares its timestamp, so pages of 4 split ties.
+    yield MemoServer(store=store)
+    if hasattr(store, 'close'):
+        store.close()
+
+
+def list_pages(server, **request):
+    replies = server.handle_frame(Frame(MSG_LIST, 9, json.dumps(request).encode()))
+    pages = []
+    for reply in replies:
+        msg_type, request_id, _ = decode_header(reply[:HEADER.size])
+        assert (msg_type, request_id) == (MSG_PAGE, 9)
+        pages.append(json.loads(reply[HEADER.size:]))
+
+    return pages
+
+
+def test_pages_cover_every_memo_once(server):
+    pages = list_pages(server, page_size=4)
+
+    memos = [memo for page in pages for memo in page['memos']]
+    keys = [(memo['created_at'], memo['id']) for memo in memos]
+    assert [len(page['memos']) for page in pages] == [4, 4, 4, 3]
+    assert keys == sorted(keys)
+    assert len(set(keys)) == BATCHES * BATCH_SIZE
+    assert [page['last'] for page in pages] == [False, False, False, True]
+    assert pages[-1]['next'] is None
+
+
+def test_listing_resumes_from_next(server):
+    everything = [memo for page in list_pages(server, page_size=100) for memo in page['memos']]
+
+    first = list_pages(server, page_size=4, limit=7)
+    assert first[-1]['last']
+    resumed = list_pages(server, page_size=4, after=first[-1]['next'])
+
+    memos = [memo for page in first + resumed for memo in page['memos']]
+    assert memos == everything
@@ -0,0 +1,72 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    tests/test_partitioned.py
+
+
+Description:
+    Checks that paging a partitioned store walks every memo once, in (created_at, global id) order, and decrypts only
+    the memos on the page rather than a page's worth from every partition.
+
+"""
+import pytest
+from inspyred_memo_server.store import database
+from inspyred_memo_server.store.partitioned import HashPartitioner, PartitionedMemoStore
+
+
+PARTITIONS = 4
+AUTHORS = 12
+MEMOS = 5
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = PartitionedMemoStore(tmp_path / 'partitions', HashPartitioner(PARTITIONS))
+    for number in range(AUTHORS):
+        author = f'author-{number}'
+        store.add_many([f'{author} memo {memo}' for memo in range(MEMOS)], author=author)
+
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def decrypted(monkeypatch):
+    counts = []
+    decrypt_rows = database._decrypt_rows
+
+    def counting(rows, codec):
+        rows = list(rows)
+        counts.append(len(rows))
+        return decrypt_rows(rows, codec)
+
+    monkeypatch.setattr(database, '_decrypt_rows', counting)
+    return counts
+
+
+def test_paging_walks_every_memo_in_order(store):
+    seen = []
+    after = None
+    while page := store.page(after, limit=7):
+        assert len(page) <= 7
+        seen.extend(page)
+        after = (page[-1]['created_at'], page[-1]['id'])
+
+    keys = [(memo['created_at'], memo['id']) for memo in seen]
+    assert keys == sorted(keys)
+    assert len(set(keys)) == AUTHORS * MEMOS
+    assert all(memo['body'].startswith(memo['author']) for memo in seen)
+
+
+def test_page_decrypts_only_its_memos(store, decrypted):
+    page = store.page(limit=5)
+
+    assert len(page) == 5
+    assert sum(decrypted) == 5
@@ -0,0 +1,115 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    tests/test_protocol.py
+
+
+Description:
+    Checks the wire framing: frames survive being split across reads, the receive buffer grows to fit large ones, and
+    bad headers, oversized payloads and truncated frames are refused.
+
+"""
+import asyncio
+import socket
+import threading
+import pytest
+from inspyred_memo_server.errors.protocol import FrameTooLargeError, IncompleteFrameError, UnsupportedVersionError
+from inspyred_memo_server.protocol import (
+    FrameReader,
+    HEADER,
+    MAGIC,
+    MAX_PAYLOAD,
+    MSG_BATCH,
+    MSG_MEMO,
+    VERSION,
+    decode_header,
+    encode_frame,
+    encode_json_frame,
+    read_frame_async,
+)
+
+
+def send_slowly(sock, data, step=3):
+    for start in range(0, len(data), step):
+        sock.sendall(data[start:start + step])
+
+
+def test_reader_reassembles_split_frames():
+    frames = encode_frame(MSG_MEMO, 1, 'héllo'.encode()) + encode_json_frame(MSG_BATCH, 2, ['a', 'b'])
+    left, right = socket.socketpair()
+    with left, right:
+        sender = threading.Thread(target=send_slowly, args=(left, frames))
+        sender.start()
+        reader = FrameReader(right)
+
+        first = reader.read_frame()
+        assert (first.msg_type, first.request_id, first.text()) == (MSG_MEMO, 1, 'héllo')
+        second = reader.read_frame()
+        assert (second.msg_type, second.request_id, second.json()) == (MSG_BATCH, 2, ['a', 'b'])
+
+        sender.join()
+        left.shutdown(socket.SHUT_WR)
+        assert reader.read_frame() is None
+
+
+def test_reader_grows_for_large_frames():
+    payload = b'x' * 100_000
+    left, right = socket.socketpair()
+    with left, right:
+        sender = threading.Thread(target=left.sendall, args=(encode_frame(MSG_MEMO, 3, payload),))
+        sender.start()
+        reader = FrameReader(right, buffer_size=1024)
+
+        frame = reader.read_frame()
+        sender.join()
+
+    assert bytes(frame.payload) == payload
+    assert reader.buffer_size >= len(payload)
+
+
+def test_reader_refuses_truncated_frame():
+    left, right = socket.socketpair()
+    with left, right:
+        left.sendall(encode_frame(MSG_MEMO, 4, b'cut short')[:-3])
+        left.shutdown(socket.SHUT_WR)
+
+        with pytest.raises(IncompleteFrameError):
+            FrameReader(right).read_frame()
+
+
+@pytest.mark.parametrize('header', [
+    HEADER.pack(b'XX', VERSION, MSG_MEMO, 1, 0),
+    HEADER.pack(MAGIC, VERSION + 1, MSG_MEMO, 1, 0),
+])
+def test_unknown_header_is_refused(header):
+    with pytest.raises(UnsupportedVersionError):
+        decode_header(header)
+
+
+def test_oversized_payloads_are_refused():
+    with pytest.raises(FrameTooLargeError):
+        decode_header(HEADER.pack(MAGIC, VERSION, MSG_MEMO, 1, MAX_PAYLOAD + 1))
+
+    with pytest.raises(FrameTooLargeError):
+        encode_frame(MSG_MEMO, 1, bytes(MAX_PAYLOAD + 1))
+
+
+def test_async_reader():
+    async def read(data):
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return [await read_frame_async(reader) for _ in range(2)]
+
+    frame, end = asyncio.run(read(encode_frame(MSG_MEMO, 5, b'memo')))
+    assert (frame.msg_type, frame.request_id, bytes(frame.payload), end) == (MSG_MEMO, 5, b'memo', None)
+
+    with pytest.raises(IncompleteFrameError):
+        asyncio.run(read(encode_frame(MSG_MEMO, 6, b'memo')[:-1]))
@@ -0,0 +1,112 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    tests/test_rotation.py
+
+
+Description:
+    Checks that re-encryption moves every memo to the newest key and resumes from its watermark, and that reporting
+    progress (as `status` and `retire` do) never writes to a database.
+
+"""
+import pytest
+from cryptography.fernet import Fernet
+from sqlalchemy import select, text
+from inspyred_memo_server.database.crypt import EncryptionManager
+from inspyred_memo_server.database.memo import Memo
+from inspyred_memo_server.database.rotation import PROGRESS_TABLE, ReencryptionJob, reencryption_jobs
+from inspyred_memo_server.store.database import DatabaseMemoStore
+from inspyred_memo_server.store.partitioned import HashPartitioner, PartitionedMemoStore
+
+
+MEMOS = 10
+
+
+@pytest.fixture
+def rotated(encryption_key):
+    new_key = Fernet.generate_key()
+    return new_key, EncryptionManager([new_key, encryption_key])
+
+
+@pytest.fixture
+def stored(engine):
+    store = DatabaseMemoStore(engine)
+    store.add_many([f'memo {number}' for number in range(MEMOS)])
+    store.close()
+    return engine
+
+
+def make_job(engine, encryption, **options):
+    return ReencryptionJob(
+        engine, Memo.__table__, ('body',), encryption=encryption, chunk_size=3, max_rows_per_second=None, pause=0,
+        **options,
+    )
+
+
+def has_progress_table(engine):
+    with engine.connect() as connection:
+        return connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = :name"), {'name': PROGRESS_TABLE}
+        ).first() is not None
+
+
+def test_progress_before_running_writes_nothing(stored, rotated):
+    progress = make_job(stored, rotated[1]).progress()
+
+    assert not progress['finished']
+    assert progress['done'] == 0
+    assert progress['remaining'] == MEMOS
+    assert not has_progress_table(stored)
+
+
+def test_run_moves_every_memo_to_the_new_key(stored, rotated):
+    new_key, encryption = rotated
+    make_job(stored, encryption).run()
+
+    with stored.connect() as connection:
+        tokens = connection.execute(select(Memo.body)).scalars().all()
+    assert len(tokens) == MEMOS
+    for token in tokens:
+        Fernet(new_key).decrypt(token.encode('ascii'))
+
+    progress = make_job(stored, encryption).progress()
+    assert progress['finished']
+    assert progress['done'] == MEMOS
+
+
+def test_stopped_job_resumes_from_its_watermark(stored, rotated):
+    encryption = rotated[1]
+    assert make_job(stored, encryption).step() == 3
+
+    job = make_job(stored, encryption)
+    progress = job.progress()
+    assert not progress['finished']
+    assert (progress['done'], progress['remaining']) == (3, MEMOS - 3)
+
+    job.run()
+    assert job.progress()['done'] == MEMOS
+
+
+def test_partition_status_is_read_only(engine, tmp_path, rotated):
+    directory = tmp_path / 'partitions'
+    store = PartitionedMemoStore(directory, HashPartitioner(3))
+    for number in range(6):
+        store.add(f'memo {number}', author=f'author-{number}')
+    store.close()
+
+    jobs = reencryption_jobs(engine, partitions=directory, encryption=rotated[1])
+    partition_jobs = [job for job in jobs if job.label.startswith('memos[')]
+    try:
+        assert partition_jobs
+        assert not any(job.progress()['finished'] for job in partition_jobs)
+        assert not any(has_progress_table(job.engine) for job in jobs)
+    finally:
+        for job in partition_jobs:
+            job.engine.dispose()
@@ -0,0 +1,102 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    tests/test_server.py
+
+
+Description:
+    Checks `MemoServer.memos` against each kind of store: a memory store's own view, a database store walked page by
+    page, and a clear error for an async store. Also serves a synchronous store from the 'asyncio' engine, whose
+    store calls run on a thread pool that must be ready by the time the first connection arrives.
+
+"""
+import asyncio
+import socket
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+from inspyred_memo_server import MemoServer
+from inspyred_memo_server.database.aio import async_url
+from inspyred_memo_server.protocol import MSG_ACK, MSG_MEMO, encode_frame, read_frame_async
+from inspyred_memo_server.store import MemoryMemoStore
+from inspyred_memo_server.store.database import AsyncDatabaseMemoStore, DatabaseMemoStore
+
+
+def test_memory_store_memos():
+    server = MemoServer(store=MemoryMemoStore())
+    server.store_memos(['one', 'two'])
+
+    assert [memo.body for memo in server.memos] == ['one', 'two']
+
+
+def test_database_store_memos_span_pages(engine, monkeypatch):
+    monkeypatch.setattr('inspyred_memo_server.DEFAULT_PAGE_SIZE', 3)
+    store = DatabaseMemoStore(engine)
+    pages = []
+    page = store.page
+    monkeypatch.setattr(store, 'page', lambda after, limit: pages.append(after) or page(after, limit))
+    try:
+        server = MemoServer(store=store)
+        bodies = [f'memo {number}' for number in range(10)]
+        server.store_memos(bodies)
+
+        memos = list(server.memos)
+    finally:
+        store.close()
+
+    assert [memo.body for memo in memos] == bodies
+    assert len(pages) == 5
+    assert len({memo.id for memo in memos}) == len(bodies)
+
+
+def test_async_store_memos_raise(db_path):
+    server = MemoServer(store=AsyncDatabaseMemoStore(create_async_engine(async_url(f'sqlite:///{db_path}'))))
+
+    with pytest.raises(TypeError, match='async'):
+        server.memos
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def test_asyncio_engine_serves_a_sync_store():
+    server = MemoServer(port=free_port(), engine='asyncio', store=MemoryMemoStore())
+
+    async def connect():
+        for _ in range(100):
+            try:
+                return await asyncio.open_connection(server.host, server.port)
+            except OSError:
+                await asyncio.sleep(0.01)
+
+        raise TimeoutError('The server did not start listening')
+
+    async def main():
+        serving = asyncio.create_task(server.start_async())
+        try:
+            reader, writer = await connect()
+            writer.write(encode_frame(MSG_MEMO, 7, 'hello'.encode()))
+            await writer.drain()
+            reply = await asyncio.wait_for(read_frame_async(reader), 5)
+            writer.close()
+            await writer.wait_closed()
+        finally:
+            serving.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await serving
+
+        return reply
+
+    reply = asyncio.run(main())
+
+    assert (reply.msg_type, reply.request_id, reply.json()) == (MSG_ACK, 7, {'ids': [0]})
+    assert [memo.body for memo in server.memos] == ['hello']
@@ -0,0 +1,144 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    tests/test_session.py
+
+
+Description:
+    Runs hundreds of concurrent `unit_of_work` writers against one SQLite file, as threads, as asyncio tasks on the
+    synchronous manager's `run_async`, and as tasks on `AsyncSessionManager`, and checks that every row arrives and no
+    writer fails with a lock or detached-instance error.
+
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from inspyred_memo_server.database.aio import AsyncSessionManager, async_url
+from inspyred_memo_server.database.crypt import get_encryption_manager
+from inspyred_memo_server.database.memo import Memo
+from inspyred_memo_server.database.session import pool_options
+from inspyred_memo_server.database.tuning import DEFAULT_PROFILE, install_profile
+
+
+WRITERS = 300
+UNITS = 3
+ROWS = 2
+
+
+def _memos(writer, unit):
+    encrypt = get_encryption_manager().encrypt
+    now = time.time()
+    return [
+        Memo(author=f'writer-{writer}', created_at=now, size=8, body=encrypt(f'memo {unit}.{row}'))
+        for row in range(ROWS)
+    ]
+
+
+def write_memos(session, writer, unit):
+    memos = _memos(writer, unit)
+    session.add_all(memos)
+    session.flush()
+    # Reading attributes inside the unit of work must never find the instances detached.
+    return [memo.id for memo in memos]
+
+
+def count_memos(sessions):
+    with sessions.unit_of_work() as session:
+        return session.scalar(select(func.count()).select_from(Memo))
+
+
+def test_threaded_writers(sessions):
+    errors = []
+    ids = []
+    barrier = threading.Barrier(WRITERS)
+
+    def writer(number):
+        barrier.wait()
+        for unit in range(UNITS):
+            try:
+                with sessions.unit_of_work() as session:
+                    ids.extend(write_memos(session, number, unit))
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(number,)) for number in range(WRITERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert count_memos(sessions) == WRITERS * UNITS * ROWS
+    assert len(set(ids)) == WRITERS * UNITS * ROWS
+
+
+def test_run_async_writers(sessions):
+    errors = []
+
+    async def writer(number, executor):
+        for unit in range(UNITS):
+            try:
+                await sessions.run_async(write_memos, number, unit, executor=executor)
+            except Exception as e:
+                errors.append(e)
+
+    async def main():
+        with ThreadPoolExecutor(32) as executor:
+            await asyncio.gather(*(writer(number, executor) for number in range(WRITERS)))
+
+    asyncio.run(main())
+
+    assert errors == []
+    assert count_memos(sessions) == WRITERS * UNITS * ROWS
+
+
+def test_async_session_writers(engine, sessions, db_path):
+    errors = []
+
+    async def writer(manager, number):
+        for unit in range(UNITS):
+            try:
+                async with manager.unit_of_work() as session:
+                    memos = _memos(number, unit)
+                    session.add_all(memos)
+                    await session.flush()
+                    assert all(memo.id is not None for memo in memos)
+                # expire_on_commit is off, so the instances stay readable after the unit of work.
+                assert all(memo.author == f'writer-{number}' for memo in memos)
+            except Exception as e:
+                errors.append(e)
+
+    async def main():
+        url = async_url(f'sqlite:///{db_path}')
+        async_engine = create_async_engine(url, **pool_options(url, pool_size=16, max_overflow=16))
+        install_profile(async_engine.sync_engine, DEFAULT_PROFILE)
+        try:
+            manager = AsyncSessionManager(async_engine)
+            await asyncio.gather(*(writer(manager, number) for number in range(WRITERS)))
+        finally:
+            await async_engine.dispose()
+
+    asyncio.run(main())
+
+    assert errors == []
+    assert count_memos(sessions) == WRITERS * UNITS * ROWS
+
+
+def test_failed_unit_of_work_rolls_back(sessions):
+    with pytest.raises(RuntimeError):
+        with sessions.unit_of_work() as session:
+            write_memos(session, 0, 0)
+            raise RuntimeError('abort')
+
+    assert count_memos(sessions) == 0
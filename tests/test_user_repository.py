@@ -0,0 +1,107 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    tests/test_user_repository.py
+
+
+Description:
+    Checks the user cache's invalidation, including a lookup that races a password change, and login with
+    rehashing of hashes made at an older cost.
+
+"""
+import threading
+import pytest
+from inspyred_memo_server.database.user.auth import PasswordHasher, hash_cost
+from inspyred_memo_server.database.user.repository import UserCache, UserRecord, UserRepository
+
+
+@pytest.fixture(scope='module')
+def hasher():
+    hasher = PasswordHasher(cost=5, max_workers=2)
+    yield hasher
+    hasher.shutdown()
+
+
+@pytest.fixture
+def repository(sessions, hasher):
+    return UserRepository(sessions, hasher=hasher)
+
+
+def test_put_after_invalidation_is_dropped():
+    cache = UserCache()
+    generation = cache.generation()
+    cache.invalidate(1, 'alice')
+    cache.put(UserRecord(1, 'alice', 'old'), generation)
+    assert cache.get(username='alice') is None
+
+    cache.put(UserRecord(1, 'alice', 'new'), cache.generation())
+    assert cache.get(username='alice').hashed_password == 'new'
+
+
+def test_put_survives_unrelated_invalidation():
+    cache = UserCache()
+    generation = cache.generation()
+    cache.invalidate(2, 'bob')
+    cache.put(UserRecord(1, 'alice', 'hash'), generation)
+    assert cache.get(user_id=1) is not None
+
+
+def test_forgotten_invalidations_drop_old_lookups():
+    cache = UserCache(max_size=1)
+    generation = cache.generation()
+    for user_id in range(10):
+        cache.invalidate(user_id + 100, f'user{user_id}')
+
+    cache.put(UserRecord(1, 'alice', 'hash'), generation)
+    assert cache.get(user_id=1) is None
+
+
+def test_password_change_evicts_cached_user(repository):
+    repository.add('alice', 'old password')
+    assert repository.authenticate('alice', 'old password') is not None
+
+    repository.set_password('alice', 'new password')
+    assert repository.authenticate('alice', 'old password') is None
+    assert repository.authenticate('alice', 'new password') is not None
+
+
+def test_lookup_racing_a_password_change_is_not_cached(sessions, hasher):
+    class RacingRepository(UserRepository):
+        race = True
+
+        def _load(self, criterion):
+            record = super()._load(criterion)
+            if self.race:
+                # Another thread changes the password after this lookup read the row but before it is cached.
+                self.race = False
+                changer = threading.Thread(target=self.set_password, args=('alice', 'new password'))
+                changer.start()
+                changer.join()
+            return record
+
+    repository = RacingRepository(sessions, hasher=hasher)
+    repository.add('alice', 'old password')
+    repository.cache.clear()
+
+    stale = repository.get_by_username('alice')
+    assert stale is not None
+    assert repository.cache.get(username='alice') is None
+    assert repository.authenticate('alice', 'old password') is None
+    assert repository.authenticate('alice', 'new password') is not None
+
+
+def test_login_upgrades_old_cost_hash(sessions, hasher):
+    UserRepository(sessions, hasher=PasswordHasher(cost=4, max_workers=1)).add('alice', 'password')
+    repository = UserRepository(sessions, hasher=hasher)
+
+    assert hash_cost(repository.get_by_username('alice').hashed_password) == 4
+    assert repository.authenticate('alice', 'password') is not None
+    assert hash_cost(repository.get_by_username('alice').hashed_password) == hasher.cost
+    assert repository.authenticate('alice', 'password') is not None
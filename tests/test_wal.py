@@ -0,0 +1,95 @@
+"""
+
+
+Author:
+    Inspyre Softworks
+
+Project:
+    InspyredMemos
+
+File:
+    tests/test_wal.py
+
+
+Description:
+    Checks that a `DurableMemoStore` rebuilds the same memos and ids from its write-ahead log, that concurrent writers
+    share group commits, and that a torn record from a crash is truncated away on replay.
+
+"""
+import threading
+from inspyred_memo_server.store.wal import DurableMemoStore, WriteAheadLog
+
+
+WRITERS = 50
+
+
+def test_replay_rebuilds_memos_and_ids(tmp_path):
+    path = tmp_path / 'memos.wal'
+    store = DurableMemoStore(path)
+    first = store.add_many(['one', 'two'], created_at=1.0, author='alice')
+    second = store.add('three')
+    before = list(store.memos)
+    store.close()
+
+    store = DurableMemoStore(path)
+    try:
+        assert list(store.memos) == before
+        assert (first, second) == ([0, 1], 2)
+        assert store.get(1).author == 'alice'
+        assert store.add('four') == 3
+    finally:
+        store.close()
+
+
+def test_concurrent_writers_share_commits(tmp_path):
+    path = tmp_path / 'memos.wal'
+    store = DurableMemoStore(path, flush_interval=0.02)
+    barrier = threading.Barrier(WRITERS)
+    ids = {}
+
+    def writer(number):
+        barrier.wait()
+        ids[number] = store.add(f'memo {number}')
+
+    threads = [threading.Thread(target=writer, args=(number,)) for number in range(WRITERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    commits = store.wal.commits
+    store.close()
+
+    assert sorted(ids.values()) == list(range(WRITERS))
+    assert commits < WRITERS
+
+    store = DurableMemoStore(path)
+    try:
+        assert all(store.get(memo_id).body == f'memo {number}' for number, memo_id in ids.items())
+    finally:
+        store.close()
+
+
+def test_torn_record_is_truncated(tmp_path):
+    path = tmp_path / 'memos.wal'
+    store = DurableMemoStore(path)
+    store.add_many(['kept'])
+    store.close()
+    intact = path.stat().st_size
+
+    with open(path, 'ab') as log:
+        log.write(WriteAheadLog.encode_record(b'{"t": 2.0, "memos": ["torn"]}')[:-4])
+
+    store = DurableMemoStore(path)
+    try:
+        assert [memo.body for memo in store.memos] == ['kept']
+        assert path.stat().st_size == intact
+        store.add('after')
+    finally:
+        store.close()
+
+    store = DurableMemoStore(path)
+    try:
+        assert [memo.body for memo in store.memos] == ['kept', 'after']
+    finally:
+        store.close()